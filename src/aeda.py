@@ -2,27 +2,139 @@ from __future__ import division
 import pyodbc
 import pymysql
 import sys
+import io
+import os
+import re
+import uuid
+import json
+import base64
 import pandas as pd
 import numpy as np
 import matplotlib.pyplot as plt
 import logging
 import sqlite3
+import decimal
 from tqdm import tqdm
 import time
+import datetime
+import random
+import inspect
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import contextmanager
+from collections import OrderedDict
 from termcolor import colored
+try:
+    import psycopg2
+    import psycopg2.extras
+except ImportError:
+    psycopg2 = None
 #from string_connections.sitewatch import DB_CONFIG
 from string_connections.connections import DB_META_CONFIG, DB_EMPLOYEE_CONFIG
 from string_connections.connections import DB_EMPLOYEE_CONFIG
+from pool import ConnectionPool, SharedConnection
+from profiler import TableProfile, PERCENTILES
+from sketches import HyperLogLog, TDigest, SpaceSaving
+import filesource
+from sqliterecord import decodeSqliteRecord
 
 FORMAT = '%(asctime)-15s %(message)s'
 logging.basicConfig(level=logging.INFO, format=FORMAT)
 logger = logging.getLogger(__name__)
 
+# Source drivers return DECIMAL columns as Decimal, which sqlite3 can't store
+sqlite3.register_adapter(decimal.Decimal, float)
+
 SOURCE_ENGINE = ''
 METADATA_ENGINE = ''
 source_connection_params = ''
 metadata_connection_params = ''
 
+# Connection pools, created on first use by get_source_connection() and get_metadata_connection()
+POOL_SIZE = 8
+POOL_MAX_IDLE = 300
+# Seconds to wait for a free pooled connection before failing instead of blocking forever
+POOL_TIMEOUT = 600
+source_pool = None
+metadata_pool = None
+pools_lock = threading.Lock()
+
+# Number of rows sent to the metadata database on each executemany call
+METADATA_BATCH_SIZE = 1000
+# Number of rows fetched at a time from the source when results are streamed
+FETCH_SIZE = 10000
+
+# Semaphores limiting the number of tables processed at the same time on each server
+server_slots = {}
+
+# Data types of the columns profiled as numbers and dates, and the ones that aren't profiled
+NUMERIC_TYPES = ('int', 'decimal', 'numeric', 'float', 'money', 'tinyint', 'bigint', 'smallint', 'real', 'integer', 'double', 'double precision')
+DATE_TYPES = ('datetime', 'timestamp', 'date', 'datetime2', 'smalldatetime', 'timestamp without time zone', 'timestamp with time zone')
+BLOB_TYPES = ('text', 'image', 'ntext', 'blob', 'varbinary', 'bytea')
+
+# Seed of the samples taken with `with_data_sample`, the same seed gives the same sample
+SAMPLE_SEED = 42
+# With MATERIALISE_SAMPLES each sample is copied once into a temporary table of the source
+# connection a table is processed with (pinned_sources), and read from there by every column
+MATERIALISE_SAMPLES = False
+SAMPLE_TABLE_PREFIX = 'aeda_sample_'
+pinned_sources = threading.local()
+
+# PRAGMAs of the SQLite metadata database, tuned for bulk writes from one process:
+# WAL lets readers run while a table is written and synchronous NORMAL only syncs at checkpoints
+SQLITE_PRAGMAS = {'journal_mode': 'WAL'
+                  , 'synchronous': 'NORMAL'
+                  , 'cache_size': -262144
+                  , 'mmap_size': 1073741824
+                  , 'temp_store': 'MEMORY'
+                  , 'busy_timeout': 60000}
+
+# Rows of `columns`, `uniques` and `tables` of the last METADATA_CACHE_SIZE tables used,
+# read once per table by getTableMetadata and dropped by invalidateMetadata when they change
+METADATA_CACHE_SIZE = 256
+metadata_cache = OrderedDict()
+metadata_cache_lock = threading.Lock()
+
+# Unique key of each metadata table, the unique indexes of create_metadata_database.sql
+# that upsertRows reconciles the rows against
+METADATA_KEYS = {'columns': ('SERVER_NAME', 'TABLE_CATALOG', 'TABLE_SCHEMA', 'TABLE_NAME', 'COLUMN_NAME')
+                 , 'tables': ('SERVER_NAME', 'TABLE_CATALOG', 'TABLE_SCHEMA', 'TABLE_NAME')
+                 , 'uniques': ('SERVER_NAME', 'TABLE_CATALOG', 'TABLE_SCHEMA', 'TABLE_NAME', 'COLUMN_NAME')
+                 , 'stats': ('SERVER_NAME', 'TABLE_CATALOG', 'TABLE_SCHEMA', 'TABLE_NAME', 'COLUMN_NAME')
+                 , 'ledger': ('STAGE', 'SERVER_NAME', 'TABLE_CATALOG', 'TABLE_SCHEMA', 'TABLE_NAME', 'COLUMN_NAME')
+                 , 'fingerprints': ('STAGE', 'SERVER_NAME', 'TABLE_CATALOG', 'TABLE_SCHEMA', 'TABLE_NAME')
+                 , 'watermarks': ('STAGE', 'SERVER_NAME', 'TABLE_CATALOG', 'TABLE_SCHEMA', 'TABLE_NAME', 'COLUMN_NAME')
+                 , 'samples': ('STAGE', 'SERVER_NAME', 'TABLE_CATALOG', 'TABLE_SCHEMA', 'TABLE_NAME')}
+# Columns of `columns` and `tables` written by fill_columns and fill_tables
+COLUMNS_COLUMNS = ('SERVER_NAME', 'TABLE_CATALOG', 'TABLE_SCHEMA', 'TABLE_NAME', 'COLUMN_NAME', 'ORDINAL_POSITION', 'DATA_TYPE')
+# Constraints of each column stored by fill_columns, 1/0 flags. IS_UNIQUE means the column
+# alone is the primary key or a unique key, so its values are distinct.
+CONSTRAINTS_COLUMNS = ('IS_NULLABLE', 'IS_PRIMARY_KEY', 'IS_UNIQUE')
+TABLES_COLUMNS = ('SERVER_NAME', 'TABLE_CATALOG', 'TABLE_SCHEMA', 'TABLE_NAME', 'N_COLUMNS', 'N_ROWS', 'N_ROWS_ESTIMATED', 'LAST_MODIFIED', 'FINGERPRINT')
+UNIQUES_COLUMNS = ('SERVER_NAME', 'TABLE_CATALOG', 'TABLE_SCHEMA', 'TABLE_NAME', 'COLUMN_NAME', 'ORDINAL_POSITION', 'DATA_TYPE', 'DISTINCT_VALUES', 'NULL_VALUES', 'DISTINCT_APPROXIMATE', 'DISTINCT_ERROR')
+
+# Layout of the metadata database. In the 'normalized' layout uniques, data_values, dates
+# and stats are stored in norm_* tables keyed by integer ids, with the data values in a
+# dictionary. The stages write to the *_staging tables, compactMetadata moves their rows
+# to the norm_* tables and views with the original names show both.
+METADATA_LAYOUT = 'wide'
+NORMALIZED_TABLES = ('uniques', 'data_values', 'dates', 'stats')
+# Columns of each normalized table besides the ids
+NORMALIZED_COLUMNS = {'uniques': ('ORDINAL_POSITION', 'DATA_TYPE', 'DISTINCT_VALUES', 'NULL_VALUES', 'DISTINCT_APPROXIMATE', 'DISTINCT_ERROR')
+                      , 'data_values': ('FREQUENCY_NUMBER', 'FREQUENCY_PERCENTAGE', 'APPROXIMATE', 'FREQUENCY_ERROR')
+                      , 'dates': ('FREQUENCY_NUMBER', 'FREQUENCY_PERCENTAGE')
+                      , 'stats': ('AVG', 'STDEV', 'VAR', 'SUM', 'MAX', 'MIN', 'RANGE_', 'P01', 'P025', 'P05', 'P10', 'Q1', 'Q2', 'Q3', 'P90', 'P95', 'P975', 'P99', 'IQR', 'QUANTILE_SKETCH')}
+
+# Declared type of a SQLite column without its length, like the DATA_TYPE of INFORMATION_SCHEMA.
+# SQLite has no INFORMATION_SCHEMA, the catalog queries join sqlite_master to the pragma
+# functions with CROSS JOIN, which keeps the join order the pragma arguments need
+SQLITE_DATA_TYPE = """CASE WHEN lower(C.type) IN ('text', 'clob') THEN 'varchar'
+                    WHEN instr(C.type, '(') > 0 THEN lower(trim(substr(C.type, 1, instr(C.type, '(') - 1)))
+                    ELSE lower(C.type) END"""
+
+# Error bound documented for SQL Server APPROX_COUNT_DISTINCT (2% with 97% probability)
+APPROX_COUNT_DISTINCT_ERROR = 0.02
+
 def close_db_sqlite(db):
     db.close()
     return
@@ -31,10 +143,68 @@ def get_db_sqlite(path, db_name):
     db = sqlite3.connect(path + '/' + db_name)
     return db
 
+def get_sqlite_metadata_connection(database):
+    """
+    Connection to a SQLite metadata database file, created with its tables and indexes
+    if needed. It can be used from the thread the pool hands it to.
+    """
+    db = sqlite3.connect(database, timeout = SQLITE_PRAGMAS['busy_timeout'] / 1000, check_same_thread = False)
+    cursor = db.cursor()
+    for pragma, value in SQLITE_PRAGMAS.items():
+        cursor.execute('PRAGMA {} = {}'.format(pragma, value))
+    create_metadata_tables(db)
+    cursor.close()
+    return db
+
+class SampleStatistic(object):
+    """
+    Sample variance (VAR_SAMP) or standard deviation (STDDEV_SAMP) aggregate for SQLite,
+    with Welford's running mean and M2.
+    """
+    def __init__(self, root = False):
+        self.root = root
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+
+    def step(self, value):
+        if value is None:
+            return
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+        return
+
+    def finalize(self):
+        if self.count < 2:
+            return None
+        var = self.m2 / (self.count - 1)
+        return var ** 0.5 if self.root else var
+
+def get_sqlite_source_connection(database):
+    """
+    Read-only connection to a SQLite database file to profile. SQLite has no STDDEV_SAMP
+    and VAR_SAMP, they are added to the connection so the stats queries run unchanged.
+    """
+    db = sqlite3.connect('file:{}?mode=ro'.format(database), uri = True, check_same_thread = False)
+    db.create_aggregate('STDDEV_SAMP', 1, lambda: SampleStatistic(root = True))
+    db.create_aggregate('VAR_SAMP', 1, SampleStatistic)
+    return db
+
 def create_metadata_db(path, db_name):
     """
     Creates the necessary tables to store metadata about the databases.
     """
+    db = get_db_sqlite(path, db_name)
+    create_metadata_tables(db)
+    db.close()
+    return
+
+def create_metadata_tables(db):
+    """
+    Creates the metadata tables and their indexes in a SQLite database.
+    """
     
     columns = '''CREATE TABLE IF NOT EXISTS columns (SERVER_NAME TEXT
             , TABLE_CATALOG TEXT
@@ -42,16 +212,22 @@ def create_metadata_db(path, db_name):
             , TABLE_NAME TEXT
             , COLUMN_NAME TEXT
             , ORDINAL_POSITION INTEGER
-            , DATA_TYPE TEXT)'''
+            , DATA_TYPE TEXT
+            , IS_NULLABLE INTEGER
+            , IS_PRIMARY_KEY INTEGER
+            , IS_UNIQUE INTEGER)'''
 
     tables = '''CREATE TABLE IF NOT EXISTS tables (SERVER_NAME TEXT
             , TABLE_CATALOG TEXT
             , TABLE_SCHEMA TEXT
             , TABLE_NAME TEXT
             , N_COLUMNS INTEGER
-            , N_ROWS INTEGER)'''
+            , N_ROWS INTEGER
+            , N_ROWS_ESTIMATED INTEGER
+            , LAST_MODIFIED TEXT
+            , FINGERPRINT TEXT)'''
 
-    uniques = '''CREATE TABLE IF NOT EXISTS uniques (SERVER_NAME TEXT
+    uniques = '''CREATE TABLE IF NOT EXISTS {} (SERVER_NAME TEXT
             , TABLE_CATALOG TEXT
             , TABLE_SCHEMA TEXT
             , TABLE_NAME TEXT
@@ -59,27 +235,31 @@ def create_metadata_db(path, db_name):
             , ORDINAL_POSITION INTEGER
             , DATA_TYPE TEXT
             , DISTINCT_VALUES INTEGER
-            , NULL_VALUES INTEGER)'''
+            , NULL_VALUES INTEGER
+            , DISTINCT_APPROXIMATE INTEGER DEFAULT 0
+            , DISTINCT_ERROR FLOAT)'''.format(metadataTable('uniques'))
 
-    data_values = '''CREATE TABLE IF NOT EXISTS data_values (SERVER_NAME TEXT
+    data_values = '''CREATE TABLE IF NOT EXISTS {} (SERVER_NAME TEXT
             , TABLE_CATALOG TEXT
             , TABLE_SCHEMA TEXT
             , TABLE_NAME TEXT
             , COLUMN_NAME TEXT
             , DATA_VALUE TEXT
             , FREQUENCY_NUMBER INTEGER
-            , FREQUENCY_PERCENTAGE FLOAT)'''
+            , FREQUENCY_PERCENTAGE FLOAT
+            , APPROXIMATE INTEGER DEFAULT 0
+            , FREQUENCY_ERROR INTEGER)'''.format(metadataTable('data_values'))
 
-    dates = '''CREATE TABLE IF NOT EXISTS dates (SERVER_NAME TEXT
+    dates = '''CREATE TABLE IF NOT EXISTS {} (SERVER_NAME TEXT
             , TABLE_CATALOG TEXT
             , TABLE_SCHEMA TEXT
             , TABLE_NAME TEXT
             , COLUMN_NAME TEXT
             , DATA_VALUE TEXT
             , FREQUENCY_NUMBER INTEGER
-            , FREQUENCY_PERCENTAGE FLOAT)'''
+            , FREQUENCY_PERCENTAGE FLOAT)'''.format(metadataTable('dates'))
     
-    stats = '''CREATE TABLE IF NOT EXISTS stats (SERVER_NAME TEXT
+    stats = '''CREATE TABLE IF NOT EXISTS {} (SERVER_NAME TEXT
             , TABLE_CATALOG TEXT
             , TABLE_SCHEMA TEXT
             , TABLE_NAME TEXT
@@ -90,7 +270,7 @@ def create_metadata_db(path, db_name):
             , SUM FLOAT
             , MAX FLOAT
             , MIN FLOAT
-            , RANGE FLOAT
+            , RANGE_ FLOAT
             , P01 FLOAT
             , P025 FLOAT
             , P05 FLOAT
@@ -102,10 +282,70 @@ def create_metadata_db(path, db_name):
             , P95 FLOAT
             , P975 FLOAT
             , P99 FLOAT
-            , IQR FLOAT)'''
+            , IQR FLOAT
+            , QUANTILE_SKETCH TEXT)'''.format(metadataTable('stats'))
+
+    ledger = '''CREATE TABLE IF NOT EXISTS ledger (STAGE TEXT
+            , SERVER_NAME TEXT
+            , TABLE_CATALOG TEXT
+            , TABLE_SCHEMA TEXT
+            , TABLE_NAME TEXT
+            , COLUMN_NAME TEXT
+            , COMPLETED_AT TIMESTAMP)'''
+
+    samples = '''CREATE TABLE IF NOT EXISTS samples (STAGE TEXT
+            , SERVER_NAME TEXT
+            , TABLE_CATALOG TEXT
+            , TABLE_SCHEMA TEXT
+            , TABLE_NAME TEXT
+            , METHOD TEXT
+            , SEED INTEGER
+            , REQUESTED_ROWS INTEGER
+            , SAMPLE_ROWS INTEGER
+            , SAMPLED_AT TIMESTAMP)'''
+
+    fingerprints = '''CREATE TABLE IF NOT EXISTS fingerprints (STAGE TEXT
+            , SERVER_NAME TEXT
+            , TABLE_CATALOG TEXT
+            , TABLE_SCHEMA TEXT
+            , TABLE_NAME TEXT
+            , FINGERPRINT TEXT)'''
+
+    watermarks = '''CREATE TABLE IF NOT EXISTS watermarks (STAGE TEXT
+            , SERVER_NAME TEXT
+            , TABLE_CATALOG TEXT
+            , TABLE_SCHEMA TEXT
+            , TABLE_NAME TEXT
+            , COLUMN_NAME TEXT
+            , WATERMARK_COLUMN TEXT
+            , WATERMARK_VALUE TEXT)'''
+
+    # Every lookup filters by server, catalog, schema, table and usually column.
+    # The unique ones are the keys upserts are resolved on, they replace the
+    # plain indexes created by previous versions
+    indexes = ['DROP INDEX IF EXISTS idx_columns'
+               , 'DROP INDEX IF EXISTS idx_tables'
+               , 'DROP INDEX IF EXISTS idx_uniques'
+               , 'DROP INDEX IF EXISTS idx_stats'
+               , 'CREATE UNIQUE INDEX IF NOT EXISTS idx_columns_key ON columns (SERVER_NAME, TABLE_CATALOG, TABLE_SCHEMA, TABLE_NAME, COLUMN_NAME)'
+               , 'CREATE UNIQUE INDEX IF NOT EXISTS idx_tables_key ON tables (SERVER_NAME, TABLE_CATALOG, TABLE_SCHEMA, TABLE_NAME)'
+               , 'CREATE UNIQUE INDEX IF NOT EXISTS idx_uniques_key ON {} (SERVER_NAME, TABLE_CATALOG, TABLE_SCHEMA, TABLE_NAME, COLUMN_NAME)'.format(metadataTable('uniques'))
+               , 'CREATE INDEX IF NOT EXISTS idx_data_values ON {} (SERVER_NAME, TABLE_CATALOG, TABLE_SCHEMA, TABLE_NAME, COLUMN_NAME, DATA_VALUE)'.format(metadataTable('data_values'))
+               , 'CREATE INDEX IF NOT EXISTS idx_dates ON {} (SERVER_NAME, TABLE_CATALOG, TABLE_SCHEMA, TABLE_NAME, COLUMN_NAME, DATA_VALUE)'.format(metadataTable('dates'))
+               , 'CREATE UNIQUE INDEX IF NOT EXISTS idx_stats_key ON {} (SERVER_NAME, TABLE_CATALOG, TABLE_SCHEMA, TABLE_NAME, COLUMN_NAME)'.format(metadataTable('stats'))
+               , 'CREATE UNIQUE INDEX IF NOT EXISTS idx_ledger ON ledger (STAGE, SERVER_NAME, TABLE_CATALOG, TABLE_SCHEMA, TABLE_NAME, COLUMN_NAME)'
+               , 'CREATE UNIQUE INDEX IF NOT EXISTS idx_fingerprints ON fingerprints (STAGE, SERVER_NAME, TABLE_CATALOG, TABLE_SCHEMA, TABLE_NAME)'
+               , 'CREATE UNIQUE INDEX IF NOT EXISTS idx_watermarks ON watermarks (STAGE, SERVER_NAME, TABLE_CATALOG, TABLE_SCHEMA, TABLE_NAME, COLUMN_NAME)'
+               , 'CREATE UNIQUE INDEX IF NOT EXISTS idx_samples ON samples (STAGE, SERVER_NAME, TABLE_CATALOG, TABLE_SCHEMA, TABLE_NAME)']
 
-    db = get_db_sqlite(path, db_name)
     cursor = db.cursor()
+    if METADATA_LAYOUT == 'normalized':
+        # A wide database is migrated keeping its rows as staged rows, compactMetadata moves them
+        for name in NORMALIZED_TABLES:
+            cursor.execute("SELECT type FROM sqlite_master WHERE name = ?;", (name,))
+            row = cursor.fetchone()
+            if row is not None and row[0] == 'table':
+                cursor.execute('ALTER TABLE {} RENAME TO {};'.format(name, metadataTable(name)))
     
     cursor.execute(columns)
     cursor.execute(tables)
@@ -113,13 +353,125 @@ def create_metadata_db(path, db_name):
     cursor.execute(data_values)
     cursor.execute(dates)
     cursor.execute(stats)
+    # Files created by create_metadata_database.sql before RANGE_ have a RANGE column
+    cursor.execute("SELECT name FROM pragma_table_info(?);", (metadataTable('stats'),))
+    stats_columns = set(row[0].upper() for row in cursor.fetchall())
+    if 'RANGE' in stats_columns and 'RANGE_' not in stats_columns:
+        cursor.execute('ALTER TABLE {} RENAME COLUMN RANGE TO RANGE_;'.format(metadataTable('stats')))
+    cursor.execute(ledger)
+    cursor.execute(fingerprints)
+    cursor.execute(watermarks)
+    cursor.execute(samples)
+    for index in indexes:
+        cursor.execute(index)
+    if METADATA_LAYOUT == 'normalized':
+        create_normalized_metadata_tables(cursor)
     
     db.commit()
     
     cursor.close()
-    db.close()
     return
 
+def create_normalized_metadata_tables(cursor):
+    """
+    Creates the tables and views of the normalized layout in a SQLite database.
+    The norm_* tables are WITHOUT ROWID, so their rows are clustered by their ids.
+    """
+    ddl = ["""CREATE TABLE IF NOT EXISTS norm_tables (TABLE_ID INTEGER PRIMARY KEY
+            , SERVER_NAME TEXT
+            , TABLE_CATALOG TEXT
+            , TABLE_SCHEMA TEXT
+            , TABLE_NAME TEXT)"""
+           , """CREATE UNIQUE INDEX IF NOT EXISTS idx_norm_tables ON norm_tables (SERVER_NAME, TABLE_CATALOG, TABLE_SCHEMA, TABLE_NAME)"""
+           , """CREATE TABLE IF NOT EXISTS norm_columns (COLUMN_ID INTEGER PRIMARY KEY
+            , TABLE_ID INTEGER NOT NULL
+            , COLUMN_NAME TEXT)"""
+           , """CREATE UNIQUE INDEX IF NOT EXISTS idx_norm_columns ON norm_columns (TABLE_ID, COLUMN_NAME)"""
+           , """CREATE TABLE IF NOT EXISTS norm_values (VALUE_ID INTEGER PRIMARY KEY
+            , DATA_VALUE TEXT NOT NULL)"""
+           , """CREATE UNIQUE INDEX IF NOT EXISTS idx_norm_values ON norm_values (DATA_VALUE)"""
+           , """CREATE TABLE IF NOT EXISTS norm_uniques (TABLE_ID INTEGER NOT NULL
+            , COLUMN_ID INTEGER NOT NULL
+            , ORDINAL_POSITION INTEGER
+            , DATA_TYPE TEXT
+            , DISTINCT_VALUES INTEGER
+            , NULL_VALUES INTEGER
+            , DISTINCT_APPROXIMATE INTEGER DEFAULT 0
+            , DISTINCT_ERROR FLOAT
+            , PRIMARY KEY (TABLE_ID, COLUMN_ID)) WITHOUT ROWID"""
+           , """CREATE TABLE IF NOT EXISTS norm_data_values (TABLE_ID INTEGER NOT NULL
+            , COLUMN_ID INTEGER NOT NULL
+            , VALUE_ID INTEGER NOT NULL
+            , FREQUENCY_NUMBER INTEGER
+            , FREQUENCY_PERCENTAGE FLOAT
+            , APPROXIMATE INTEGER DEFAULT 0
+            , FREQUENCY_ERROR INTEGER
+            , PRIMARY KEY (TABLE_ID, COLUMN_ID, VALUE_ID)) WITHOUT ROWID"""
+           , """CREATE TABLE IF NOT EXISTS norm_dates (TABLE_ID INTEGER NOT NULL
+            , COLUMN_ID INTEGER NOT NULL
+            , VALUE_ID INTEGER NOT NULL
+            , FREQUENCY_NUMBER INTEGER
+            , FREQUENCY_PERCENTAGE FLOAT
+            , PRIMARY KEY (TABLE_ID, COLUMN_ID, VALUE_ID)) WITHOUT ROWID"""
+           , """CREATE TABLE IF NOT EXISTS norm_stats (TABLE_ID INTEGER NOT NULL
+            , COLUMN_ID INTEGER NOT NULL
+            , AVG FLOAT
+            , STDEV FLOAT
+            , VAR FLOAT
+            , SUM FLOAT
+            , MAX FLOAT
+            , MIN FLOAT
+            , RANGE_ FLOAT
+            , P01 FLOAT
+            , P025 FLOAT
+            , P05 FLOAT
+            , P10 FLOAT
+            , Q1 FLOAT
+            , Q2 FLOAT
+            , Q3 FLOAT
+            , P90 FLOAT
+            , P95 FLOAT
+            , P975 FLOAT
+            , P99 FLOAT
+            , IQR FLOAT
+            , QUANTILE_SKETCH TEXT
+            , PRIMARY KEY (TABLE_ID, COLUMN_ID)) WITHOUT ROWID"""]
+    for sql in ddl:
+        cursor.execute(sql)
+    for name in NORMALIZED_TABLES:
+        cursor.execute(getNormalizedViewSql(name).replace('CREATE VIEW', 'CREATE VIEW IF NOT EXISTS', 1))
+    return
+
+def getNormalizedViewSql(name):
+    """
+    CREATE VIEW of the normalized layout that shows `name` with its original columns:
+    the rows of norm_`name` joined to their names, except the columns with staged rows,
+    plus the staged rows.
+    """
+    columns = [quoteIdentifier('RANGE', METADATA_ENGINE) if column == 'RANGE_' and METADATA_ENGINE == 'mysql' else column for column in NORMALIZED_COLUMNS[name]]
+    value = 'V.DATA_VALUE, ' if name in ('data_values', 'dates') else ''
+    value_column = 'DATA_VALUE, ' if name in ('data_values', 'dates') else ''
+    sql = """CREATE VIEW {0} AS
+            SELECT T.SERVER_NAME, T.TABLE_CATALOG, T.TABLE_SCHEMA, T.TABLE_NAME, C.COLUMN_NAME, {2}{3}
+            FROM norm_{0} AS F
+            INNER JOIN norm_tables AS T ON T.TABLE_ID = F.TABLE_ID
+            INNER JOIN norm_columns AS C ON C.COLUMN_ID = F.COLUMN_ID""".format(name, metadataTable(name), value, ', '.join('F.' + column for column in columns))
+    if value:
+        # NULL values are stored with VALUE_ID 0, which isn't in the dictionary
+        sql += """
+            LEFT JOIN norm_values AS V ON V.VALUE_ID = F.VALUE_ID"""
+    sql += """
+            WHERE NOT EXISTS (SELECT 1 FROM {0} AS S
+                            WHERE S.SERVER_NAME = T.SERVER_NAME
+                            AND S.TABLE_CATALOG = T.TABLE_CATALOG
+                            AND S.TABLE_SCHEMA = T.TABLE_SCHEMA
+                            AND S.TABLE_NAME = T.TABLE_NAME
+                            AND S.COLUMN_NAME = C.COLUMN_NAME)
+            UNION ALL
+            SELECT SERVER_NAME, TABLE_CATALOG, TABLE_SCHEMA, TABLE_NAME, COLUMN_NAME, {1}{2}
+            FROM {0};""".format(metadataTable(name), value_column, ', '.join(columns))
+    return sql
+
 # Functions to connect to databases
 
 def get_db_connection(string_connection, verbose = False):
@@ -147,9 +499,70 @@ def get_mysql_connection(db):
         conn = pymysql.connect(**DB_META_CONFIG)
     return conn
 
+def get_postgres_connection(params):
+    """
+    Connection to PostgreSQL, `params` is a dictionary of psycopg2.connect arguments
+    or a libpq connection string.
+    """
+    if psycopg2 is None:
+        raise ImportError('psycopg2 is needed to connect to PostgreSQL')
+    if isinstance(params, dict):
+        return psycopg2.connect(**params)
+    return psycopg2.connect(params)
+
+def quoteIdentifier(name, engine = None):
+    """
+    Quotes a column name for the source engine (or `engine`).
+    """
+    if engine is None:
+        engine = SOURCE_ENGINE
+    if engine == 'mssqlserver':
+        return '[{}]'.format(name.replace(']', ']]'))
+    elif engine == 'mysql':
+        return '`{}`'.format(name.replace('`', '``'))
+    return '"{}"'.format(name.replace('"', '""'))
+
 def get_db_cursor(connection):
     return connection.cursor()
 
+def get_streaming_cursor(connection, engine = None):
+    """
+    Cursor that doesn't load the whole result in memory, for the source engine (or `engine`).
+    pymysql buffers results unless an unbuffered SSCursor is used, psycopg2 needs a
+    named (server-side) cursor, pyodbc cursors already read the rows from the server
+    as they are fetched.
+    A psycopg2 named cursor runs a single query.
+    """
+    if engine is None:
+        engine = SOURCE_ENGINE
+    if engine == 'mysql':
+        return connection.cursor(pymysql.cursors.SSCursor)
+    elif engine == 'postgres':
+        cursor = connection.cursor(name = 'aeda_{}'.format(uuid.uuid4().hex))
+        cursor.itersize = FETCH_SIZE
+        return cursor
+    return connection.cursor()
+
+def fetchInChunks(cursor, chunk_size = None):
+    """
+    Yields the rows of the last query executed with `cursor` in lists of `chunk_size`
+    rows (FETCH_SIZE by default), so results are never held in memory all at once.
+    """
+    if chunk_size is None:
+        chunk_size = FETCH_SIZE
+    while True:
+        rows = cursor.fetchmany(chunk_size)
+        if not rows:
+            break
+        yield rows
+    return
+
+def iterRows(cursor, chunk_size = None):
+    for rows in fetchInChunks(cursor, chunk_size):
+        for row in rows:
+            yield row
+    return
+
 def close_db_connection(connection):
     connection.close()
     return
@@ -158,6 +571,298 @@ def close_db_cursor(cursor):
     cursor.close()
     return
 
+def getFilesDirectory(table_schema):
+    """
+    Directory of the files of a schema with the 'files' source engine: the `table_schema`
+    subdirectory of the source directory, or the source directory itself.
+    """
+    directory = os.path.join(source_connection_params, table_schema)
+    if os.path.isdir(directory):
+        return directory
+    return source_connection_params
+
+def getFilePath(table_schema, table_name):
+    for file_table, path in filesource.listFiles(getFilesDirectory(table_schema)):
+        if file_table == table_name:
+            return path
+    raise ValueError('File not found for table {}.{}'.format(table_schema, table_name))
+
+def connect_source():
+    if SOURCE_ENGINE == 'mssqlserver':
+        return get_db_connection(source_connection_params)
+    elif SOURCE_ENGINE == 'mysql':
+        return get_mysql_connection('source')
+    elif SOURCE_ENGINE == 'postgres':
+        return get_postgres_connection(source_connection_params)
+    elif SOURCE_ENGINE == 'sqlite':
+        return get_sqlite_source_connection(source_connection_params)
+    raise ValueError('Source engine not supported: {}'.format(SOURCE_ENGINE))
+
+def connect_metadata():
+    if METADATA_ENGINE == 'mssqlserver':
+        return get_db_connection(metadata_connection_params)
+    elif METADATA_ENGINE == 'mysql':
+        return get_mysql_connection('metadata')
+    elif METADATA_ENGINE == 'postgres':
+        return get_postgres_connection(metadata_connection_params)
+    elif METADATA_ENGINE == 'sqlite':
+        return get_sqlite_metadata_connection(metadata_connection_params)
+    raise ValueError('Metadata engine not supported: {}'.format(METADATA_ENGINE))
+
+def get_source_connection():
+    """
+    Returns a pooled connection to the source database.
+    Calling `close()` on it gives it back to the pool.
+    Inside pinnedSourceConnection() it is the connection pinned to the thread.
+    """
+    global source_pool
+    pinned = getattr(pinned_sources, 'connection', None)
+    if pinned is not None:
+        return SharedConnection(pinned)
+    with pools_lock:
+        if source_pool is None:
+            source_pool = ConnectionPool(connect_source, max_size = POOL_SIZE, max_idle = POOL_MAX_IDLE, timeout = POOL_TIMEOUT, name = 'source')
+    return source_pool.acquire()
+
+def get_metadata_connection():
+    """
+    Returns a pooled connection to the metadata database.
+    Calling `close()` on it gives it back to the pool.
+    """
+    global metadata_pool
+    with pools_lock:
+        if metadata_pool is None:
+            metadata_pool = ConnectionPool(connect_metadata, max_size = POOL_SIZE, max_idle = POOL_MAX_IDLE, timeout = POOL_TIMEOUT, name = 'metadata')
+    return metadata_pool.acquire()
+
+def get_pool_stats():
+    """
+    Returns the hit/miss counters of the source and metadata connection pools.
+    """
+    return [pool.stats() for pool in (source_pool, metadata_pool) if pool is not None]
+
+def close_connection_pools():
+    global source_pool
+    global metadata_pool
+    with pools_lock:
+        for pool in (source_pool, metadata_pool):
+            if pool is not None:
+                pool.close_all()
+        source_pool = None
+        metadata_pool = None
+    return
+
+def setMetadataBatchSize(batch_size):
+    global METADATA_BATCH_SIZE
+
+    METADATA_BATCH_SIZE = batch_size
+    return
+
+def setMetadataLayout(layout):
+    """
+    'wide' (the default) or 'normalized', see METADATA_LAYOUT. Set it before the first
+    metadata connection, SQLite databases are migrated when they are opened.
+    """
+    global METADATA_LAYOUT
+
+    if layout not in ('wide', 'normalized'):
+        raise ValueError('Unknown metadata layout: {}'.format(layout))
+    METADATA_LAYOUT = layout
+    return
+
+def metadataTable(name):
+    """
+    Table the stages read and write `name` rows in: the table itself in the wide layout,
+    its staging table in the normalized one.
+    """
+    if METADATA_LAYOUT == 'normalized' and name in NORMALIZED_TABLES:
+        return name + '_staging'
+    return name
+
+def setMetadataCacheSize(cache_size):
+    global METADATA_CACHE_SIZE
+
+    METADATA_CACHE_SIZE = cache_size
+    with metadata_cache_lock:
+        while len(metadata_cache) > METADATA_CACHE_SIZE:
+            metadata_cache.popitem(last = False)
+    return
+
+def dataValue(value):
+    """
+    A data value as stored in DATA_VALUE: its text, NULLs stay NULL as GROUP BY returns them.
+    """
+    if value is None or isinstance(value, str):
+        return value
+    return str(value)
+
+def copyValue(value):
+    """
+    A value in the text format of PostgreSQL COPY.
+    """
+    if value is None:
+        return '\\N'
+    value = dataValue(value)
+    return value.replace('\\', '\\\\').replace('\t', '\\t').replace('\n', '\\n').replace('\r', '\\r')
+
+def copyRows(cursor_metadata, table, columns, rows):
+    """
+    Loads `rows` into `table` with COPY FROM STDIN.
+    """
+    buffer = io.StringIO()
+    for row in rows:
+        buffer.write('\t'.join(copyValue(value) for value in row))
+        buffer.write('\n')
+    buffer.seek(0)
+    cursor_metadata.copy_expert('COPY {} ({}) FROM STDIN'.format(table, columns), buffer)
+    return
+
+def insertManyRows(conn_metadata, cursor_metadata, sql, rows, batch_size = None):
+    """
+    Buffers `rows` and writes them with `executemany` in batches of `batch_size`
+    (METADATA_BATCH_SIZE by default) inside a single transaction.
+    pyodbc uses `fast_executemany`, pymysql rewrites the batch into a multi-row VALUES.
+    On PostgreSQL plain inserts are loaded with COPY FROM STDIN and other statements
+    are sent with execute_batch.
+    Returns the number of rows written.
+    """
+    if batch_size is None:
+        batch_size = METADATA_BATCH_SIZE
+    if METADATA_ENGINE == 'mssqlserver':
+        cursor_metadata.fast_executemany = True
+
+    write = cursor_metadata.executemany
+    if METADATA_ENGINE == 'postgres':
+        insert = re.match(r'\s*insert\s+into\s+(\w+)\s*\(([^)]*)\)\s*values\s*\(\s*%s(\s*,\s*%s)*\s*\)\s*;?\s*$', sql, re.IGNORECASE)
+        if insert:
+            write = lambda sql, buffer: copyRows(cursor_metadata, insert.group(1), insert.group(2), buffer)
+        else:
+            write = lambda sql, buffer: psycopg2.extras.execute_batch(cursor_metadata, sql, buffer)
+
+    n_rows = 0
+    buffer = []
+    try:
+        for row in rows:
+            buffer.append(row)
+            if len(buffer) >= batch_size:
+                write(sql, buffer)
+                n_rows += len(buffer)
+                buffer = []
+        if buffer:
+            write(sql, buffer)
+            n_rows += len(buffer)
+        conn_metadata.commit()
+    except:
+        conn_metadata.rollback()
+        raise
+    return n_rows
+
+def getUpsertSql(table, columns, expressions = None):
+    """
+    Statement that inserts a row of `columns` into a metadata table, or updates the
+    other columns of the row with the same key (METADATA_KEYS): MERGE on SQL Server,
+    ON DUPLICATE KEY UPDATE on MySQL and ON CONFLICT on PostgreSQL and SQLite.
+    `expressions` ({column: SQL}) are columns computed by the database, like CURRENT_TIMESTAMP.
+    """
+    keys = METADATA_KEYS[table]
+    expressions = expressions or {}
+    parameter = '?' if METADATA_ENGINE in ('mssqlserver', 'sqlite') else '%s'
+    names = list(columns) + list(expressions)
+    values = [parameter] * len(columns) + list(expressions.values())
+    updates = [name for name in names if name not in keys]
+    if METADATA_ENGINE == 'mssqlserver':
+        names = [quoteIdentifier(name, METADATA_ENGINE) for name in names]
+        updates = [quoteIdentifier(name, METADATA_ENGINE) for name in updates]
+        # HOLDLOCK keeps the key range locked between the match and the insert, so two
+        # sessions upserting the same new key don't both insert it
+        sql = """MERGE INTO {} WITH (HOLDLOCK) AS target
+                USING (SELECT {}) AS source
+                ON {}""".format(metadataTable(table)
+                               , ', '.join('{} AS {}'.format(value, name) for name, value in zip(names, values))
+                               , ' AND '.join('target.{0} = source.{0}'.format(quoteIdentifier(key, METADATA_ENGINE)) for key in keys))
+        if updates:
+            sql += """
+                WHEN MATCHED THEN UPDATE SET {}""".format(', '.join('{0} = source.{0}'.format(name) for name in updates))
+        sql += """
+                WHEN NOT MATCHED THEN INSERT ({}) VALUES ({});""".format(', '.join(names), ', '.join('source.{}'.format(name) for name in names))
+        return sql
+    sql = """insert into {} ({})
+                values ({})""".format(metadataTable(table), ', '.join(names), ', '.join(values))
+    if METADATA_ENGINE == 'mysql':
+        # A no-op update when every column is part of the key
+        updates = updates or [keys[0]]
+        sql += """
+                ON DUPLICATE KEY UPDATE {}""".format(', '.join('{0} = VALUES({0})'.format(name) for name in updates))
+    elif updates:
+        sql += """
+                ON CONFLICT ({}) DO UPDATE SET {}""".format(', '.join(keys), ', '.join('{0} = excluded.{0}'.format(name) for name in updates))
+    else:
+        sql += """
+                ON CONFLICT ({}) DO NOTHING""".format(', '.join(keys))
+    return sql + ';'
+
+def upsertRows(conn_metadata, cursor_metadata, table, columns, rows, expressions = None, batch_size = None):
+    """
+    Inserts or updates `rows` (tuples of `columns`) of a metadata table in batches
+    with insertManyRows, one statement per row and one transaction for all of them.
+    Returns the number of rows written.
+    """
+    return insertManyRows(conn_metadata, cursor_metadata, getUpsertSql(table, columns, expressions), rows, batch_size)
+
+def updateFrequencyPercentages(conn_metadata, cursor_metadata, metadata_table, server_name, table_catalog, table_schema, table_name, column_name):
+    """
+    Updates FREQUENCY_PERCENTAGE of all the values of a column of `data_values` or `dates`
+    with a single set-based statement, instead of one update per data value.
+    """
+    if metadata_table not in ('data_values', 'dates'):
+        raise ValueError('Frequencies are only stored in data_values and dates: {}'.format(metadata_table))
+    if METADATA_ENGINE in ('mssqlserver', 'sqlite'):
+        where = """SERVER_NAME = ?
+                    AND TABLE_CATALOG = ?
+                    AND TABLE_SCHEMA = ?
+                    AND TABLE_NAME = ?
+                    AND COLUMN_NAME = ?"""
+    elif METADATA_ENGINE in ('mysql', 'postgres'):
+        where = """SERVER_NAME = %s
+                    AND TABLE_CATALOG = %s
+                    AND TABLE_SCHEMA = %s
+                    AND TABLE_NAME = %s
+                    AND COLUMN_NAME = %s"""
+    sql_update = """UPDATE {0} 
+                    SET FREQUENCY_PERCENTAGE = FREQUENCY_NUMBER * 1.0 / (
+                        SELECT TOTAL FROM (SELECT NULLIF(SUM(FREQUENCY_NUMBER), 0) AS TOTAL
+                                            FROM {0}
+                                            WHERE {1}) AS t)
+                    WHERE {1};""".format(metadataTable(metadata_table), where)
+    key = (server_name, table_catalog, table_schema, table_name, column_name)
+    cursor_metadata.execute(sql_update, key + key)
+    conn_metadata.commit()
+    return
+
+def set_pool_size(max_size, max_idle = 300):
+    global POOL_SIZE
+    global POOL_MAX_IDLE
+
+    POOL_SIZE = max_size
+    POOL_MAX_IDLE = max_idle
+    close_connection_pools()
+    return
+
+def ensurePoolSize(min_size):
+    """
+    Grows the connection pools to at least `min_size` connections, keeping the ones in use.
+    """
+    global POOL_SIZE
+
+    with pools_lock:
+        if POOL_SIZE >= min_size:
+            return
+        POOL_SIZE = min_size
+        for pool in (source_pool, metadata_pool):
+            if pool is not None:
+                pool.resize(min_size)
+    return
+
 """
 SOURCE_ENGINE = ''
 METADATA_ENGINE = ''
@@ -177,6 +882,16 @@ def test_source_connection():
             print('[', colored('OK', 'green'), ']', '\tConnection to the source tested successfully...')
             cursor_source = get_db_cursor(conn_source)
             print('[', colored('OK', 'green'), ']', '\tCursor to the source tested successfully...')
+        elif SOURCE_ENGINE == 'postgres':
+            conn_source = get_postgres_connection(source_connection_params)
+            print('[', colored('OK', 'green'), ']', '\tConnection to the source tested successfully...')
+            cursor_source = get_db_cursor(conn_source)
+            print('[', colored('OK', 'green'), ']', '\tCursor to the source tested successfully...')
+        elif SOURCE_ENGINE == 'sqlite':
+            conn_source = get_sqlite_source_connection(source_connection_params)
+            print('[', colored('OK', 'green'), ']', '\tConnection to the source tested successfully...')
+            cursor_source = get_db_cursor(conn_source)
+            print('[', colored('OK', 'green'), ']', '\tCursor to the source tested successfully...')
         return
     except:
         print('[', colored('Error', 'red'), ']', "\tCan't establish connection to the source database...")
@@ -186,16 +901,26 @@ def test_source_connection():
 
 def test_metadata_connection():
     try:
-        if SOURCE_ENGINE == 'mssqlserver':
+        if METADATA_ENGINE == 'mssqlserver':
             conn_metadata = get_db_connection(metadata_connection_params)
             print('[', colored('OK', 'green'), ']', '\tConnection to the metadata database tested successfully...')
-            cursor_metadata = conn_metadata.cursor('metadata')
+            cursor_metadata = get_db_cursor(conn_metadata)
             print('[', colored('OK', 'green'), ']', '\tCursor to the metadata database tested successfully...')
-        elif SOURCE_ENGINE == 'mysql':
+        elif METADATA_ENGINE == 'mysql':
             conn_metadata = get_mysql_connection('metadata')
             print('[', colored('OK', 'green'), ']', '\tConnection to the metadata database tested successfully...')
             cursor_metadata = get_db_cursor(conn_metadata)
             print('[', colored('OK', 'green'), ']', '\tCursor to the metadata database tested successfully...')
+        elif METADATA_ENGINE == 'postgres':
+            conn_metadata = get_postgres_connection(metadata_connection_params)
+            print('[', colored('OK', 'green'), ']', '\tConnection to the metadata database tested successfully...')
+            cursor_metadata = get_db_cursor(conn_metadata)
+            print('[', colored('OK', 'green'), ']', '\tCursor to the metadata database tested successfully...')
+        elif METADATA_ENGINE == 'sqlite':
+            conn_metadata = get_sqlite_metadata_connection(metadata_connection_params)
+            print('[', colored('OK', 'green'), ']', '\tConnection to the metadata database tested successfully...')
+            cursor_metadata = get_db_cursor(conn_metadata)
+            print('[', colored('OK', 'green'), ']', '\tCursor to the metadata database tested successfully...')
     except:
         print('[', colored('Error', 'red'), ']', "\tCan't establish connection to the metadata database...")
     finally:
@@ -208,6 +933,7 @@ def setSourceConnection(engine_type, connection_string):
 
     SOURCE_ENGINE = engine_type
     source_connection_params = connection_string
+    close_connection_pools()
     return
 
 def setMetadataConnection(engine_type, connection_string):
@@ -216,11 +942,82 @@ def setMetadataConnection(engine_type, connection_string):
 
     METADATA_ENGINE = engine_type
     metadata_connection_params = connection_string
+    close_connection_pools()
+    return
+
+def getCompletedUnits(stage, server_name, table_catalog, table_schema, table_name = None):
+    """
+    Returns the set of (TABLE_NAME, COLUMN_NAME) already completed for a stage
+    according to the `ledger`. A whole table (or stage) is stored with empty names.
+    """
+    if METADATA_ENGINE in ('mssqlserver', 'sqlite'):
+        sql = """select TABLE_NAME, COLUMN_NAME from ledger
+                WHERE STAGE = ?
+                AND SERVER_NAME = ?
+                AND TABLE_CATALOG = ?
+                AND TABLE_SCHEMA = ?"""
+    elif METADATA_ENGINE in ('mysql', 'postgres'):
+        sql = """select TABLE_NAME, COLUMN_NAME from ledger
+                WHERE STAGE = %s
+                AND SERVER_NAME = %s
+                AND TABLE_CATALOG = %s
+                AND TABLE_SCHEMA = %s"""
+    params = (stage, server_name, table_catalog, table_schema)
+    if table_name is not None:
+        sql += """
+                AND TABLE_NAME = {}""".format('?' if METADATA_ENGINE in ('mssqlserver', 'sqlite') else '%s')
+        params += (table_name,)
+
+    conn_metadata = get_metadata_connection()
+    cursor_metadata = conn_metadata.cursor()
+    cursor_metadata.execute(sql, params)
+    rows = cursor_metadata.fetchall()
+
+    cursor_metadata.close()
+    conn_metadata.close()
+    return set((row[0], row[1]) for row in rows)
+
+def markCompleted(stage, server_name, table_catalog, table_schema, table_name = '', column_name = ''):
+    """
+    Records in the `ledger` that a stage finished a column, a table (empty `column_name`)
+    or the whole schema (empty `table_name` and `column_name`).
+    """
+    key = (stage, server_name, table_catalog, table_schema, table_name, column_name)
+
+    conn_metadata = get_metadata_connection()
+    cursor_metadata = conn_metadata.cursor()
+    cursor_metadata.execute(getUpsertSql('ledger', METADATA_KEYS['ledger'], {'COMPLETED_AT': 'CURRENT_TIMESTAMP'}), key)
+    conn_metadata.commit()
+
+    cursor_metadata.close()
+    conn_metadata.close()
+    return
+
+def clearLedger(server_name, table_catalog, table_schema):
+    """
+    Forgets the progress of previous runs over a schema, so everything is profiled again.
+    """
+    if METADATA_ENGINE in ('mssqlserver', 'sqlite'):
+        sql = """delete from ledger
+                WHERE SERVER_NAME = ?
+                AND TABLE_CATALOG = ?
+                AND TABLE_SCHEMA = ?;"""
+    elif METADATA_ENGINE in ('mysql', 'postgres'):
+        sql = """delete from ledger
+                WHERE SERVER_NAME = %s
+                AND TABLE_CATALOG = %s
+                AND TABLE_SCHEMA = %s;"""
+    conn_metadata = get_metadata_connection()
+    cursor_metadata = conn_metadata.cursor()
+    cursor_metadata.execute(sql, (server_name, table_catalog, table_schema))
+    conn_metadata.commit()
+
+    cursor_metadata.close()
+    conn_metadata.close()
     return
 
 def getColumnsFromServer(server_name, table_catalog, table_schema):
-    if METADATA_ENGINE == 'mssqlserver':
-        conn_metadata = get_db_connection(metadata_connection_params)
+    if METADATA_ENGINE in ('mssqlserver', 'sqlite'):
         sql = """select distinct SERVER_NAME 
                 , TABLE_CATALOG 
                 , TABLE_SCHEMA 
@@ -229,8 +1026,7 @@ def getColumnsFromServer(server_name, table_catalog, table_schema):
                 where SERVER_NAME = ?
                 AND TABLE_CATALOG = ?
                 AND TABLE_SCHEMA = ?;"""
-    elif METADATA_ENGINE == 'mysql':
-        conn_metadata = get_mysql_connection('metadata')
+    elif METADATA_ENGINE in ('mysql', 'postgres'):
         sql = """select distinct SERVER_NAME 
                 , TABLE_CATALOG 
                 , TABLE_SCHEMA 
@@ -240,6 +1036,7 @@ def getColumnsFromServer(server_name, table_catalog, table_schema):
                 AND TABLE_CATALOG = %s
                 AND TABLE_SCHEMA = %s;"""
     
+    conn_metadata = get_metadata_connection()
     cursor_metadata = conn_metadata.cursor()
     cursor_metadata.execute(sql, (server_name,table_catalog, table_schema))
     rows = cursor_metadata.fetchall()
@@ -249,113 +1046,1369 @@ def getColumnsFromServer(server_name, table_catalog, table_schema):
     return rows
 
 def insertOrUpdateColumns(conn_metadata, cursor_metadata, server_name, table_catalog, table_schema, table_name, column_name, ordinal_position, data_type, verbose= False):
-    def checkIfTableExistInColumns(server_name, table_catalog, table_schema, table_name, column_name):
-        if METADATA_ENGINE == 'mssqlserver':
-            sql = """select * from columns
-                WHERE SERVER_NAME = ?
-                AND TABLE_CATALOG = ?
-                AND TABLE_SCHEMA = ?
-                AND TABLE_NAME = ?
-                AND COLUMN_NAME = ?;"""
-        elif METADATA_ENGINE == 'mysql':
-            sql = """select * from columns
-                WHERE SERVER_NAME = %s
-                AND TABLE_CATALOG = %s
-                AND TABLE_SCHEMA = %s
-                AND TABLE_NAME = %s
-                AND COLUMN_NAME = %s;"""
-    
-        cursor_metadata.execute(sql, (server_name, table_catalog, table_schema, table_name, column_name))
-        return len(cursor_metadata.fetchall())
-    
-    if checkIfTableExistInColumns(server_name, table_catalog, table_schema, table_name, column_name):
-        if METADATA_ENGINE == 'mssqlserver':
-            sql = """delete from columns
-                WHERE SERVER_NAME = ?
-                    AND TABLE_CATALOG = ?
-                    AND TABLE_SCHEMA = ?
-                    AND TABLE_NAME = ?
-                    AND COLUMN_NAME = ?;"""
-        elif METADATA_ENGINE == 'mysql':
-            sql = """delete from columns
-                WHERE SERVER_NAME = %s
-                    AND TABLE_CATALOG = %s
-                    AND TABLE_SCHEMA = %s
-                    AND TABLE_NAME = %s
-                    AND COLUMN_NAME = %s;"""
-    
-        cursor_metadata.execute(sql, (server_name, table_catalog, table_schema, table_name, column_name))
-        conn_metadata.commit()
-    
-    if METADATA_ENGINE == 'mssqlserver':
-        sql = """insert into columns (SERVER_NAME, TABLE_CATALOG, TABLE_SCHEMA, TABLE_NAME, COLUMN_NAME, ORDINAL_POSITION, DATA_TYPE)
-                values (?, ?, ?, ?, ?, ?, ?)"""
-    elif METADATA_ENGINE == 'mysql':
-        sql = """insert into columns (SERVER_NAME, TABLE_CATALOG, TABLE_SCHEMA, TABLE_NAME, COLUMN_NAME, ORDINAL_POSITION, DATA_TYPE)
-                values (%s, %s, %s, %s, %s, %s, %s)"""
-    cursor_metadata.execute(sql, (server_name, table_catalog, table_schema, table_name, column_name, ordinal_position, data_type))
+    cursor_metadata.execute(getUpsertSql('columns', COLUMNS_COLUMNS), (server_name, table_catalog, table_schema, table_name, column_name, ordinal_position, data_type))
     conn_metadata.commit()
+    invalidateMetadata(server_name, table_catalog, table_schema, table_name)
     if verbose:
         logger.info('{}.{}.{}.{}.{} has been updated into columns...'.format(server_name, table_catalog, table_schema, table_name, column_name))
     return
 
-def insertOrUpdateTables(server_name, table_catalog, table_schema, table_name, verbose = False, ignore_views = True):
+def loadMetadata(server_name, table_catalog, table_schema, table_name = None):
     """
-    Stores the number of columns and the number of rows of the table.
-    Each row is one table.
+    Reads the rows of `columns`, `uniques` and `tables` of a table, or of every table of
+    the schema without `table_name`, with one query per metadata table.
+    Returns {TABLE_NAME: {'columns': [(COLUMN_NAME, ORDINAL_POSITION, DATA_TYPE)],
+    'constraints': {COLUMN_NAME: (IS_NULLABLE, IS_PRIMARY_KEY, IS_UNIQUE)},
+    'uniques': {COLUMN_NAME: (DISTINCT_VALUES, NULL_VALUES)}, 'n_rows': N_ROWS,
+    'n_rows_estimated': N_ROWS_ESTIMATED}}.
+    """
+    parameter = '?' if METADATA_ENGINE in ('mssqlserver', 'sqlite') else '%s'
+    where = """WHERE SERVER_NAME = {0}
+                AND TABLE_CATALOG = {0}
+                AND TABLE_SCHEMA = {0}""".format(parameter)
+    key = (server_name, table_catalog, table_schema)
+    if table_name is not None:
+        where += """
+                AND TABLE_NAME = {0}""".format(parameter)
+        key += (table_name,)
+
+    metadata = {}
+    def getEntry(table_name):
+        return metadata.setdefault(table_name, {'columns': [], 'constraints': {}, 'uniques': {}, 'n_rows': None, 'n_rows_estimated': None})
+
+    conn_metadata = get_metadata_connection()
+    cursor_metadata = conn_metadata.cursor()
+    try:
+        cursor_metadata.execute("""select TABLE_NAME
+                    , COLUMN_NAME
+                    , ORDINAL_POSITION
+                    , DATA_TYPE
+                    , IS_NULLABLE
+                    , IS_PRIMARY_KEY
+                    , IS_UNIQUE
+                from columns
+                {}
+                ORDER BY TABLE_NAME, ORDINAL_POSITION;""".format(where), key)
+        for row in cursor_metadata.fetchall():
+            getEntry(row[0])['columns'].append((row[1], row[2], row[3]))
+            getEntry(row[0])['constraints'][row[1]] = (row[4], row[5], row[6])
+        cursor_metadata.execute("""select TABLE_NAME
+                    , COLUMN_NAME
+                    , DISTINCT_VALUES
+                    , NULL_VALUES
+                from uniques
+                {};""".format(where), key)
+        for row in cursor_metadata.fetchall():
+            getEntry(row[0])['uniques'][row[1]] = (row[2], row[3])
+        cursor_metadata.execute("""select TABLE_NAME
+                    , N_ROWS
+                    , N_ROWS_ESTIMATED
+                from tables
+                {};""".format(where), key)
+        for row in cursor_metadata.fetchall():
+            getEntry(row[0])['n_rows'] = row[1]
+            getEntry(row[0])['n_rows_estimated'] = row[2]
+    finally:
+        cursor_metadata.close()
+        conn_metadata.close()
+    if table_name is not None:
+        # Tables without metadata are cached too, as empty
+        getEntry(table_name)
+    return metadata
+
+def cacheMetadata(server_name, table_catalog, table_schema, table_name, metadata):
+    key = (server_name, table_catalog, table_schema, table_name)
+    with metadata_cache_lock:
+        metadata_cache[key] = metadata
+        metadata_cache.move_to_end(key)
+        while len(metadata_cache) > METADATA_CACHE_SIZE:
+            metadata_cache.popitem(last = False)
+    return
+
+def getTableMetadata(server_name, table_catalog, table_schema, table_name):
+    """
+    Columns, distinct and NULL values and number of rows of a table, as returned by
+    loadMetadata, served from the metadata cache and read on a miss.
+    The result is shared, it must not be modified.
+    """
+    key = (server_name, table_catalog, table_schema, table_name)
+    with metadata_cache_lock:
+        if key in metadata_cache:
+            metadata_cache.move_to_end(key)
+            return metadata_cache[key]
+    metadata = loadMetadata(server_name, table_catalog, table_schema, table_name)[table_name]
+    cacheMetadata(server_name, table_catalog, table_schema, table_name, metadata)
+    return metadata
+
+def prefetchMetadata(server_name, table_catalog, table_schema):
+    """
+    Loads the metadata of every table of the schema in the cache at once,
+    the largest tables are kept when they don't all fit.
+    """
+    metadata = loadMetadata(server_name, table_catalog, table_schema)
+    tables = sorted(metadata.items(), key = lambda item: item[1]['n_rows'] or 0)
+    for table_name, table_metadata in tables[-METADATA_CACHE_SIZE:]:
+        cacheMetadata(server_name, table_catalog, table_schema, table_name, table_metadata)
+    return
+
+def invalidateMetadata(server_name, table_catalog, table_schema, table_name = None):
+    """
+    Drops a table, or every table of the schema, from the metadata cache.
+    Called after writing `columns`, `uniques` or `tables`.
+    """
+    with metadata_cache_lock:
+        for key in list(metadata_cache):
+            if key[:3] == (server_name, table_catalog, table_schema) and (table_name is None or key[3] == table_name):
+                del metadata_cache[key]
+    return
+
+def getColumnsOfTypes(server_name, table_catalog, table_schema, table_name, data_types = None, exclude_types = ()):
+    """
+    Columns of a table from the metadata cache as (SERVER_NAME, TABLE_CATALOG, TABLE_SCHEMA,
+    TABLE_NAME, COLUMN_NAME), those of `data_types` (any if None) and not of `exclude_types`.
+    """
+    columns = getTableMetadata(server_name, table_catalog, table_schema, table_name)['columns']
+    return [(server_name, table_catalog, table_schema, table_name, column_name) for column_name, ordinal_position, data_type in columns
+            if (data_types is None or data_type in data_types) and data_type not in exclude_types]
+
+def getTableNumberOfRows(server_name, table_catalog, table_schema, table_name):
+    """
+    N_ROWS of a table as stored in `tables` by fill_tables.
+    """
+    return getTableMetadata(server_name, table_catalog, table_schema, table_name)['n_rows']
+
+def getColumnConstraints(server_name, table_catalog, table_schema, table_name, column_name):
+    """
+    (IS_NULLABLE, IS_PRIMARY_KEY, IS_UNIQUE) of a column as stored by fill_columns,
+    None for what isn't known.
+    """
+    constraints = getTableMetadata(server_name, table_catalog, table_schema, table_name)['constraints']
+    return constraints.get(column_name) or (None, None, None)
+
+def isUniqueColumn(server_name, table_catalog, table_schema, table_name, column_name):
+    return getColumnConstraints(server_name, table_catalog, table_schema, table_name, column_name)[2] == 1
+
+def isNotNullColumn(server_name, table_catalog, table_schema, table_name, column_name):
+    return getColumnConstraints(server_name, table_catalog, table_schema, table_name, column_name)[0] == 0
+
+def getExactNumberOfRows(server_name, table_catalog, table_schema, table_name):
+    """
+    N_ROWS of a table, counted in the source and stored when fill_tables only estimated it.
+    """
+    metadata = getTableMetadata(server_name, table_catalog, table_schema, table_name)
+    if metadata['n_rows'] is not None and not metadata['n_rows_estimated']:
+        return metadata['n_rows']
+    conn_source = get_source_connection()
+    cursor_source = get_db_cursor(conn_source)
+    conn_metadata = get_metadata_connection()
+    cursor_metadata = conn_metadata.cursor()
+    try:
+        return updateTableNumberOfRows(cursor_source, conn_metadata, cursor_metadata, server_name, table_catalog, table_schema, table_name)
+    finally:
+        cursor_source.close()
+        conn_source.close()
+        cursor_metadata.close()
+        conn_metadata.close()
+
+def updateTableNumberOfRows(cursor_source, conn_metadata, cursor_metadata, server_name, table_catalog, table_schema, table_name):
+    """
+    Counts the rows of a table in the source and stores it in N_ROWS of `tables`.
+    Returns the number of rows.
+    """
+    query = """select count(*) as n from {}.{}""".format(table_schema, table_name)
+    cursor_source.execute(query)
+    num_rows = cursor_source.fetchone()
+
+    if METADATA_ENGINE in ('mssqlserver', 'sqlite'):
+        sql_update = """UPDATE tables 
+                        SET N_ROWS = ? 
+                        , N_ROWS_ESTIMATED = 0
+                        WHERE SERVER_NAME = ?
+                        AND TABLE_CATALOG = ?
+                        AND TABLE_SCHEMA = ?
+                        AND TABLE_NAME = ?;"""
+    elif METADATA_ENGINE in ('mysql', 'postgres'):
+        sql_update = """UPDATE tables 
+                        SET N_ROWS = %s
+                        , N_ROWS_ESTIMATED = 0
+                        WHERE SERVER_NAME = %s
+                        AND TABLE_CATALOG = %s
+                        AND TABLE_SCHEMA = %s
+                        AND TABLE_NAME = %s;"""
+    cursor_metadata.execute(sql_update, (num_rows[0], server_name, table_catalog, table_schema, table_name))
+    conn_metadata.commit()
+    invalidateMetadata(server_name, table_catalog, table_schema, table_name)
+    return num_rows[0]
+
+def getSourceConstraints(cursor_source, table_catalog, table_schema):
+    """
+    Primary key and unique key columns of every table of a schema, read from the catalog.
+    Returns a dictionary {(TABLE_NAME, COLUMN_NAME): (IS_PRIMARY_KEY, IS_UNIQUE)}, IS_UNIQUE
+    when the column alone is the primary key or a unique key. Unique indexes of SQL Server
+    count too, filtered ones don't.
     """
     if SOURCE_ENGINE == 'mssqlserver':
-        conn_source = get_db_connection(source_connection_params)
+        sql = """SELECT T.name AS TABLE_NAME
+                    , COL.name AS COLUMN_NAME
+                    , MAX(CAST(I.is_primary_key AS int)) AS IS_PRIMARY_KEY
+                    , MAX(CASE WHEN K.N_KEYS = 1 THEN 1 ELSE 0 END) AS IS_UNIQUE
+                FROM sys.indexes AS I
+                INNER JOIN sys.index_columns AS IC ON IC.object_id = I.object_id
+                    AND IC.index_id = I.index_id
+                    AND IC.is_included_column = 0
+                INNER JOIN (SELECT object_id, index_id, COUNT(*) AS N_KEYS
+                            FROM sys.index_columns
+                            WHERE is_included_column = 0
+                            GROUP BY object_id, index_id) AS K ON K.object_id = I.object_id
+                    AND K.index_id = I.index_id
+                INNER JOIN sys.columns AS COL ON COL.object_id = IC.object_id
+                    AND COL.column_id = IC.column_id
+                INNER JOIN sys.tables AS T ON T.object_id = I.object_id
+                INNER JOIN sys.schemas AS S ON S.schema_id = T.schema_id
+                WHERE DB_NAME() = ?
+                AND S.name = ?
+                AND (I.is_primary_key = 1 OR I.is_unique = 1)
+                AND I.has_filter = 0
+                GROUP BY T.name, COL.name;"""
+    elif SOURCE_ENGINE in ('mysql', 'postgres'):
+        sql = """SELECT KCU.TABLE_NAME
+                    , KCU.COLUMN_NAME
+                    , MAX(CASE WHEN TC.CONSTRAINT_TYPE = 'PRIMARY KEY' THEN 1 ELSE 0 END) AS IS_PRIMARY_KEY
+                    , MAX(CASE WHEN K.N_KEYS = 1 THEN 1 ELSE 0 END) AS IS_UNIQUE
+                FROM INFORMATION_SCHEMA.TABLE_CONSTRAINTS AS TC
+                INNER JOIN INFORMATION_SCHEMA.KEY_COLUMN_USAGE AS KCU ON KCU.CONSTRAINT_SCHEMA = TC.CONSTRAINT_SCHEMA
+                    AND KCU.CONSTRAINT_NAME = TC.CONSTRAINT_NAME
+                    AND KCU.TABLE_NAME = TC.TABLE_NAME
+                INNER JOIN (SELECT CONSTRAINT_SCHEMA, CONSTRAINT_NAME, TABLE_NAME, COUNT(*) AS N_KEYS
+                            FROM INFORMATION_SCHEMA.KEY_COLUMN_USAGE
+                            GROUP BY CONSTRAINT_SCHEMA, CONSTRAINT_NAME, TABLE_NAME) AS K ON K.CONSTRAINT_SCHEMA = TC.CONSTRAINT_SCHEMA
+                    AND K.CONSTRAINT_NAME = TC.CONSTRAINT_NAME
+                    AND K.TABLE_NAME = TC.TABLE_NAME
+                WHERE TC.CONSTRAINT_TYPE IN ('PRIMARY KEY', 'UNIQUE')
+                AND TC.TABLE_CATALOG = %s
+                AND TC.TABLE_SCHEMA = %s
+                GROUP BY KCU.TABLE_NAME, KCU.COLUMN_NAME;"""
+    elif SOURCE_ENGINE == 'sqlite':
+        sql = """WITH S AS (SELECT ? AS TABLE_CATALOG, ? AS TABLE_SCHEMA)
+                , M AS (SELECT name FROM {}.sqlite_master WHERE type = 'table')
+                SELECT K.TABLE_NAME
+                    , K.COLUMN_NAME
+                    , MAX(K.IS_PRIMARY_KEY) AS IS_PRIMARY_KEY
+                    , MAX(K.IS_UNIQUE) AS IS_UNIQUE
+                FROM (SELECT M.name AS TABLE_NAME
+                        , C.name AS COLUMN_NAME
+                        , 1 AS IS_PRIMARY_KEY
+                        , CASE WHEN (SELECT COUNT(*) FROM pragma_table_info(M.name, S.TABLE_SCHEMA) WHERE pk > 0) = 1 THEN 1 ELSE 0 END AS IS_UNIQUE
+                    FROM S CROSS JOIN M CROSS JOIN pragma_table_info(M.name, S.TABLE_SCHEMA) AS C
+                    WHERE C.pk > 0
+                    UNION ALL
+                    SELECT M.name, I.name, 0, 1
+                    FROM S CROSS JOIN M CROSS JOIN pragma_index_list(M.name, S.TABLE_SCHEMA) AS L CROSS JOIN pragma_index_info(L.name, S.TABLE_SCHEMA) AS I
+                    WHERE L."unique" = 1
+                    AND L.partial = 0
+                    AND I.name IS NOT NULL
+                    AND (SELECT COUNT(*) FROM pragma_index_info(L.name, S.TABLE_SCHEMA)) = 1) AS K
+                GROUP BY K.TABLE_NAME, K.COLUMN_NAME;""".format(quoteIdentifier(table_schema))
+    else:
+        return {}
+    cursor_source.execute(sql, (table_catalog, table_schema))
+    return {(row[0], row[1]): (row[2], row[3]) for row in cursor_source.fetchall()}
+
+def getCatalogStatistics(cursor_source, table_catalog, table_schema, table_name):
+    """
+    Statistics kept by the source engine about the columns of a table, read from its
+    catalog without scanning the table. Returns {COLUMN_NAME: {
+    'age': days since they were computed (None if unknown),
+    'modified_rows': rows modified since then (None if unknown),
+    'n_rows': rows of the table when they were computed,
+    'distinct': estimated distinct non NULL values (None if unknown),
+    'null_fraction': fraction of NULL rows (None if unknown),
+    'buckets': [(LOWER, UPPER, FRACTION)] fraction of the rows with LOWER <= value <= UPPER,
+    buckets with LOWER == UPPER are values with a known frequency}}.
+    Columns without statistics are missing.
+    """
+    if SOURCE_ENGINE == 'mssqlserver':
+        return getSqlServerCatalogStatistics(cursor_source, table_catalog, table_schema, table_name)
+    elif SOURCE_ENGINE == 'postgres':
+        return getPostgresCatalogStatistics(cursor_source, table_catalog, table_schema, table_name)
     elif SOURCE_ENGINE == 'mysql':
-        conn_source = get_mysql_connection('source')
-    cursor_source = get_db_cursor(conn_source)
+        return getMySqlCatalogStatistics(cursor_source, table_catalog, table_schema, table_name)
+    elif SOURCE_ENGINE == 'sqlite':
+        return getSqliteCatalogStatistics(cursor_source, table_catalog, table_schema, table_name)
+    return {}
 
-    if METADATA_ENGINE == 'mssqlserver':
-        conn_metadata = get_db_connection(metadata_connection_params)
-    elif METADATA_ENGINE == 'mysql':
-        conn_metadata = get_mysql_connection('metadata')
+def getSqlServerCatalogStatistics(cursor_source, table_catalog, table_schema, table_name):
+    """
+    Histogram steps of the most recent unfiltered statistics led by each column,
+    from sys.dm_db_stats_histogram or DBCC SHOW_STATISTICS on versions without it.
+    NULLs are the first step, with a NULL RANGE_HI_KEY.
+    """
+    properties = """SELECT C.name AS COLUMN_NAME
+                    , S.stats_id
+                    , S.name AS STATS_NAME
+                    , DATEDIFF(SECOND, SP.last_updated, GETDATE()) / 86400.0 AS AGE
+                    , SP.rows
+                    , SP.modification_counter
+                {}
+                FROM sys.stats AS S
+                INNER JOIN sys.stats_columns AS SC ON SC.object_id = S.object_id
+                    AND SC.stats_id = S.stats_id
+                    AND SC.stats_column_id = 1
+                INNER JOIN sys.columns AS C ON C.object_id = SC.object_id
+                    AND C.column_id = SC.column_id
+                CROSS APPLY sys.dm_db_stats_properties(S.object_id, S.stats_id) AS SP
+                {}
+                WHERE S.object_id = OBJECT_ID(QUOTENAME(?) + '.' + QUOTENAME(?))
+                AND S.has_filter = 0
+                ORDER BY C.name, SP.last_updated DESC, S.stats_id{};"""
+    sql = properties.format("""    , H.step_number
+                    , CAST(H.range_high_key AS NVARCHAR(4000)) AS RANGE_HI_KEY
+                    , H.range_rows
+                    , H.equal_rows
+                    , H.distinct_range_rows""", 'CROSS APPLY sys.dm_db_stats_histogram(S.object_id, S.stats_id) AS H', ', H.step_number')
+    try:
+        cursor_source.execute(sql, (table_schema, table_name))
+        rows = cursor_source.fetchall()
+    except:
+        # sys.dm_db_stats_histogram needs SQL Server 2016 SP1 CU2
+        cursor_source.execute(properties.format('', '', ''), (table_schema, table_name))
+        rows = []
+        for column_name, stats_id, stats_name, age, n_rows, modified_rows in cursor_source.fetchall():
+            cursor_source.execute("""DBCC SHOW_STATISTICS ('{}.{}', {}) WITH HISTOGRAM;""".format(table_schema, table_name, quoteIdentifier(stats_name)))
+            for step_number, step in enumerate(cursor_source.fetchall(), 1):
+                rows.append((column_name, stats_id, stats_name, age, n_rows, modified_rows, step_number, None if step[0] is None else str(step[0]), step[1], step[2], step[3]))
+
+    statistics = {}
+    stats_ids = {}
+    for column_name, stats_id, stats_name, age, n_rows, modified_rows, step_number, key, range_rows, equal_rows, distinct_range_rows in rows:
+        # The rows are ordered by the most recent statistics of each column first
+        if stats_ids.setdefault(column_name, stats_id) != stats_id or not n_rows:
+            continue
+        if column_name not in statistics:
+            statistics[column_name] = {'age': None if age is None else float(age), 'modified_rows': modified_rows, 'n_rows': n_rows
+                                       , 'distinct': 0, 'null_fraction': 0.0, 'buckets': [], 'previous': None}
+        column = statistics[column_name]
+        if key is None:
+            column['null_fraction'] = float(equal_rows) / n_rows
+            continue
+        if range_rows and column['previous'] is not None:
+            column['buckets'].append((column['previous'], key, float(range_rows) / n_rows))
+        column['buckets'].append((key, key, float(equal_rows) / n_rows))
+        column['distinct'] += 1 + int(round(distinct_range_rows or 0))
+        column['previous'] = key
+    for column in statistics.values():
+        del column['previous']
+    return statistics
+
+def getPostgresCatalogStatistics(cursor_source, table_catalog, table_schema, table_name):
+    """
+    pg_stats of the columns of a table: most common values and an equi-depth histogram
+    of the other values. A negative n_distinct is a fraction of the rows.
+    """
+    sql = """SELECT S.attname
+                , S.null_frac
+                , S.n_distinct
+                , S.most_common_vals::text::text[]
+                , S.most_common_freqs
+                , S.histogram_bounds::text::text[]
+                , EXTRACT(EPOCH FROM now() - GREATEST(T.last_analyze, T.last_autoanalyze)) / 86400 AS AGE
+                , T.n_mod_since_analyze
+                , C.reltuples
+            FROM pg_stats AS S
+            INNER JOIN pg_stat_user_tables AS T ON T.schemaname = S.schemaname
+                AND T.relname = S.tablename
+            INNER JOIN pg_class AS C ON C.oid = T.relid
+            WHERE current_database() = %s
+            AND S.schemaname = %s
+            AND S.tablename = %s
+            ORDER BY S.attname, S.inherited;"""
+    cursor_source.execute(sql, (table_catalog, table_schema, table_name))
+
+    statistics = {}
+    for column_name, null_fraction, n_distinct, values, frequencies, bounds, age, modified_rows, n_rows in cursor_source.fetchall():
+        if column_name in statistics or not n_rows or n_rows < 0:
+            continue
+        values = values or []
+        frequencies = frequencies or []
+        bounds = bounds or []
+        buckets = [(value, value, float(frequency)) for value, frequency in zip(values, frequencies)]
+        if len(bounds) > 1:
+            # The histogram splits the rows that aren't NULL or a most common value in equal parts
+            fraction = max(1 - float(null_fraction) - sum(frequencies), 0.0) / (len(bounds) - 1)
+            buckets.extend((lower, upper, fraction) for lower, upper in zip(bounds[:-1], bounds[1:]))
+        statistics[column_name] = {'age': None if age is None else float(age)
+                                   , 'modified_rows': modified_rows
+                                   , 'n_rows': int(n_rows)
+                                   , 'distinct': float(n_distinct) if n_distinct >= 0 else -float(n_distinct) * float(n_rows)
+                                   , 'null_fraction': float(null_fraction)
+                                   , 'buckets': buckets}
+    return statistics
+
+def decodeMySqlHistogramValue(value):
+    # Strings are stored as base64:type<N>:<data>
+    if isinstance(value, str) and value.startswith('base64:'):
+        return base64.b64decode(value.split(':', 2)[2]).decode('utf-8', 'replace')
+    return value
+
+def getMySqlCatalogStatistics(cursor_source, table_catalog, table_schema, table_name):
+    """
+    Histograms of MySQL 8 (ANALYZE TABLE ... UPDATE HISTOGRAM), singleton or equi-height,
+    with cumulative frequencies over all the rows. MySQL doesn't count the modified rows,
+    a table updated after its histograms is taken as completely modified.
+    """
+    sql = """SELECT CS.COLUMN_NAME
+                , CS.HISTOGRAM
+                , TIMESTAMPDIFF(SECOND, CAST(JSON_UNQUOTE(JSON_EXTRACT(CS.HISTOGRAM, '$."last-updated"')) AS DATETIME(6)), UTC_TIMESTAMP()) / 86400 AS AGE
+                , TIMESTAMPDIFF(SECOND, T.UPDATE_TIME, NOW()) / 86400 AS UPDATE_AGE
+                , T.TABLE_ROWS
+            FROM INFORMATION_SCHEMA.COLUMN_STATISTICS AS CS
+            INNER JOIN INFORMATION_SCHEMA.TABLES AS T ON T.TABLE_SCHEMA = CS.SCHEMA_NAME
+                AND T.TABLE_NAME = CS.TABLE_NAME
+            WHERE CS.SCHEMA_NAME = %s
+            AND CS.TABLE_NAME = %s;"""
+    cursor_source.execute(sql, (table_schema, table_name))
+
+    statistics = {}
+    for column_name, histogram, age, update_age, n_rows in cursor_source.fetchall():
+        if not n_rows:
+            continue
+        histogram = json.loads(histogram)
+        buckets = []
+        distinct = 0
+        cumulative = 0.0
+        for bucket in histogram['buckets']:
+            if histogram['histogram-type'] == 'singleton':
+                value = decodeMySqlHistogramValue(bucket[0])
+                buckets.append((value, value, bucket[1] - cumulative))
+                cumulative = bucket[1]
+                distinct += 1
+            else:
+                buckets.append((decodeMySqlHistogramValue(bucket[0]), decodeMySqlHistogramValue(bucket[1]), bucket[2] - cumulative))
+                cumulative = bucket[2]
+                distinct += bucket[3]
+        modified_rows = None
+        if update_age is not None and age is not None:
+            modified_rows = n_rows if update_age < age else 0
+        statistics[column_name] = {'age': None if age is None else float(age)
+                                   , 'modified_rows': modified_rows
+                                   , 'n_rows': n_rows
+                                   , 'distinct': distinct
+                                   , 'null_fraction': histogram.get('null-values')
+                                   , 'buckets': buckets}
+    return statistics
+
+def getSqliteCatalogStatistics(cursor_source, table_catalog, table_schema, table_name):
+    """
+    Statistics of the columns leading an index, available after ANALYZE: distinct values
+    from sqlite_stat1 and, when SQLite was built with STAT4, the frequencies of the sampled
+    values and the rows between them from sqlite_stat4. SQLite keeps no dates, its
+    statistics are taken as fresh.
+    sqlite_stat1 keeps the rows per value rounded up, with 1 or 2 rows per value the
+    distinct values could be anything from a half to all the rows and are left unknown.
+    """
+    try:
+        cursor_source.execute("""SELECT idx, stat FROM {}.sqlite_stat1 WHERE tbl = ? AND idx IS NOT NULL;""".format(quoteIdentifier(table_schema)), (table_name,))
+        stats = cursor_source.fetchall()
+    except sqlite3.OperationalError:
+        # The database was never analysed
+        return {}
+    indexes = {}
+    for index_name, stat in stats:
+        numbers = stat.split(' ')
+        cursor_source.execute("""PRAGMA {}.index_info({});""".format(quoteIdentifier(table_schema), quoteIdentifier(index_name)))
+        info = sorted(cursor_source.fetchall())
+        if info and info[0][2] is not None and len(numbers) > 1:
+            indexes[index_name] = (info[0][2], int(numbers[0]), int(numbers[1]))
+    try:
+        cursor_source.execute("""SELECT idx, neq, nlt, sample FROM {}.sqlite_stat4 WHERE tbl = ?;""".format(quoteIdentifier(table_schema)), (table_name,))
+        samples = cursor_source.fetchall()
+    except sqlite3.OperationalError:
+        samples = []
+
+    statistics = {}
+    for index_name, (column_name, n_rows, rows_per_value) in indexes.items():
+        if column_name in statistics or not n_rows:
+            continue
+        statistics[column_name] = {'age': None, 'modified_rows': None, 'n_rows': n_rows
+                                   , 'distinct': n_rows / float(rows_per_value) if rows_per_value > 2 else None
+                                   , 'null_fraction': None, 'buckets': []}
+        column = statistics[column_name]
+        index_samples = sorted(((int(nlt.split(' ')[0]), int(neq.split(' ')[0]), decodeSqliteRecord(sample)[0]) for index, neq, nlt, sample in samples if index == index_name), key = lambda sample: sample[0])
+        previous = None
+        covered = 0
+        for nlt, neq, value in index_samples:
+            if nlt < covered:
+                # Another sample of the same leading value
+                continue
+            if value is None:
+                column['null_fraction'] = float(neq) / n_rows
+            else:
+                if previous is not None and nlt > covered:
+                    column['buckets'].append((previous, value, float(nlt - covered) / n_rows))
+                column['buckets'].append((value, value, float(neq) / n_rows))
+                previous = value
+            covered = nlt + neq
+        if column['null_fraction'] and column['distinct'] is not None:
+            # NULLs are one more key of the index
+            column['distinct'] = max(column['distinct'] - 1, 0)
+    return statistics
+
+def isFreshStatistics(statistics, max_age = None, max_modified = None):
+    """
+    Whether the statistics of a column can stand for a scan: computed less than `max_age`
+    days ago and with at most a `max_modified` fraction of the rows modified since.
+    What the engine doesn't keep isn't checked.
+    """
+    if max_age is not None and statistics['age'] is not None and statistics['age'] > max_age:
+        return False
+    if max_modified is not None and statistics['modified_rows'] is not None and statistics['modified_rows'] > max_modified * statistics['n_rows']:
+        return False
+    return True
+
+def getEstimatedNumberOfRows(cursor_source, table_catalog, table_schema):
+    """
+    Estimated number of rows of every table of a schema, read from the statistics
+    kept by the engine instead of counting the rows.
+    Returns a dictionary {TABLE_NAME: N_ROWS}, N_ROWS is None when the engine doesn't know:
+    PostgreSQL tables never analysed and InnoDB tables reporting 0 rows.
+    """
+    if SOURCE_ENGINE == 'mssqlserver':
+        sql = """SELECT T.name AS TABLE_NAME
+                    , SUM(PS.row_count) AS N_ROWS
+                FROM sys.dm_db_partition_stats AS PS
+                INNER JOIN sys.tables AS T ON PS.object_id = T.object_id
+                INNER JOIN sys.schemas AS S ON T.schema_id = S.schema_id
+                WHERE DB_NAME() = ?
+                AND S.name = ?
+                AND PS.index_id IN (0, 1)
+                GROUP BY T.name;"""
+        cursor_source.execute(sql, (table_catalog, table_schema))
+    elif SOURCE_ENGINE == 'mysql':
+        sql = """SELECT TABLE_NAME
+                    , CASE WHEN ENGINE = 'InnoDB' AND TABLE_ROWS = 0 THEN NULL ELSE TABLE_ROWS END AS N_ROWS
+                FROM INFORMATION_SCHEMA.TABLES
+                WHERE TABLE_CATALOG = %s
+                AND TABLE_SCHEMA = %s
+                AND TABLE_TYPE = 'BASE TABLE';"""
+        cursor_source.execute(sql, (table_catalog, table_schema))
+    elif SOURCE_ENGINE == 'postgres':
+        sql = """SELECT C.relname AS TABLE_NAME
+                    , CASE WHEN C.reltuples > 0 THEN CAST(C.reltuples AS BIGINT) END AS N_ROWS
+                FROM pg_class AS C
+                INNER JOIN pg_namespace AS N ON C.relnamespace = N.oid
+                WHERE current_database() = %s
+                AND N.nspname = %s
+                AND C.relkind IN ('r', 'p');"""
+        cursor_source.execute(sql, (table_catalog, table_schema))
+    elif SOURCE_ENGINE == 'sqlite':
+        # The first number of `stat` is the number of rows of the table, available after ANALYZE
+        try:
+            cursor_source.execute("""SELECT tbl, stat FROM {}.sqlite_stat1;""".format(quoteIdentifier(table_schema)))
+        except sqlite3.OperationalError:
+            return {}
+        estimates = {}
+        for table_name, stat in cursor_source.fetchall():
+            estimates[table_name] = max(estimates.get(table_name, 0), int(stat.split(' ')[0]))
+        return estimates
+    return {row[0]: row[1] for row in cursor_source.fetchall()}
+
+def updateEstimatedNumberOfRows(conn_metadata, cursor_metadata, server_name, table_catalog, table_schema, estimates):
+    """
+    Stores the estimated number of rows in `tables` flagging them with N_ROWS_ESTIMATED.
+    """
+    if METADATA_ENGINE in ('mssqlserver', 'sqlite'):
+        sql_update = """UPDATE tables 
+                        SET N_ROWS = ? 
+                        , N_ROWS_ESTIMATED = 1
+                        WHERE SERVER_NAME = ?
+                        AND TABLE_CATALOG = ?
+                        AND TABLE_SCHEMA = ?
+                        AND TABLE_NAME = ?;"""
+    elif METADATA_ENGINE in ('mysql', 'postgres'):
+        sql_update = """UPDATE tables 
+                        SET N_ROWS = %s
+                        , N_ROWS_ESTIMATED = 1
+                        WHERE SERVER_NAME = %s
+                        AND TABLE_CATALOG = %s
+                        AND TABLE_SCHEMA = %s
+                        AND TABLE_NAME = %s;"""
+    values = ((n_rows, server_name, table_catalog, table_schema, table_name) for table_name, n_rows in estimates.items())
+    insertManyRows(conn_metadata, cursor_metadata, sql_update, values)
+    invalidateMetadata(server_name, table_catalog, table_schema)
+    return
+
+def getLastModified(cursor_source, table_catalog, table_schema):
+    """
+    Last modification of every table of a schema according to the engine catalog.
+    Returns a dictionary {TABLE_NAME: LAST_MODIFIED}, tables without information are missing.
+    """
+    if SOURCE_ENGINE == 'files':
+        return dict((table_name, str(filesource.getLastModified(path))) for table_name, path in filesource.listFiles(getFilesDirectory(table_schema)))
+    elif SOURCE_ENGINE == 'mssqlserver':
+        # Index usage stats are reset when the server restarts, modify_date covers schema changes
+        sql = """SELECT T.name AS TABLE_NAME
+                    , CONCAT(CONVERT(VARCHAR(23), MAX(U.last_user_update), 121), '/', CONVERT(VARCHAR(23), MAX(T.modify_date), 121)) AS LAST_MODIFIED
+                FROM sys.tables AS T
+                INNER JOIN sys.schemas AS S ON T.schema_id = S.schema_id
+                LEFT JOIN sys.dm_db_index_usage_stats AS U ON U.object_id = T.object_id AND U.database_id = DB_ID()
+                WHERE DB_NAME() = ?
+                AND S.name = ?
+                GROUP BY T.name
+                HAVING MAX(U.last_user_update) IS NOT NULL;"""
+        cursor_source.execute(sql, (table_catalog, table_schema))
+    elif SOURCE_ENGINE == 'mysql':
+        sql = """SELECT TABLE_NAME
+                    , UPDATE_TIME AS LAST_MODIFIED
+                FROM INFORMATION_SCHEMA.TABLES
+                WHERE TABLE_CATALOG = %s
+                AND TABLE_SCHEMA = %s
+                AND UPDATE_TIME IS NOT NULL;"""
+        cursor_source.execute(sql, (table_catalog, table_schema))
+    elif SOURCE_ENGINE == 'postgres':
+        # There is no modification time, the counters of modified rows change with every write
+        sql = """SELECT relname AS TABLE_NAME
+                    , CONCAT(n_tup_ins, '/', n_tup_upd, '/', n_tup_del) AS LAST_MODIFIED
+                FROM pg_stat_user_tables
+                WHERE current_database() = %s
+                AND schemaname = %s;"""
+        cursor_source.execute(sql, (table_catalog, table_schema))
+    elif SOURCE_ENGINE == 'sqlite':
+        # SQLite keeps no modification time per table, every table of the schema gets the one
+        # of its database file, or of its write-ahead log when that is newer
+        cursor_source.execute("""PRAGMA database_list;""")
+        paths = [row[2] for row in cursor_source.fetchall() if row[1] == table_schema and row[2]]
+        if not paths:
+            # In-memory and temporary databases have no file
+            return {}
+        last_modified = max(os.path.getmtime(path) for path in (paths[0], paths[0] + '-wal') if os.path.exists(path))
+        cursor_source.execute("""SELECT name FROM {}.sqlite_master
+                                WHERE type = 'table'
+                                AND name NOT LIKE 'sqlite~_%' ESCAPE '~';""".format(quoteIdentifier(table_schema)))
+        return dict((row[0], str(last_modified)) for row in cursor_source.fetchall())
+    else:
+        return {}
+    return {row[0]: str(row[1]) for row in cursor_source.fetchall()}
+
+def getTableChecksum(cursor_source, table_catalog, table_schema, table_name):
+    if SOURCE_ENGINE == 'mssqlserver':
+        cursor_source.execute("""SELECT CHECKSUM_AGG(BINARY_CHECKSUM(*)) FROM {}.{}.{};""".format(table_catalog, table_schema, table_name))
+        return cursor_source.fetchone()[0]
+    elif SOURCE_ENGINE == 'mysql':
+        cursor_source.execute("""CHECKSUM TABLE {}.{};""".format(table_schema, table_name))
+        return cursor_source.fetchone()[1]
+    elif SOURCE_ENGINE == 'postgres':
+        cursor_source.execute("""SELECT SUM(CAST(hashtext(CAST(t AS TEXT)) AS BIGINT)) FROM {}.{} AS t;""".format(table_schema, table_name))
+        return cursor_source.fetchone()[0]
+    return None
+
+def updateFingerprints(cursor_source, conn_metadata, cursor_metadata, server_name, table_catalog, table_schema, row_counts, checksum = False):
+    """
+    Stores in `tables` a cheap fingerprint of each table: number of rows plus the last
+    modification from the catalog and, with `checksum`, a checksum of the whole table.
+    `checksum` is either a flag for all the tables or the set of tables to checksum.
+    Tables without modification time nor checksum get no fingerprint, they are always profiled.
+    """
+    last_modified = getLastModified(cursor_source, table_catalog, table_schema)
+    values = []
+    for table_name, n_rows in row_counts.items():
+        parts = [last_modified.get(table_name)]
+        if checksum is True or (checksum and table_name in checksum):
+            try:
+                parts.append(getTableChecksum(cursor_source, table_catalog, table_schema, table_name))
+            except:
+                parts.append(None)
+        if all(part is None for part in parts):
+            fingerprint = None
+        else:
+            fingerprint = '|'.join(str(part) for part in [n_rows] + parts)
+        values.append((last_modified.get(table_name), fingerprint, server_name, table_catalog, table_schema, table_name))
+
+    if METADATA_ENGINE in ('mssqlserver', 'sqlite'):
+        sql_update = """UPDATE tables 
+                        SET LAST_MODIFIED = ? 
+                        , FINGERPRINT = ?
+                        WHERE SERVER_NAME = ?
+                        AND TABLE_CATALOG = ?
+                        AND TABLE_SCHEMA = ?
+                        AND TABLE_NAME = ?;"""
+    elif METADATA_ENGINE in ('mysql', 'postgres'):
+        sql_update = """UPDATE tables 
+                        SET LAST_MODIFIED = %s
+                        , FINGERPRINT = %s
+                        WHERE SERVER_NAME = %s
+                        AND TABLE_CATALOG = %s
+                        AND TABLE_SCHEMA = %s
+                        AND TABLE_NAME = %s;"""
+    insertManyRows(conn_metadata, cursor_metadata, sql_update, values)
+    return
+
+def refreshFingerprints(server_name, table_catalog, table_schema, tables):
+    """
+    Recomputes the fingerprint in `tables` of the given tables, rows of getTablesFromServer,
+    so stages run without fill_tables compare against the current state of the source.
+    The number of rows is the one stored by fill_tables, the modification time is read
+    again from the catalog and the tables fingerprinted with a checksum are checksummed again.
+    """
+    conn_metadata = get_metadata_connection()
     cursor_metadata = conn_metadata.cursor()
 
-    def checkIfTableExistInTables(server_name, table_catalog, table_schema, table_name):
-        if METADATA_ENGINE == 'mssqlserver':
-            sql = """select * from tables
+    if METADATA_ENGINE in ('mssqlserver', 'sqlite'):
+        sql = """select TABLE_NAME
+                    , FINGERPRINT
+                from tables
                 WHERE SERVER_NAME = ?
                 AND TABLE_CATALOG = ?
+                AND TABLE_SCHEMA = ?;"""
+    elif METADATA_ENGINE in ('mysql', 'postgres'):
+        sql = """select TABLE_NAME
+                    , FINGERPRINT
+                from tables
+                WHERE SERVER_NAME = %s
+                AND TABLE_CATALOG = %s
+                AND TABLE_SCHEMA = %s;"""
+    cursor_metadata.execute(sql, (server_name, table_catalog, table_schema))
+    # N_ROWS|LAST_MODIFIED|CHECKSUM
+    checksum = set(row[0] for row in cursor_metadata.fetchall() if row[1] and row[1].count('|') == 2)
+
+    row_counts = dict((row[3], row[4]) for row in tables)
+    if SOURCE_ENGINE == 'files':
+        updateFingerprints(None, conn_metadata, cursor_metadata, server_name, table_catalog, table_schema, row_counts)
+    else:
+        conn_source = get_source_connection()
+        cursor_source = get_db_cursor(conn_source)
+        try:
+            updateFingerprints(cursor_source, conn_metadata, cursor_metadata, server_name, table_catalog, table_schema, row_counts, checksum)
+        finally:
+            cursor_source.close()
+            conn_source.close()
+
+    cursor_metadata.close()
+    conn_metadata.close()
+    return
+
+def getUnchangedTables(stage, server_name, table_catalog, table_schema):
+    """
+    Returns the set of tables whose current fingerprint in `tables` is the same
+    they had the last time `stage` profiled them.
+    """
+    if METADATA_ENGINE in ('mssqlserver', 'sqlite'):
+        sql = """select T.TABLE_NAME
+                from tables AS T INNER JOIN fingerprints AS F
+                ON T.SERVER_NAME = F.SERVER_NAME
+                AND T.TABLE_CATALOG = F.TABLE_CATALOG
+                AND T.TABLE_SCHEMA = F.TABLE_SCHEMA
+                AND T.TABLE_NAME = F.TABLE_NAME
+                AND T.FINGERPRINT = F.FINGERPRINT
+                WHERE F.STAGE = ?
+                AND T.SERVER_NAME = ?
+                AND T.TABLE_CATALOG = ?
+                AND T.TABLE_SCHEMA = ?;"""
+    elif METADATA_ENGINE in ('mysql', 'postgres'):
+        sql = """select T.TABLE_NAME
+                from tables AS T INNER JOIN fingerprints AS F
+                ON T.SERVER_NAME = F.SERVER_NAME
+                AND T.TABLE_CATALOG = F.TABLE_CATALOG
+                AND T.TABLE_SCHEMA = F.TABLE_SCHEMA
+                AND T.TABLE_NAME = F.TABLE_NAME
+                AND T.FINGERPRINT = F.FINGERPRINT
+                WHERE F.STAGE = %s
+                AND T.SERVER_NAME = %s
+                AND T.TABLE_CATALOG = %s
+                AND T.TABLE_SCHEMA = %s;"""
+    conn_metadata = get_metadata_connection()
+    cursor_metadata = conn_metadata.cursor()
+    cursor_metadata.execute(sql, (stage, server_name, table_catalog, table_schema))
+    rows = cursor_metadata.fetchall()
+
+    cursor_metadata.close()
+    conn_metadata.close()
+    return set(row[0] for row in rows)
+
+def storeProfiledFingerprint(stage, server_name, table_catalog, table_schema, table_name):
+    """
+    Copies the current fingerprint of the table from `tables` into `fingerprints`
+    once `stage` has profiled it.
+    """
+    if METADATA_ENGINE in ('mssqlserver', 'sqlite'):
+        sql_delete = """delete from fingerprints
+                WHERE STAGE = ?
+                AND SERVER_NAME = ?
+                AND TABLE_CATALOG = ?
                 AND TABLE_SCHEMA = ?
                 AND TABLE_NAME = ?;"""
-        elif METADATA_ENGINE == 'mysql':
-            sql = """select * from tables
-                WHERE SERVER_NAME = %s
+        sql_insert = """insert into fingerprints (STAGE, SERVER_NAME, TABLE_CATALOG, TABLE_SCHEMA, TABLE_NAME, FINGERPRINT)
+                select ?, SERVER_NAME, TABLE_CATALOG, TABLE_SCHEMA, TABLE_NAME, FINGERPRINT
+                from tables
+                WHERE SERVER_NAME = ?
+                AND TABLE_CATALOG = ?
+                AND TABLE_SCHEMA = ?
+                AND TABLE_NAME = ?
+                AND FINGERPRINT IS NOT NULL;"""
+    elif METADATA_ENGINE in ('mysql', 'postgres'):
+        sql_delete = """delete from fingerprints
+                WHERE STAGE = %s
+                AND SERVER_NAME = %s
                 AND TABLE_CATALOG = %s
                 AND TABLE_SCHEMA = %s
                 AND TABLE_NAME = %s;"""
-        cursor_metadata.execute(sql, (server_name, table_catalog, table_schema, table_name))
-        return len(cursor_metadata.fetchall())
-    
-    def updateNumberOfRows(server_name, table_catalog, table_schema, table_name):
-        if METADATA_ENGINE == 'mssqlserver':
-            query = """select count(*) as n from {}.{}""".format(table_schema, table_name)
-        elif METADATA_ENGINE == 'mysql':
-            query = """select count(*) as n from {}.{}""".format(table_schema, table_name)
-        cursor_source.execute(query)
-        num_rows = cursor_source.fetchone()
+        sql_insert = """insert into fingerprints (STAGE, SERVER_NAME, TABLE_CATALOG, TABLE_SCHEMA, TABLE_NAME, FINGERPRINT)
+                select %s, SERVER_NAME, TABLE_CATALOG, TABLE_SCHEMA, TABLE_NAME, FINGERPRINT
+                from tables
+                WHERE SERVER_NAME = %s
+                AND TABLE_CATALOG = %s
+                AND TABLE_SCHEMA = %s
+                AND TABLE_NAME = %s
+                AND FINGERPRINT IS NOT NULL;"""
+    key = (stage, server_name, table_catalog, table_schema, table_name)
+
+    conn_metadata = get_metadata_connection()
+    cursor_metadata = conn_metadata.cursor()
+    cursor_metadata.execute(sql_delete, key)
+    cursor_metadata.execute(sql_insert, key)
+    conn_metadata.commit()
+
+    cursor_metadata.close()
+    conn_metadata.close()
+    return
+
+def sqlInList(values):
+    """
+    Literal list of strings for an IN clause.
+    """
+    return '({})'.format(', '.join("'{}'".format(value.replace("'", "''")) for value in values))
+
+def sourceParameter():
+    """
+    Parameter marker of the source engine driver.
+    """
+    if SOURCE_ENGINE in ('mssqlserver', 'sqlite'):
+        return '?'
+    return '%s'
+
+def getTableReference(table_catalog, table_schema, table_name):
+    if SOURCE_ENGINE == 'mssqlserver':
+        return '{}.{}.{}'.format(table_catalog, table_schema, table_name)
+    return '{}.{}'.format(table_schema, table_name)
+
+def getDateBucket(column_name):
+    """
+    Expression grouping the dates of a column in the source engine.
+    """
+    if SOURCE_ENGINE == 'mssqlserver':
+        return 'DATEFROMPARTS(YEAR({0}), MONTH({0}), 1)'.format(column_name)
+    elif SOURCE_ENGINE == 'mysql':
+        return 'makedate(extract(year from `{0}`), DAYOFYEAR(`{0}`))'.format(column_name)
+    elif SOURCE_ENGINE == 'postgres':
+        return "CAST(DATE_TRUNC('month', {}) AS DATE)".format(quoteIdentifier(column_name))
+    elif SOURCE_ENGINE == 'sqlite':
+        return "date({}, 'start of month')".format(quoteIdentifier(column_name))
+
+def getIdentityColumn(cursor_source, table_catalog, table_schema, table_name):
+    """
+    Returns the identity (auto increment) column of a table or None.
+    Used as watermark of append-only tables when none is given.
+    """
+    if SOURCE_ENGINE == 'mssqlserver':
+        sql = """SELECT C.name
+                FROM sys.identity_columns AS C
+                WHERE C.object_id = OBJECT_ID(?);"""
+        cursor_source.execute(sql, ('{}.{}.{}'.format(table_catalog, table_schema, table_name),))
+    elif SOURCE_ENGINE == 'mysql':
+        sql = """SELECT COLUMN_NAME
+                FROM INFORMATION_SCHEMA.COLUMNS
+                WHERE TABLE_CATALOG = %s
+                AND TABLE_SCHEMA = %s
+                AND TABLE_NAME = %s
+                AND EXTRA LIKE '%%auto_increment%%';"""
+        cursor_source.execute(sql, (table_catalog, table_schema, table_name))
+    elif SOURCE_ENGINE == 'postgres':
+        sql = """SELECT COLUMN_NAME
+                FROM INFORMATION_SCHEMA.COLUMNS
+                WHERE TABLE_CATALOG = %s
+                AND TABLE_SCHEMA = %s
+                AND TABLE_NAME = %s
+                AND (IS_IDENTITY = 'YES' OR COLUMN_DEFAULT LIKE 'nextval(%%');"""
+        cursor_source.execute(sql, (table_catalog, table_schema, table_name))
+    else:
+        return None
+    row = cursor_source.fetchone()
+    return row[0] if row else None
+
+def getMaxWatermark(cursor_source, table_catalog, table_schema, table_name, watermark_column):
+    sql = """SELECT MAX({}) FROM {};""".format(quoteIdentifier(watermark_column), getTableReference(table_catalog, table_schema, table_name))
+    cursor_source.execute(sql)
+    return cursor_source.fetchone()[0]
+
+def parseWatermark(value):
+    """
+    Watermarks are stored as text, they are converted back to numbers or datetimes
+    to be compared with the column in the source.
+    """
+    if value is None:
+        return None
+    for parse in (int, datetime.datetime.fromisoformat):
+        try:
+            return parse(value)
+        except ValueError:
+            pass
+    return value
+
+def getWatermark(stage, server_name, table_catalog, table_schema, table_name, column_name):
+    """
+    Returns (WATERMARK_COLUMN, WATERMARK_VALUE) stored for the column by `stage` or None.
+    """
+    if METADATA_ENGINE in ('mssqlserver', 'sqlite'):
+        sql = """select WATERMARK_COLUMN, WATERMARK_VALUE from watermarks
+                WHERE STAGE = ?
+                AND SERVER_NAME = ?
+                AND TABLE_CATALOG = ?
+                AND TABLE_SCHEMA = ?
+                AND TABLE_NAME = ?
+                AND COLUMN_NAME = ?;"""
+    elif METADATA_ENGINE in ('mysql', 'postgres'):
+        sql = """select WATERMARK_COLUMN, WATERMARK_VALUE from watermarks
+                WHERE STAGE = %s
+                AND SERVER_NAME = %s
+                AND TABLE_CATALOG = %s
+                AND TABLE_SCHEMA = %s
+                AND TABLE_NAME = %s
+                AND COLUMN_NAME = %s;"""
+    conn_metadata = get_metadata_connection()
+    cursor_metadata = conn_metadata.cursor()
+    cursor_metadata.execute(sql, (stage, server_name, table_catalog, table_schema, table_name, column_name))
+    row = cursor_metadata.fetchone()
+
+    cursor_metadata.close()
+    conn_metadata.close()
+    if row is None:
+        return None
+    return (row[0], parseWatermark(row[1]))
+
+def deleteWatermark(cursor_metadata, stage, server_name, table_catalog, table_schema, table_name, column_name):
+    """
+    Forgets the watermark of a column, the next incremental run aggregates it from scratch.
+    It doesn't commit.
+    """
+    if METADATA_ENGINE in ('mssqlserver', 'sqlite'):
+        sql = """delete from watermarks
+                WHERE STAGE = ?
+                AND SERVER_NAME = ?
+                AND TABLE_CATALOG = ?
+                AND TABLE_SCHEMA = ?
+                AND TABLE_NAME = ?
+                AND COLUMN_NAME = ?;"""
+    elif METADATA_ENGINE in ('mysql', 'postgres'):
+        sql = """delete from watermarks
+                WHERE STAGE = %s
+                AND SERVER_NAME = %s
+                AND TABLE_CATALOG = %s
+                AND TABLE_SCHEMA = %s
+                AND TABLE_NAME = %s
+                AND COLUMN_NAME = %s;"""
+    cursor_metadata.execute(sql, (stage, server_name, table_catalog, table_schema, table_name, column_name))
+    return
+
+def setWatermark(cursor_metadata, stage, server_name, table_catalog, table_schema, table_name, column_name, watermark_column, watermark_value):
+    """
+    Stores the high-watermark up to which the column has been aggregated.
+    It doesn't commit, so it's part of the same transaction as the aggregated values.
+    """
+    sql = getUpsertSql('watermarks', METADATA_KEYS['watermarks'] + ('WATERMARK_COLUMN', 'WATERMARK_VALUE'))
+    cursor_metadata.execute(sql, (stage, server_name, table_catalog, table_schema, table_name, column_name, watermark_column, str(watermark_value)))
+    return
 
+def mergeFrequencies(conn_metadata, cursor_metadata, metadata_table, server_name, table_catalog, table_schema, table_name, column_name, rows, watermark = None):
+    """
+    Adds the frequencies of new rows, (DATA_VALUE, N) pairs, to the ones already stored
+    in `data_values` or `dates`, stores the new `watermark` (column, value) and recomputes
+    the percentages, all in one transaction.
+    """
+    if metadata_table not in ('data_values', 'dates'):
+        raise ValueError('Frequencies are only stored in data_values and dates: {}'.format(metadata_table))
+    if METADATA_ENGINE in ('mssqlserver', 'sqlite'):
+        sql_existing = """SELECT DATA_VALUE FROM {}
+                        WHERE SERVER_NAME = ?
+                        AND TABLE_CATALOG = ?
+                        AND TABLE_SCHEMA = ?
+                        AND TABLE_NAME = ?
+                        AND COLUMN_NAME = ?;""".format(metadataTable(metadata_table))
+        sql_update = """UPDATE {} SET FREQUENCY_NUMBER = FREQUENCY_NUMBER + ?
+                        WHERE SERVER_NAME = ?
+                        AND TABLE_CATALOG = ?
+                        AND TABLE_SCHEMA = ?
+                        AND TABLE_NAME = ?
+                        AND COLUMN_NAME = ?
+                        AND DATA_VALUE = ?;""".format(metadataTable(metadata_table))
+        sql_insert = """insert into {} (SERVER_NAME, TABLE_CATALOG, TABLE_SCHEMA, TABLE_NAME, COLUMN_NAME, DATA_VALUE, FREQUENCY_NUMBER)
+                        values (?, ?, ?, ?, ?, ?, ?);""".format(metadataTable(metadata_table))
         if METADATA_ENGINE == 'mssqlserver':
-            sql_update = """UPDATE tables 
-                            SET N_ROWS = ? 
-                            WHERE SERVER_NAME = ?
-                            AND TABLE_CATALOG = ?
-                            AND TABLE_SCHEMA = ?
-                            AND TABLE_NAME = ?;"""
-        elif METADATA_ENGINE == 'mysql':
-            sql_update = """UPDATE tables 
-                            SET N_ROWS = %s
-                            WHERE SERVER_NAME = %s
-                            AND TABLE_CATALOG = %s
-                            AND TABLE_SCHEMA = %s
-                            AND TABLE_NAME = %s;"""
-        cursor_metadata.execute(sql_update, (num_rows[0], server_name, table_catalog, table_schema, table_name))
-        conn_metadata.commit()
+            cursor_metadata.fast_executemany = True
+    elif METADATA_ENGINE in ('mysql', 'postgres'):
+        sql_existing = """SELECT DATA_VALUE FROM {}
+                        WHERE SERVER_NAME = %s
+                        AND TABLE_CATALOG = %s
+                        AND TABLE_SCHEMA = %s
+                        AND TABLE_NAME = %s
+                        AND COLUMN_NAME = %s;""".format(metadataTable(metadata_table))
+        sql_update = """UPDATE {} SET FREQUENCY_NUMBER = FREQUENCY_NUMBER + %s
+                        WHERE SERVER_NAME = %s
+                        AND TABLE_CATALOG = %s
+                        AND TABLE_SCHEMA = %s
+                        AND TABLE_NAME = %s
+                        AND COLUMN_NAME = %s
+                        AND DATA_VALUE = %s;""".format(metadataTable(metadata_table))
+        sql_insert = """insert into {} (SERVER_NAME, TABLE_CATALOG, TABLE_SCHEMA, TABLE_NAME, COLUMN_NAME, DATA_VALUE, FREQUENCY_NUMBER)
+                        values (%s, %s, %s, %s, %s, %s, %s);""".format(metadataTable(metadata_table))
+    # NULL is never equal to a parameter, its frequency is updated on its own
+    sql_update_null = re.sub(r'DATA_VALUE = (\?|%s);', 'DATA_VALUE IS NULL;', sql_update)
+    key = (server_name, table_catalog, table_schema, table_name, column_name)
+
+    try:
+        cursor_metadata.execute(sql_existing, key)
+        existing = set(dataValue(row[0]) for row in cursor_metadata.fetchall())
+        updates = []
+        inserts = []
+        for row in rows:
+            data_value = dataValue(row[0])
+            if data_value is None and None in existing:
+                cursor_metadata.execute(sql_update_null, (row[1],) + key)
+            elif data_value in existing:
+                updates.append((row[1],) + key + (data_value,))
+            else:
+                inserts.append(key + (data_value, row[1]))
+        if updates:
+            cursor_metadata.executemany(sql_update, updates)
+        if inserts:
+            cursor_metadata.executemany(sql_insert, inserts)
+        if watermark is not None:
+            setWatermark(cursor_metadata, metadata_table, server_name, table_catalog, table_schema, table_name, column_name, watermark[0], watermark[1])
+    except:
+        conn_metadata.rollback()
+        raise
+    # Commits the whole merge
+    updateFrequencyPercentages(conn_metadata, cursor_metadata, metadata_table, server_name, table_catalog, table_schema, table_name, column_name)
+    return
+
+def frequencyRows(rows):
+    """
+    (DATA_VALUE, FREQUENCY_NUMBER, FREQUENCY_PERCENTAGE) of the (value, N) pairs of a column.
+    """
+    rows = [(dataValue(row[0]), row[1]) for row in rows]
+    total = sum(n for data_value, n in rows)
+    return [(data_value, n, n / total) for data_value, n in rows]
+
+def replaceFrequencies(conn_metadata, cursor_metadata, metadata_table, server_name, table_catalog, table_schema, table_name, frequencies, watermarks = None, batch_size = None):
+    """
+    Replaces the rows of several columns of a table in `data_values` or `dates`, all in one
+    transaction. `frequencies` maps each column to its rows, (DATA_VALUE, FREQUENCY_NUMBER,
+    FREQUENCY_PERCENTAGE) plus APPROXIMATE and FREQUENCY_ERROR in `data_values`.
+    The columns in `watermarks` ({column: (watermark_column, value)}) store their new
+    watermark, the others forget theirs, a full refresh must not be merged into later.
+    Returns the number of rows written.
+    """
+    if metadata_table not in ('data_values', 'dates'):
+        raise ValueError('Frequencies are only stored in data_values and dates: {}'.format(metadata_table))
+    watermarks = watermarks or {}
+    parameter = '?' if METADATA_ENGINE in ('mssqlserver', 'sqlite') else '%s'
+    columns = ('SERVER_NAME', 'TABLE_CATALOG', 'TABLE_SCHEMA', 'TABLE_NAME', 'COLUMN_NAME', 'DATA_VALUE', 'FREQUENCY_NUMBER', 'FREQUENCY_PERCENTAGE')
+    if metadata_table == 'data_values':
+        columns += ('APPROXIMATE', 'FREQUENCY_ERROR')
+    sql_delete = """delete from {1}
+                    WHERE SERVER_NAME = {0}
+                    AND TABLE_CATALOG = {0}
+                    AND TABLE_SCHEMA = {0}
+                    AND TABLE_NAME = {0}
+                    AND COLUMN_NAME = {0};""".format(parameter, metadataTable(metadata_table))
+    sql_insert = """insert into {} ({})
+                    values ({});""".format(metadataTable(metadata_table), ', '.join(columns), ', '.join([parameter] * len(columns)))
+    key = (server_name, table_catalog, table_schema, table_name)
+
+    try:
+        for column_name in frequencies:
+            cursor_metadata.execute(sql_delete, key + (column_name,))
+            if column_name in watermarks:
+                setWatermark(cursor_metadata, metadata_table, server_name, table_catalog, table_schema, table_name, column_name, *watermarks[column_name])
+            else:
+                deleteWatermark(cursor_metadata, metadata_table, server_name, table_catalog, table_schema, table_name, column_name)
+    except:
+        conn_metadata.rollback()
+        raise
+    # The deletes and the watermarks are committed with the rows
+    return insertManyRows(conn_metadata, cursor_metadata, sql_insert, (key + (column_name,) + tuple(row) for column_name, rows in frequencies.items() for row in rows), batch_size)
+
+def setSampleSeed(seed):
+    global SAMPLE_SEED
+    SAMPLE_SEED = seed
+    return
+
+def setMaterialiseSamples(materialise):
+    global MATERIALISE_SAMPLES
+    MATERIALISE_SAMPLES = materialise
+    return
+
+def getNumericPrimaryKey(cursor_source, table_catalog, table_schema, table_name):
+    """
+    Returns the primary key column of a table when it is a single numeric column, or None.
+    """
+    if SOURCE_ENGINE == 'mysql':
+        sql = """SELECT K.COLUMN_NAME
+                FROM INFORMATION_SCHEMA.KEY_COLUMN_USAGE AS K
+                INNER JOIN INFORMATION_SCHEMA.COLUMNS AS C
+                ON K.TABLE_SCHEMA = C.TABLE_SCHEMA
+                AND K.TABLE_NAME = C.TABLE_NAME
+                AND K.COLUMN_NAME = C.COLUMN_NAME
+                WHERE K.CONSTRAINT_NAME = 'PRIMARY'
+                AND K.TABLE_SCHEMA = %s
+                AND K.TABLE_NAME = %s
+                AND C.DATA_TYPE IN ('int', 'bigint', 'smallint', 'tinyint', 'mediumint');"""
+    elif SOURCE_ENGINE == 'postgres':
+        sql = """SELECT K.COLUMN_NAME
+                FROM INFORMATION_SCHEMA.TABLE_CONSTRAINTS AS T
+                INNER JOIN INFORMATION_SCHEMA.KEY_COLUMN_USAGE AS K
+                ON T.CONSTRAINT_SCHEMA = K.CONSTRAINT_SCHEMA
+                AND T.CONSTRAINT_NAME = K.CONSTRAINT_NAME
+                INNER JOIN INFORMATION_SCHEMA.COLUMNS AS C
+                ON K.TABLE_SCHEMA = C.TABLE_SCHEMA
+                AND K.TABLE_NAME = C.TABLE_NAME
+                AND K.COLUMN_NAME = C.COLUMN_NAME
+                WHERE T.CONSTRAINT_TYPE = 'PRIMARY KEY'
+                AND T.TABLE_SCHEMA = %s
+                AND T.TABLE_NAME = %s
+                AND C.DATA_TYPE IN ('integer', 'bigint', 'smallint');"""
+    else:
+        return None
+    cursor_source.execute(sql, (table_schema, table_name))
+    rows = cursor_source.fetchall()
+    if len(rows) == 1:
+        return rows[0][0]
+    return None
+
+def getSampleSource(cursor_source, table_catalog, table_schema, table_name, n_samples, number_of_rows, seed = None, method = None):
+    """
+    Returns (source, method) where `source` replaces the table in a FROM clause to read
+    a sample of about `n_samples` rows, the same rows for the same `seed` (SAMPLE_SEED by default).
+    - mssqlserver: TABLESAMPLE ... REPEATABLE.
+    - postgres: TABLESAMPLE BERNOULLI (or `method` = 'system') ... REPEATABLE.
+    - mysql: a range of a numeric primary key starting at a seeded random position,
+      or a RAND(seed) filter for tables without one.
+    - sqlite: `n_samples` rowids drawn with a seeded generator between MIN(rowid) and
+      MAX(rowid), drawing again for the gaps in the rowids. Only the rowid index is read,
+      tables WITHOUT ROWID or with sparse rowids are left to reservoirSample.
+    Small tables are read in full (method 'full'). `source` is None when the engine
+    has no strategy, reservoirSample can sample the rows while they are streamed.
+    """
+    table = getTableReference(table_catalog, table_schema, table_name)
+    if seed is None:
+        seed = SAMPLE_SEED
+    if not number_of_rows or number_of_rows <= n_samples:
+        return table, 'full'
+    fraction = n_samples / number_of_rows
+    generator = random.Random('{}.{}.{}.{}'.format(seed, table_catalog, table_schema, table_name))
+
+    if SOURCE_ENGINE == 'mssqlserver':
+        return '(SELECT * FROM {} TABLESAMPLE ({} ROWS) REPEATABLE ({})) AS sample'.format(table, n_samples, seed), 'tablesample'
+    elif SOURCE_ENGINE == 'postgres':
+        method = method or 'bernoulli'
+        return '(SELECT * FROM {} TABLESAMPLE {} ({}) REPEATABLE ({})) AS sample'.format(table, method.upper(), 100 * fraction, seed), method
+    elif SOURCE_ENGINE == 'mysql':
+        primary_key = getNumericPrimaryKey(cursor_source, table_catalog, table_schema, table_name)
+        if primary_key is not None:
+            cursor_source.execute("""SELECT MIN({0}), MAX({0}) FROM {1};""".format(quoteIdentifier(primary_key), table))
+            low, high = cursor_source.fetchone()
+            if low is None:
+                return table, 'full'
+            # The range is read through the primary key index, no full scan
+            start = low + int(generator.random() * (high - low) * (1 - fraction))
+            return '(SELECT * FROM {0} WHERE {1} >= {2} ORDER BY {1} LIMIT {3}) AS sample'.format(table, quoteIdentifier(primary_key), start, n_samples), 'pk_range'
+        return '(SELECT * FROM {} WHERE RAND({}) < {}) AS sample'.format(table, seed, fraction), 'rand'
+    elif SOURCE_ENGINE == 'sqlite':
+        try:
+            cursor_source.execute("""SELECT MIN(rowid), MAX(rowid) FROM {};""".format(table))
+        except sqlite3.OperationalError:
+            return None, 'reservoir'
+        low, high = cursor_source.fetchone()
+        if low is None:
+            return table, 'full'
+        span = high - low + 1
+        if span > 10 * number_of_rows:
+            # Sparse rowids, as random keys, would take too many draws to find the rows
+            return None, 'reservoir'
+        drawn = set()
+        rowids = []
+        while len(rowids) < n_samples and len(drawn) < span:
+            # Draw more than missing as some rowids fall in gaps, the existing ones are kept in drawing order
+            missing = n_samples - len(rowids)
+            candidates = []
+            for _ in range(min(span - len(drawn), int(missing * span / number_of_rows * 1.1) + 1)):
+                rowid = generator.randint(low, high)
+                while rowid in drawn:
+                    rowid = generator.randint(low, high)
+                drawn.add(rowid)
+                candidates.append(rowid)
+            cursor_source.execute("""SELECT rowid FROM {} WHERE rowid IN ({});""".format(table, ', '.join(str(rowid) for rowid in candidates)))
+            existing = set(row[0] for row in cursor_source.fetchall())
+            rowids.extend([rowid for rowid in candidates if rowid in existing][:missing])
+        return '(SELECT * FROM {} WHERE rowid IN ({})) AS sample'.format(table, ', '.join(str(rowid) for rowid in sorted(rowids))), 'rowid'
+    return None, 'reservoir'
+
+def reservoirSample(rows, n_samples, seed = None):
+    """
+    Uniform sample of `n_samples` rows from an iterable of rows read once (Algorithm R),
+    the same rows for the same `seed`.
+    """
+    generator = random.Random(SAMPLE_SEED if seed is None else seed)
+    sample = []
+    for i, row in enumerate(rows):
+        if i < n_samples:
+            sample.append(row)
+        else:
+            j = generator.randint(0, i)
+            if j < n_samples:
+                sample[j] = row
+    return sample
+
+def recordSample(stage, server_name, table_catalog, table_schema, table_name, method, seed, requested_rows, sample_rows):
+    """
+    Stores in `samples` how the last sample of a table was taken and how many rows it had.
+    """
+    sql = getUpsertSql('samples', METADATA_KEYS['samples'] + ('METHOD', 'SEED', 'REQUESTED_ROWS', 'SAMPLE_ROWS'), {'SAMPLED_AT': 'CURRENT_TIMESTAMP'})
+    key = (stage, server_name, table_catalog, table_schema, table_name)
+
+    conn_metadata = get_metadata_connection()
+    cursor_metadata = conn_metadata.cursor()
+    cursor_metadata.execute(sql, key + (method, seed, requested_rows, sample_rows))
+    conn_metadata.commit()
+
+    cursor_metadata.close()
+    conn_metadata.close()
+    return
+
+def getSample(stage, server_name, table_catalog, table_schema, table_name, n_samples, number_of_rows = None, seed = None, method = None):
+    """
+    Chooses the sample of a table for a stage with getSampleSource and records it in
+    `samples`. Returns (source, method, sample_rows), `source` is None when the rows have
+    to be sampled with reservoirSample.
+    `sample_rows` is counted for materialised samples and small tables read in full,
+    otherwise it's the expected size of the sample, counting it would read it once more.
+    """
+    if seed is None:
+        seed = SAMPLE_SEED
+    if number_of_rows is None:
+        number_of_rows = getTableNumberOfRows(server_name, table_catalog, table_schema, table_name)
+    conn_source = get_source_connection()
+    cursor_source = get_db_cursor(conn_source)
+    try:
+        source, method = getSampleSource(cursor_source, table_catalog, table_schema, table_name, n_samples, number_of_rows, seed, method)
+        # Rows the reservoir or the sample will keep, N_ROWS may be an estimate
+        sample_rows = min(n_samples, number_of_rows or 0)
+        if source is not None:
+            sampled = source
+            if MATERIALISE_SAMPLES and method != 'full':
+                source = materialiseSample(conn_source, cursor_source, table_catalog, table_schema, table_name, source)
+            if source != sampled or method == 'full':
+                # The temporary table is already written and small tables have at most
+                # `n_samples` rows, counting them is cheap
+                cursor_source.execute("""SELECT COUNT(*) FROM {};""".format(source))
+                sample_rows = cursor_source.fetchone()[0]
+    finally:
+        cursor_source.close()
+        conn_source.close()
+    recordSample(stage, server_name, table_catalog, table_schema, table_name, method, seed, n_samples, sample_rows)
+    return source, method, sample_rows
+
+def getSampleTableReference(table_schema, table_name):
+    """
+    Name of the temporary table holding the sample of a table on the source connection.
+    """
+    sample_table = SAMPLE_TABLE_PREFIX + table_name
+    if SOURCE_ENGINE == 'mssqlserver':
+        return '#' + sample_table
+    elif SOURCE_ENGINE == 'mysql':
+        return '{}.{}'.format(table_schema, sample_table)
+    elif SOURCE_ENGINE == 'sqlite':
+        return 'temp.' + sample_table
+    return sample_table
+
+def getDropSampleTableSql(sample_table):
+    if SOURCE_ENGINE == 'mssqlserver':
+        return """IF OBJECT_ID('tempdb..{0}') IS NOT NULL DROP TABLE {0};""".format(sample_table)
+    elif SOURCE_ENGINE == 'mysql':
+        return """DROP TEMPORARY TABLE IF EXISTS {};""".format(sample_table)
+    return """DROP TABLE IF EXISTS {};""".format(sample_table)
+
+def materialiseSample(conn_source, cursor_source, table_catalog, table_schema, table_name, source):
+    """
+    Copies the rows of the sample `source` into a temporary table and returns its name,
+    so the sample is read once per table instead of once per column.
+    Temporary tables only exist on the connection that creates them, the sample is only
+    materialised inside pinnedSourceConnection(), which drops it at the end.
+    Returns `source` unchanged otherwise or when the table can't be created.
+    """
+    if getattr(pinned_sources, 'connection', None) is None:
+        return source
+    sample_table = getSampleTableReference(table_schema, table_name)
+    if SOURCE_ENGINE == 'mssqlserver':
+        sql_create = """SELECT * INTO {} FROM {};""".format(sample_table, source)
+    else:
+        sql_create = """CREATE TEMPORARY TABLE {} AS SELECT * FROM {};""".format(sample_table, source)
+    try:
+        cursor_source.execute(getDropSampleTableSql(sample_table))
+        cursor_source.execute(sql_create)
+        conn_source.commit()
+    except Exception as e:
+        conn_source.rollback()
+        logger.warning('Problems materialising the sample of {} in {}, it will be read from the table: {}'.format(table_name, sample_table, e))
+        return source
+    pinned_sources.sample_tables.append(sample_table)
+    return sample_table
+
+def dropMaterialisedSamples(conn_source, sample_tables):
+    """
+    Drops the temporary tables created by materialiseSample() on `conn_source`.
+    """
+    cursor_source = get_db_cursor(conn_source)
+    for sample_table in sample_tables:
+        try:
+            cursor_source.execute(getDropSampleTableSql(sample_table))
+            conn_source.commit()
+        except Exception as e:
+            conn_source.rollback()
+            logger.warning('Problems dropping the sample table {}: {}'.format(sample_table, e))
+    cursor_source.close()
+    return
+
+@contextmanager
+def pinnedSourceConnection():
+    """
+    Inside the block every get_source_connection() of the thread returns the same
+    connection, so the temporary tables of materialiseSample() are seen by all the
+    queries of a table. They are dropped before the connection goes back to the pool.
+    """
+    conn_source = get_source_connection()
+    pinned_sources.connection = conn_source
+    pinned_sources.sample_tables = []
+    try:
+        yield conn_source
+    finally:
+        sample_tables = pinned_sources.sample_tables
+        pinned_sources.connection = None
+        pinned_sources.sample_tables = None
+        dropMaterialisedSamples(conn_source, sample_tables)
+        conn_source.close()
+
+def insertOrUpdateTables(server_name, table_catalog, table_schema, table_name, verbose = False, ignore_views = True):
+    """
+    Stores the number of columns and the number of rows of the table.
+    Each row is one table.
+    """
+    conn_source = get_source_connection()
+    cursor_source = get_db_cursor(conn_source)
+
+    conn_metadata = get_metadata_connection()
+    cursor_metadata = conn_metadata.cursor()
+
+    def updateNumberOfRows(server_name, table_catalog, table_schema, table_name):
+        updateTableNumberOfRows(cursor_source, conn_metadata, cursor_metadata, server_name, table_catalog, table_schema, table_name)
         return 
     
     def updateNumberOfColumns(server_name, table_catalog, table_schema, table_name):
@@ -374,7 +2427,7 @@ def insertOrUpdateTables(server_name, table_catalog, table_schema, table_name, v
                         , TABLE_SCHEMA
                         , TABLE_NAME
                     ORDER BY 1,2,3,4;"""
-        elif SOURCE_ENGINE == 'mysql':
+        elif SOURCE_ENGINE in ('mysql', 'postgres'):
             sql = """SELECT %s AS SERVER_NAME
                     , TABLE_CATALOG
                     , TABLE_SCHEMA
@@ -389,35 +2442,22 @@ def insertOrUpdateTables(server_name, table_catalog, table_schema, table_name, v
                         , TABLE_SCHEMA
                         , TABLE_NAME
                     ORDER BY 1,2,3,4;"""
+        elif SOURCE_ENGINE == 'sqlite':
+            sql = """WITH S AS (SELECT ? AS SERVER_NAME, ? AS TABLE_CATALOG, ? AS TABLE_SCHEMA, ? AS TABLE_NAME)
+                    SELECT S.SERVER_NAME
+                    , S.TABLE_CATALOG
+                    , S.TABLE_SCHEMA
+                    , S.TABLE_NAME
+                    , COUNT(*) AS N_COLUMNS
+                    , NULL AS N_ROWS
+                    FROM S CROSS JOIN pragma_table_info(S.TABLE_NAME, S.TABLE_SCHEMA) AS C
+                    GROUP BY S.TABLE_NAME;"""
         cursor_source.execute(sql, (server_name, table_catalog, table_schema, table_name))
         rows = cursor_source.fetchall()
-        if METADATA_ENGINE == 'mssqlserver':
-            sql_insert = """insert into tables (SERVER_NAME, TABLE_CATALOG, TABLE_SCHEMA, TABLE_NAME, N_COLUMNS, N_ROWS)
-                            values (?, ?, ?, ?, ?, ?);"""
-        elif METADATA_ENGINE == 'mysql':
-            sql_insert = """insert into tables (SERVER_NAME, TABLE_CATALOG, TABLE_SCHEMA, TABLE_NAME, N_COLUMNS, N_ROWS)
-                            values (%s, %s, %s, %s, %s, %s);"""
-        for row in rows:
-            cursor_metadata.execute(sql_insert, (row[0], row[1], row[2], row[3], row[4], row[5]))
-            conn_metadata.commit()
+        # The row counts and the fingerprint of a previous run are cleared, as if the row was new
+        upsertRows(conn_metadata, cursor_metadata, 'tables', TABLES_COLUMNS, (tuple(row) + (None, None, None) for row in rows))
         return
     
-    if checkIfTableExistInTables:
-        if METADATA_ENGINE == 'mssqlserver':
-            sql = """delete from tables
-                    WHERE SERVER_NAME = ?
-                    AND TABLE_CATALOG = ?
-                    AND TABLE_SCHEMA = ?
-                    AND TABLE_NAME = ?;"""
-        elif METADATA_ENGINE == 'mysql':
-            sql = """delete from tables
-                    WHERE SERVER_NAME = %s
-                    AND TABLE_CATALOG = %s
-                    AND TABLE_SCHEMA = %s
-                    AND TABLE_NAME = %s;"""
-        cursor_metadata.execute(sql, (server_name, table_catalog, table_schema, table_name))
-        conn_metadata.commit()
-        
     updateNumberOfColumns(server_name, table_catalog, table_schema, table_name)
     updateNumberOfRows(server_name, table_catalog, table_schema, table_name)
         
@@ -431,146 +2471,246 @@ def insertOrUpdateTables(server_name, table_catalog, table_schema, table_name, v
     conn_metadata.close()
     return
 
-def insertOrUpdateUniques(server_name, table_catalog, table_schema, table_name, verbose = False):
-    def checkIfTableExistInUniques(server_name, table_catalog, table_schema, table_name):
-        if METADATA_ENGINE == 'mssqlserver':
-            conn_metadata = get_db_connection(metadata_connection_params)
-            sql = """select * from uniques
-            WHERE SERVER_NAME = ?
-             AND TABLE_CATALOG = ?
-             AND TABLE_SCHEMA = ?
-             AND TABLE_NAME = ?;"""
-        elif METADATA_ENGINE == 'mysql':
-            conn_metadata = get_mysql_connection('metadata')
-            sql = """select * from uniques
-            WHERE SERVER_NAME = %s
-             AND TABLE_CATALOG = %s
-             AND TABLE_SCHEMA = %s
-             AND TABLE_NAME = %s;"""
-        cursor_metadata = conn_metadata.cursor()
-        cursor_metadata.execute(sql, (server_name, table_catalog, table_schema, table_name))
-        len_uniques = len(cursor_metadata.fetchall())
+def insertOrUpdateUniques(server_name, table_catalog, table_schema, table_name, verbose = False, single_scan = True, columns_per_query = 100, approximate_above = None, hll_precision = 14, progress = True, failed = None):
+    """
+    Stores the number of distinct values and the number of NULL values of each column.
+    With `single_scan` the columns are profiled together, `columns_per_query` columns
+    per SELECT, so the table is read once per chunk instead of once per column.
+    Tables with more than `approximate_above` rows get approximate distinct values,
+    flagged in DISTINCT_APPROXIMATE with their relative error in DISTINCT_ERROR.
+    The constraints stored by fill_columns save work: unique NOT NULL columns aren't read,
+    their distinct values are the rows of the table, other unique columns only count
+    their NULLs and NOT NULL columns only their distinct values.
+    The columns that can't be read are appended to `failed` and keep their previous row.
+    """
+    if failed is None:
+        failed = []
+    # Read once, writing uniques drops the table from the metadata cache
+    constraints = getTableMetadata(server_name, table_catalog, table_schema, table_name)['constraints']
 
-        cursor_metadata.close()
-        conn_metadata.close()
-        return len_uniques
-    
-    def getColumnsFromTable(server_name, table_catalog, table_schema, table_name):
-        if METADATA_ENGINE == 'mssqlserver':
-            conn_metadata = get_db_connection(metadata_connection_params)
-            sql_fields = """select column_name
-                            , ORDINAL_POSITION
-                            , DATA_TYPE 
-                        from columns
-                        WHERE SERVER_NAME = ?
-                         AND TABLE_CATALOG = ?
-                         AND TABLE_SCHEMA = ?
-                         AND TABLE_NAME = ?;"""
-        elif METADATA_ENGINE == 'mysql':
-            conn_metadata = get_mysql_connection('metadata')
-            sql_fields = """select column_name
-                            , ORDINAL_POSITION
-                            , DATA_TYPE 
-                        from columns
-                        WHERE SERVER_NAME = %s
-                         AND TABLE_CATALOG = %s
-                         AND TABLE_SCHEMA = %s
-                         AND TABLE_NAME = %s;"""
+    def isUnique(column_name):
+        return constraints.get(column_name, (None, None, None))[2] == 1
+
+    def isNotNull(column_name):
+        return constraints.get(column_name, (None, None, None))[0] == 0
 
-        cursor_metadata = conn_metadata.cursor()
-        cursor_metadata.execute(sql_fields, (server_name, table_catalog, table_schema, table_name))
-        rows = cursor_metadata.fetchall()
+    def getExpressions(column_name):
+        """
+        Distinct values and NULL values expressions of a column, NULL and 0 when its
+        constraints already answer them.
+        """
+        distinct = 'NULL' if isUnique(column_name) else 'count(distinct {})'.format(quoteIdentifier(column_name))
+        nulls = '0' if isNotNull(column_name) else 'sum(case when {} is null then 1 else 0 end)'.format(quoteIdentifier(column_name))
+        return distinct, nulls
 
-        cursor_metadata.close()
-        conn_metadata.close()
-        return rows
+    def getKnownValues(column_name, distinctValues, nullValues):
+        if isUnique(column_name):
+            return (n_rows - (nullValues or 0), nullValues)
+        return (distinctValues, nullValues)
+
+    def getColumnsFromTable(server_name, table_catalog, table_schema, table_name):
+        return getTableMetadata(server_name, table_catalog, table_schema, table_name)['columns']
     
     def getValuesFromColumn(server_name, table_catalog, table_schema, table_name, column_name):
-        if SOURCE_ENGINE == 'mssqlserver':
-            conn_source = get_db_connection(source_connection_params)
-        elif SOURCE_ENGINE == 'mysql':
-            conn_source = get_mysql_connection('source')
+        conn_source = get_source_connection()
         cursor_source = get_db_cursor(conn_source)
 
-        sql_values = """select count(distinct `{}`) as distinctValues
-                                , sum(case when `{}` is null then 1 else 0 end) as nullValues
-                        FROM    {}.{}""".format(column_name, column_name, table_schema, table_name)
+        sql_values = """select {0} as distinctValues
+                                , {1} as nullValues
+                        FROM    {2}.{3}""".format(*getExpressions(column_name), table_schema, table_name)
         cursor_source.execute(sql_values)
         rows = cursor_source.fetchall()
 
         cursor_source.close()
         conn_source.close()
 
-        return rows
+        return [getKnownValues(column_name, row[0], row[1]) for row in rows]
     
-    def insertValuesInUniques(server_name, table_catalog, table_schema, table_name, column_name, ordinal_position, data_type, distinctValues, nullValues):
-        if METADATA_ENGINE == 'mssqlserver':
-            conn_metadata = get_db_connection(metadata_connection_params)
-            sql_insert = """insert into uniques (SERVER_NAME, TABLE_CATALOG, TABLE_SCHEMA, TABLE_NAME, COLUMN_NAME, ORDINAL_POSITION, DATA_TYPE, DISTINCT_VALUES, NULL_VALUES)
-                        values (?, ?, ?, ?, ?, ?, ?, ?, ?)"""
-        elif METADATA_ENGINE == 'mysql':
-            conn_metadata = get_mysql_connection('metadata')
-            sql_insert = """insert into uniques (SERVER_NAME, TABLE_CATALOG, TABLE_SCHEMA, TABLE_NAME, COLUMN_NAME, ORDINAL_POSITION, DATA_TYPE, DISTINCT_VALUES, NULL_VALUES)
-                        values (%s, %s, %s, %s, %s, %s, %s, %s, %s)"""
-        cursor_metadata = conn_metadata.cursor()
+    def getValuesFromColumns(server_name, table_catalog, table_schema, table_name, column_names):
+        """
+        Distinct and null values of several columns with a single scan of the table.
+        Returns a list of (distinctValues, nullValues), one per column.
+        """
+        conn_source = get_source_connection()
+        cursor_source = get_db_cursor(conn_source)
 
-        cursor_metadata.execute(sql_insert, (server_name, table_catalog, table_schema, table_name, column_name, ordinal_position, data_type, distinctValues, nullValues))
-        conn_metadata.commit()
+        expressions = []
+        for column_name in column_names:
+            expressions.append("""{}
+                                , {}""".format(*getExpressions(column_name)))
+        sql_values = """select {}
+                        FROM    {}.{}""".format('\n                                , '.join(expressions), table_schema, table_name)
+        cursor_source.execute(sql_values)
+        row = cursor_source.fetchone()
 
-        cursor_metadata.close()
-        conn_metadata.close()
-        return
+        cursor_source.close()
+        conn_source.close()
+
+        return [getKnownValues(column_name, row[2 * i], row[2 * i + 1]) for i, column_name in enumerate(column_names)]
+
+    def getApproximateValuesFromColumns(server_name, table_catalog, table_schema, table_name, column_names):
+        """
+        Approximate distinct values and exact null values of several columns.
+        Returns a list of (distinctValues, nullValues, error), one per column.
+        SQL Server computes APPROX_COUNT_DISTINCT itself, other engines (or SQL Server
+        versions without it) stream the columns through HyperLogLog sketches.
+        """
+        conn_source = get_source_connection()
+        cursor_source = get_streaming_cursor(conn_source)
+        try:
+            if SOURCE_ENGINE == 'mssqlserver':
+                expressions = []
+                for column_name in column_names:
+                    expressions.append("""APPROX_COUNT_DISTINCT({0})
+                                , sum(case when {0} is null then 1 else 0 end)""".format(quoteIdentifier(column_name)))
+                sql_values = """select {}
+                        FROM    {}.{}""".format('\n                                , '.join(expressions), table_schema, table_name)
+                try:
+                    cursor_source.execute(sql_values)
+                    row = cursor_source.fetchone()
+                    return [(row[2 * i], row[2 * i + 1], APPROX_COUNT_DISTINCT_ERROR) for i in range(len(column_names))]
+                except:
+                    pass
+
+            sketches = [HyperLogLog(hll_precision) for column_name in column_names]
+            nulls = [0] * len(column_names)
+            sql_scan = """select {}
+                        FROM    {}.{}""".format(', '.join(quoteIdentifier(column_name) for column_name in column_names), table_schema, table_name)
+            cursor_source.execute(sql_scan)
+            for row in iterRows(cursor_source):
+                for i, value in enumerate(row):
+                    if value is None:
+                        nulls[i] += 1
+                    else:
+                        sketches[i].add(value)
+            return [(sketch.count(), n_nulls, sketch.error()) for sketch, n_nulls in zip(sketches, nulls)]
+        finally:
+            cursor_source.close()
+            conn_source.close()
     
-    def deleteExistingRows(server_name, table_catalog, table_schema, table_name):
-        if METADATA_ENGINE == 'mssqlserver':
-            conn_metadata = get_db_connection(metadata_connection_params)
-            sql = """delete from uniques
+    def addValues(field, distinctValues, nullValues, error = None):
+        uniques.append((server_name, table_catalog, table_schema, table_name, field[0], field[1], field[2], distinctValues, nullValues, 0 if error is None else 1, error))
+        if verbose:
+            logger.info('{}.{}.{}.{}.{} updated into uniques...'.format(server_name, table_catalog, table_schema, table_name, field[0]))
+        return
+
+    def writeUniques(uniques, column_names):
+        """
+        Upserts the rows of the table in `uniques` and removes the ones of the columns
+        that aren't in `column_names` anymore, in a single transaction.
+        """
+        if METADATA_ENGINE in ('mssqlserver', 'sqlite'):
+            sql_delete = """delete from {}
                 WHERE SERVER_NAME = ?
                  AND TABLE_CATALOG = ?
                  AND TABLE_SCHEMA = ?
-                 AND TABLE_NAME = ?;"""
-        elif METADATA_ENGINE == 'mysql':
-            conn_metadata = get_mysql_connection('metadata')
-            sql = """delete from uniques
+                 AND TABLE_NAME = ?""".format(metadataTable('uniques'))
+        elif METADATA_ENGINE in ('mysql', 'postgres'):
+            sql_delete = """delete from {}
                 WHERE SERVER_NAME = %s
                  AND TABLE_CATALOG = %s
                  AND TABLE_SCHEMA = %s
-                 AND TABLE_NAME = %s;"""
+                 AND TABLE_NAME = %s""".format(metadataTable('uniques'))
+        if column_names:
+            sql_delete += """
+                 AND COLUMN_NAME NOT IN {}""".format(sqlInList(column_names))
+        sql_delete += ';'
+        conn_metadata = get_metadata_connection()
         cursor_metadata = conn_metadata.cursor()
-
-        cursor_metadata.execute(sql, (server_name, table_catalog, table_schema, table_name))
-        conn_metadata.commit()
-
-        cursor_metadata.close()
-        conn_metadata.close()
+        try:
+            cursor_metadata.execute(sql_delete, (server_name, table_catalog, table_schema, table_name))
+            upsertRows(conn_metadata, cursor_metadata, 'uniques', UNIQUES_COLUMNS, uniques)
+        finally:
+            invalidateMetadata(server_name, table_catalog, table_schema, table_name)
+            cursor_metadata.close()
+            conn_metadata.close()
         return
-    
-    if checkIfTableExistInUniques(server_name, table_catalog, table_schema, table_name):
-        deleteExistingRows(server_name, table_catalog, table_schema, table_name)
-        
+
     columns = getColumnsFromTable(server_name, table_catalog, table_schema, table_name)
+    column_names = [field[0] for field in columns]
+    approximate = approximate_above is not None and (getTableNumberOfRows(server_name, table_catalog, table_schema, table_name) or 0) > approximate_above
+
+    n_rows = None
+    if any(isUnique(field[0]) for field in columns if field[2] not in BLOB_TYPES):
+        n_rows = getExactNumberOfRows(server_name, table_catalog, table_schema, table_name)
+    known = [field for field in columns if field[2] not in BLOB_TYPES and isUnique(field[0]) and isNotNull(field[0])]
+    uniques = []
+    for field in known:
+        addValues(field, n_rows, 0)
+    columns = [field for field in columns if field not in known]
     
-    pbar = tqdm(columns)
-    for field in pbar:
-        pbar.set_description('Column {}'.format(field[0]))
-        if field[2] not in ('text', 'image', 'ntext', 'blob', 'varbinary'):
-            values = getValuesFromColumn(server_name, table_catalog, table_schema, table_name, field[0])
+    if approximate:
+        fields = [field for field in columns if field[2] not in BLOB_TYPES]
+        chunks = [fields[i:i + columns_per_query] for i in range(0, len(fields), columns_per_query)]
+        pbar = tqdm(chunks, disable = not progress)
+        for chunk in pbar:
+            pbar.set_description('Columns {} to {}'.format(chunk[0][0], chunk[-1][0]))
+            try:
+                values = getApproximateValuesFromColumns(server_name, table_catalog, table_schema, table_name, [field[0] for field in chunk])
+            except:
+                print('Problems with: {}.{}'.format(table_name, ', '.join(field[0] for field in chunk)))
+                failed.extend(field[0] for field in chunk)
+                continue
+            for field, value in zip(chunk, values):
+                addValues(field, value[0], value[1], value[2])
+    elif single_scan:
+        fields = [field for field in columns if field[2] not in BLOB_TYPES]
+        chunks = [fields[i:i + columns_per_query] for i in range(0, len(fields), columns_per_query)]
+        pbar = tqdm(chunks, disable = not progress)
+        for chunk in pbar:
+            pbar.set_description('Columns {} to {}'.format(chunk[0][0], chunk[-1][0]))
             try:
-                insertValuesInUniques(server_name, table_catalog, table_schema, table_name, field[0], field[1], field[2], values[0][0], values[0][1])
+                values = getValuesFromColumns(server_name, table_catalog, table_schema, table_name, [field[0] for field in chunk])
             except:
-                print('Problems with: {}.{}'.format(table_name, field[0]))
-                pass
+                # One bad column shouldn't lose the whole chunk, falling back to one query per column
+                values = []
+                for field in chunk:
+                    try:
+                        values.append(getValuesFromColumn(server_name, table_catalog, table_schema, table_name, field[0])[0])
+                    except:
+                        print('Problems with: {}.{}'.format(table_name, field[0]))
+                        failed.append(field[0])
+                        values.append(None)
+            for field, value in zip(chunk, values):
+                if value is not None:
+                    addValues(field, value[0], value[1])
+    else:
+        pbar = tqdm(columns, disable = not progress)
+        for field in pbar:
+            pbar.set_description('Column {}'.format(field[0]))
+            if field[2] not in BLOB_TYPES:
+                try:
+                    values = getValuesFromColumn(server_name, table_catalog, table_schema, table_name, field[0])
+                    addValues(field, values[0][0], values[0][1])
+                except:
+                    print('Problems with: {}.{}'.format(table_name, field[0]))
+                    failed.append(field[0])
 
-        if verbose:
-            logger.info('{}.{}.{}.{}.{} updated into summary_v3...'.format(server_name, table_catalog, table_schema, table_name, field[0]))
-    
+    writeUniques(uniques, column_names)
     return
 
-def insertOrUpdateDataValues(server_name, table_catalog, table_schema, table_name, verbose = False, threshold = 5000, with_data_sample = False, n_samples = 10000):
+def insertOrUpdateDataValues(server_name, table_catalog, table_schema, table_name, verbose = False, threshold = 5000, with_data_sample = False, n_samples = 10000, batch_size = None, resume = False, incremental = False, watermark_columns = None, heavy_hitters = 0, heavy_hitters_capacity = None, progress = True, failed = None):
     """
     Stores each distinct data value of each column based on a threshould of distinct values
     (5000 distinct values by default) and has the frequency of the data value. 
     It doesn't store data of `date` types columns.
+
+    With `incremental` only the rows above the watermark stored in a previous run are
+    aggregated and merged into the existing frequencies. The watermark column is taken
+    from `watermark_columns` ({table_name: column_name}) or the identity column of the table,
+    tables without one are aggregated in full.
+
+    With `with_data_sample` the values are counted on a sample of about `n_samples` rows
+    taken with getSample, reproducible with SAMPLE_SEED.
+
+    Columns with `threshold` distinct values or more get, with `heavy_hitters` > 0, their
+    `heavy_hitters` most frequent values found with a Space-Saving summary of
+    `heavy_hitters_capacity` counters (10 times `heavy_hitters` by default). Those rows are
+    flagged in APPROXIMATE and FREQUENCY_ERROR is the maximum overestimation of the count.
+    Unique columns, according to fill_columns, get no heavy hitters and the values of
+    unique NOT NULL columns are read without grouping them.
+
+    The columns that can't be read are appended to `failed` and keep their previous rows.
     
     SERVER_NAME 
     TABLE_CATALOG 
@@ -580,332 +2720,195 @@ def insertOrUpdateDataValues(server_name, table_catalog, table_schema, table_nam
     DATA_VALUE 
     FREQUENCY_NUMBER 
     FREQUENCY_PERCENTAGE
+    APPROXIMATE
+    FREQUENCY_ERROR
     """
-    def checkIfTableExistInDataValues(server_name, table_catalog, table_schema, table_name, column_name):
-        if METADATA_ENGINE == 'mssqlserver':
-            conn_metadata = get_db_connection(metadata_connection_params)
-            sql = """select * from data_values
-                WHERE SERVER_NAME = ?
-                AND TABLE_CATALOG = ?
-                AND TABLE_SCHEMA = ?
-                AND TABLE_NAME = ?
-                AND COLUMN_NAME = ?;"""
-        elif METADATA_ENGINE == 'mysql':
-            conn_metadata = get_mysql_connection('metadata')
-            sql = """select * from data_values
-                WHERE SERVER_NAME = %s
-                AND TABLE_CATALOG = %s
-                AND TABLE_SCHEMA = %s
-                AND TABLE_NAME = %s
-                AND COLUMN_NAME = %s;"""
-        cursor_metadata = conn_metadata.cursor()
+    if failed is None:
+        failed = []
 
-        cursor_metadata.execute(sql, (server_name, table_catalog, table_schema, table_name, column_name))
-        num_rows = len(cursor_metadata.fetchall())
-
-        cursor_metadata.close()
-        conn_metadata.close()
-        return num_rows
-    
     def getColumnsFromTable(server_name, table_catalog, table_schema, table_name):
-        if METADATA_ENGINE == 'mssqlserver':
-            conn_metadata = get_db_connection(metadata_connection_params)
-            sql_fields = """select server_name
-                                , table_catalog
-                                , table_schema
-                                , table_name
-                                , column_name
-                            from columns
-                            WHERE SERVER_NAME = ?
-                            AND TABLE_CATALOG = ?
-                            AND TABLE_SCHEMA = ?
-                            AND TABLE_NAME = ?
-                            AND DATA_TYPE NOT IN ('text', 'image', 'ntext', 'blob', 'varbinary');"""
-        elif METADATA_ENGINE == 'mysql':
-            conn_metadata = get_mysql_connection('metadata')
-            sql_fields = """select server_name
-                                , table_catalog
-                                , table_schema
-                                , table_name
-                                , column_name
-                            from columns
-                            WHERE SERVER_NAME = %s
-                            AND TABLE_CATALOG = %s
-                            AND TABLE_SCHEMA = %s
-                            AND TABLE_NAME = %s
-                            AND DATA_TYPE NOT IN ('text', 'image', 'ntext', 'blob', 'varbinary');"""
-        cursor_metadata = conn_metadata.cursor()
-
-        cursor_metadata.execute(sql_fields, (server_name, table_catalog, table_schema, table_name))
-        rows = cursor_metadata.fetchall()
-
-        cursor_metadata.close()
-        conn_metadata.close()
-        return rows
+        return getColumnsOfTypes(server_name, table_catalog, table_schema, table_name, exclude_types = BLOB_TYPES)
     
-    def insertFrequencyValue(server_name, table_catalog, table_schema, table_name, column_name, threshold, number_of_rows, with_data_sample = False, n_samples = 10000):
-        if SOURCE_ENGINE == 'mssqlserver':
-            conn_source = get_db_connection(source_connection_params)
-        elif SOURCE_ENGINE == 'mysql':
-            conn_source = get_mysql_connection('source')
-        cursor_source = get_db_cursor(conn_source)
-
-        if METADATA_ENGINE == 'mssqlserver':
-            conn_metadata = get_db_connection(metadata_connection_params)
-        elif METADATA_ENGINE == 'mysql':
-            conn_metadata = get_mysql_connection('metadata')
-        cursor_metadata = conn_metadata.cursor()
-        
+    def getFrequencyValues(server_name, table_catalog, table_schema, table_name, column_name, threshold, source, where = '', parameters = ()):
+        """
+        Frequencies of the values of the column read from `source`, the table or a sample of it.
+        Returns the rows to store, or None when the column has too many distinct values
+        or can't be read.
+        """
         num_distinct_values = getNumDistinctValues(server_name, table_catalog, table_schema, table_name, column_name)
-        
-        if num_distinct_values < threshold:
-            if SOURCE_ENGINE == 'mssqlserver' and with_data_sample and number_of_rows > n_samples:
-                sql_frequency = """WITH t as (
-                                        select * FROM {1}.{2}.{3} TABLESAMPLE ({4} ROWS) REPEATABLE ({5})
-                                    )
-                                SELECT t.[{0}]
-                                    , COUNT(*) AS N 
-                                FROM t
-                                GROUP BY t.[{0}] 
-                                ORDER BY N DESC;""".format(column_name, table_catalog, table_schema, table_name, n_samples, 42)
-            elif SOURCE_ENGINE == 'mysql':
-                sql_frequency = """SELECT `{0}` AS `{0}`
-                                    , COUNT(*) AS N 
-                                FROM {1}.{2} 
-                                GROUP BY `{0}`;""".format(column_name, table_schema, table_name)
-            else:
-                sql_frequency = """SELECT [{0}]
-                                    , COUNT(*) AS N 
-                                FROM {1}.{2}.{3} 
-                                GROUP BY [{0}] 
-                                ORDER BY N DESC;""".format(column_name, table_catalog, table_schema, table_name)
-            cursor_source.execute(sql_frequency)
-            rows = cursor_source.fetchall()
+        if num_distinct_values is None or num_distinct_values >= threshold:
+            return None
+        if isUniqueColumn(server_name, table_catalog, table_schema, table_name, column_name) and isNotNullColumn(server_name, table_catalog, table_schema, table_name, column_name):
+            # Each value of a unique NOT NULL column appears once, there's nothing to group
+            sql_frequency = """SELECT {0}
+                                , 1 AS N 
+                            FROM {1} {2};""".format(quoteIdentifier(column_name), source, where)
+        else:
+            sql_frequency = """SELECT {0}
+                                , COUNT(*) AS N 
+                            FROM {1} {2}
+                            GROUP BY {0} 
+                            ORDER BY N DESC;""".format(quoteIdentifier(column_name), source, where)
 
-            pbar = tqdm(rows)
-            for row in pbar:
-                pbar.set_description('Distinct values')
-                if METADATA_ENGINE == 'mssqlserver':
-                    sql_insert = """insert into data_values (SERVER_NAME, TABLE_CATALOG, TABLE_SCHEMA, TABLE_NAME, COLUMN_NAME, DATA_VALUE, FREQUENCY_NUMBER)
-                                    values (?, ?, ?, ?, ?, ?, ?);"""
-                elif METADATA_ENGINE == 'mysql':
-                    sql_insert = """insert into data_values (SERVER_NAME, TABLE_CATALOG, TABLE_SCHEMA, TABLE_NAME, COLUMN_NAME, DATA_VALUE, FREQUENCY_NUMBER)
-                                    values (%s, %s, %s, %s, %s, %s, %s);"""
-                try:
-                    if isinstance(row[0], str):
-                        cursor_metadata.execute(sql_insert, (server_name, table_catalog, table_schema, table_name, column_name, row[0], row[1]))
-                    else:
-                        cursor_metadata.execute(sql_insert, (server_name, table_catalog, table_schema, table_name, column_name, str(row[0]), row[1]))
-                    conn_metadata.commit()
-                except:
-                    print('\nProblems with {}.{}'.format(table_name, column_name))
-                    pass
-        cursor_source.close()
-        conn_source.close()
+        conn_source = get_source_connection()
+        cursor_source = get_streaming_cursor(conn_source)
+        try:
+            if parameters:
+                cursor_source.execute(sql_frequency, parameters)
+            else:
+                cursor_source.execute(sql_frequency)
+            rows = frequencyRows(iterRows(cursor_source))
+        except:
+            print('\nProblems with {}.{}'.format(table_name, column_name))
+            failed.append(column_name)
+            return None
+        finally:
+            cursor_source.close()
+            conn_source.close()
+        return [row + (0, None) for row in rows]
 
-        cursor_metadata.close()
-        conn_metadata.close()
-        return
-    
-    def updateFrequencyValue(server_name, table_catalog, table_schema, table_name, column_name, threshold, number_of_rows, with_data_sample = False, n_samples = 10000):
-        conn_source = get_db_connection(source_connection_params)
+    def mergeFrequencyValue(server_name, table_catalog, table_schema, table_name, column_name, watermark_column, lower, upper):
+        """
+        Aggregates the rows with `lower` < watermark_column <= `upper` and adds them to the
+        stored frequencies.
+        """
+        sql_frequency = """SELECT {0}
+                            , COUNT(*) AS N 
+                        FROM {1}
+                        WHERE {2} > {3} AND {2} <= {3}
+                        GROUP BY {0};""".format(quoteIdentifier(column_name), getTableReference(table_catalog, table_schema, table_name), quoteIdentifier(watermark_column), sourceParameter())
+        conn_source = get_source_connection()
         cursor_source = get_db_cursor(conn_source)
-
-        conn_metadata = get_db_connection(metadata_connection_params)
+        conn_metadata = get_metadata_connection()
         cursor_metadata = conn_metadata.cursor()
-        
-        num_distinct_values = getNumDistinctValues(server_name, table_catalog, table_schema, table_name, column_name)
-        
-        if num_distinct_values < threshold:
-            if SOURCE_ENGINE == 'mssqlserver' and with_data_sample and number_of_rows > n_samples:
-                sql_frequency = """WITH t as (
-                                        select * FROM {1}.{2}.{3} TABLESAMPLE ({4} ROWS) REPEATABLE ({5})
-                                    )
-                                SELECT t.[{0}]
-                                    , COUNT(*) AS N 
-                                FROM t
-                                GROUP BY t.[{0}] 
-                                ORDER BY N DESC;""".format(column_name, table_catalog, table_schema, table_name, n_samples, 42)
-            else:
-                sql_frequency = """SELECT [{0}]
-                                    , COUNT(*) AS N 
-                                FROM {1}.{2}.{3} 
-                                GROUP BY [{0}] 
-                                ORDER BY N DESC;""".format(column_name, table_catalog, table_schema, table_name)
-
-            cursor_source.execute(sql_frequency)
+        try:
+            cursor_source.execute(sql_frequency, (lower, upper))
             rows = cursor_source.fetchall()
-
-            pbar = tqdm(rows)
-            for row in pbar:
-                pbar.set_description('Distinct values')
-                sql_update = """update data_values
-                                set FREQUENCY_NUMBER = {6}
-                                where SERVER_NAME = '{0}'
-                                    and TABLE_CATALOG = '{1}'
-                                    and TABLE_SCHEMA = '{2}'
-                                    and TABLE_NAME = '{3}'
-                                    and COLUMN_NAME = '{4}'
-                                    and DATA_VALUE = '{5}';""".format(server_name, table_catalog, table_schema, table_name, column_name, row[0], row[1])
-                try:
-                    if isinstance(row[0], str):
-                        cursor_metadata.execute(sql_update)
-                    else:
-                        cursor_metadata.execute(sql_update)
-                    conn_metadata.commit()
-                except:
-                    print('\nProblems with {}.{}'.format(table_name, column_name))
-                    pass
-        cursor_source.close()
-        conn_source.close()
-
-        cursor_metadata.close()
-        conn_metadata.close()
+            mergeFrequencies(conn_metadata, cursor_metadata, 'data_values', server_name, table_catalog, table_schema, table_name, column_name, rows, (watermark_column, upper))
+        except:
+            print('\nProblems with {}.{}'.format(table_name, column_name))
+            failed.append(column_name)
+        finally:
+            cursor_source.close()
+            conn_source.close()
+            cursor_metadata.close()
+            conn_metadata.close()
         return
     
-    def insertFrequencyPercentage(server_name, table_catalog, table_schema, table_name, column_name):
-        conn_metadata = get_db_connection(metadata_connection_params)
-        cursor_metadata = conn_metadata.cursor()
+    def getHeavyHitters(server_name, table_catalog, table_schema, table_name, column_name, source):
+        """
+        Streams the column through a Space-Saving summary and returns its top values.
+        Without a `source` the table is sampled with reservoirSample while it's streamed.
+        """
+        conn_source = get_source_connection()
+        cursor_source = get_streaming_cursor(conn_source)
 
-        sql_total = """SELECT SUM(FREQUENCY_NUMBER) AS TOTAL
-                        FROM data_values
-                        WHERE SERVER_NAME = ?
-                         AND TABLE_CATALOG = ?
-                         AND TABLE_SCHEMA = ?
-                         AND TABLE_NAME = ?
-                         AND COLUMN_NAME = ?;"""
-        cursor_metadata.execute(sql_total, (server_name, table_catalog, table_schema, table_name, column_name))
-        total = cursor_metadata.fetchall()[0][0]
-        
-        sql_frequency = """SELECT DATA_VALUE, FREQUENCY_NUMBER
-                            FROM data_values
-                            WHERE SERVER_NAME = ?
-                             AND TABLE_CATALOG = ?
-                             AND TABLE_SCHEMA = ?
-                             AND TABLE_NAME = ?
-                             AND COLUMN_NAME = ?;"""
-        cursor_metadata.execute(sql_frequency, (server_name, table_catalog, table_schema, table_name, column_name))
-        rows = cursor_metadata.fetchall()
-        pbar = tqdm(rows)
-        for row in pbar:
-            pbar.set_description('Percentage')
-            sql_update = """UPDATE data_values SET FREQUENCY_PERCENTAGE = ?
-                            WHERE SERVER_NAME = ?
-                             AND TABLE_CATALOG = ?
-                             AND TABLE_SCHEMA = ?
-                             AND TABLE_NAME = ?
-                             AND COLUMN_NAME = ?
-                             AND DATA_VALUE = ?;"""
-            cursor_metadata.execute(sql_update, ((row[1] / total), server_name, table_catalog, table_schema, table_name, column_name, row[0]))
-            conn_metadata.commit()
-        
-        cursor_metadata.close()
-        conn_metadata.close()    
-        return
+        sql_values = """SELECT {0} FROM {1};""".format(quoteIdentifier(column_name), source or getTableReference(table_catalog, table_schema, table_name))
+        try:
+            cursor_source.execute(sql_values)
+            summary = SpaceSaving(heavy_hitters_capacity or 10 * heavy_hitters)
+            if source is None:
+                rows = reservoirSample(iterRows(cursor_source), n_samples)
+                chunks = (rows[i:i + FETCH_SIZE] for i in range(0, len(rows), FETCH_SIZE))
+            else:
+                chunks = fetchInChunks(cursor_source)
+            for rows in chunks:
+                summary.update(row[0] for row in rows)
+            return [(dataValue(value), n, n / summary.n, 1, error) for value, n, error in summary.top(heavy_hitters)]
+        except:
+            print('\nProblems with {}.{}'.format(table_name, column_name))
+            failed.append(column_name)
+            return None
+        finally:
+            cursor_source.close()
+            conn_source.close()
     
     def getNumDistinctValues(server_name, table_catalog, table_schema, table_name, column_name):
-        if METADATA_ENGINE == 'mssqlserver':
-            conn_metadata = get_db_connection(metadata_connection_params)
-            sql_check_threshold = """select DISTINCT_VALUES from uniques 
-                                    where SERVER_NAME = ?
-                                        AND TABLE_CATALOG = ?
-                                        AND TABLE_SCHEMA = ?
-                                        AND TABLE_NAME = ?
-                                        AND COLUMN_NAME = ?;"""
-        elif METADATA_ENGINE == 'mysql':
-            conn_metadata = get_mysql_connection('metadata')
-            sql_check_threshold = """select DISTINCT_VALUES from uniques 
-                                    where SERVER_NAME = %s
-                                        AND TABLE_CATALOG = %s
-                                        AND TABLE_SCHEMA = %s
-                                        AND TABLE_NAME = %s
-                                        AND COLUMN_NAME = %s;"""
-        cursor_metadata = conn_metadata.cursor()
-
-        cursor_metadata.execute(sql_check_threshold, (server_name, table_catalog, table_schema, table_name, column_name))
-        rows = cursor_metadata.fetchone()
-
-        cursor_metadata.close()
-        conn_metadata.close()
-        #if rows == None:
-        #    return 0
-        #else:
-        #print(rows[0])
-        return rows[0]
+        uniques = getTableMetadata(server_name, table_catalog, table_schema, table_name)['uniques']
+        return uniques.get(column_name, (None, None))[0]
         
     def getNumberOfRows(server_name, table_catalog, table_schema, table_name):
-        if METADATA_ENGINE == 'mssqlserver':
-            conn_metadata = get_db_connection(metadata_connection_params)
-            sql = """select N_ROWS from tables
-                    WHERE SERVER_NAME = ?
-                        AND TABLE_CATALOG = ?
-                        AND TABLE_SCHEMA = ?
-                        AND TABLE_NAME = ?;"""
-        elif METADATA_ENGINE == 'mysql':
-            conn_metadata = get_mysql_connection('metadata')
-            sql = """select N_ROWS from tables
-                    WHERE SERVER_NAME = %s
-                        AND TABLE_CATALOG = %s
-                        AND TABLE_SCHEMA = %s
-                        AND TABLE_NAME = %s;"""
-        cursor_metadata = conn_metadata.cursor()
-
-        cursor_metadata.execute(sql, (server_name, table_catalog, table_schema, table_name))
-        num_rows = cursor_metadata.fetchall()[0][0]
+        return getTableNumberOfRows(server_name, table_catalog, table_schema, table_name)
 
-        cursor_metadata.close()
-        conn_metadata.close()
-        return num_rows
+    columns = getColumnsFromTable(server_name, table_catalog, table_schema, table_name)
+    number_of_rows = getNumberOfRows(server_name, table_catalog, table_schema, table_name)
+    if resume:
+        completed = getCompletedUnits('data_values', server_name, table_catalog, table_schema, table_name)
+        columns = [column for column in columns if (table_name, column[4]) not in completed]
 
-    def deleteExistingRows(server_name, table_catalog, table_schema, table_name, column_name):
-        if METADATA_ENGINE == 'mssqlserver':
-            conn_metadata = get_db_connection(metadata_connection_params)
-            sql_delete = """delete from data_values
-                        WHERE SERVER_NAME = ?
-                        AND TABLE_CATALOG = ?
-                        AND TABLE_SCHEMA = ?
-                        AND TABLE_NAME = ?
-                        AND COLUMN_NAME = ?;"""
-        elif METADATA_ENGINE == 'mysql':
-            conn_metadata = get_mysql_connection('metadata')
-            sql_delete = """delete from data_values
-                        WHERE SERVER_NAME = %s
-                        AND TABLE_CATALOG = %s
-                        AND TABLE_SCHEMA = %s
-                        AND TABLE_NAME = %s
-                        AND COLUMN_NAME = %s;"""
-        cursor_metadata = conn_metadata.cursor()
+    source = getTableReference(table_catalog, table_schema, table_name)
+    if with_data_sample:
+        source, sample_method, sample_rows = getSample('data_values', server_name, table_catalog, table_schema, table_name, n_samples, number_of_rows)
 
-        cursor_metadata.execute(sql_delete, (server_name, table_catalog, table_schema, table_name, column_name))
-        conn_metadata.commit()
+    watermark_column = None
+    if incremental and not with_data_sample:
+        conn_source = get_source_connection()
+        cursor_source = get_db_cursor(conn_source)
+        watermark_column = (watermark_columns or {}).get(table_name) or getIdentityColumn(cursor_source, table_catalog, table_schema, table_name)
+        if watermark_column is not None:
+            # Rows appended while the columns are processed are left for the next run
+            upper = getMaxWatermark(cursor_source, table_catalog, table_schema, table_name, watermark_column)
+            if upper is None:
+                watermark_column = None
+        cursor_source.close()
+        conn_source.close()
 
-        cursor_metadata.close()
-        conn_metadata.close()
-        return
-    
-    columns = getColumnsFromTable(server_name, table_catalog, table_schema, table_name)
-    number_of_rows = getNumberOfRows(server_name, table_catalog, table_schema, table_name)
-    pbar = tqdm(columns)
+    # The rows of the columns are written together once the table is read
+    frequencies = OrderedDict()
+    watermarks = {}
+    pbar = tqdm(columns, disable = not progress)
     for column in pbar:
         pbar.set_description('Column %s' % column[4])
-        if checkIfTableExistInDataValues(server_name, table_catalog, table_schema, table_name, column[4]) > 0:
-            deleteExistingRows(server_name, table_catalog, table_schema, table_name, column[4])
-        
-        insertFrequencyValue(server_name, table_catalog, table_schema, table_name, column[4], threshold, number_of_rows, with_data_sample, n_samples)
-        #updateFrequencyValue(server_name, table_catalog, table_schema, table_name, column[4], threshold, number_of_rows, with_data_sample, n_samples)
-        #insertFrequencyPercentage(server_name, table_catalog, table_schema, table_name, column[4])
-        
+        if watermark_column is not None:
+            watermark = getWatermark('data_values', server_name, table_catalog, table_schema, table_name, column[4])
+            # Without a uniques row the column can't be checked against the threshold, it's read again in full
+            num_distinct_values = getNumDistinctValues(server_name, table_catalog, table_schema, table_name, column[4])
+            if watermark is not None and watermark[0] == watermark_column and num_distinct_values is not None and num_distinct_values < threshold:
+                mergeFrequencyValue(server_name, table_catalog, table_schema, table_name, column[4], watermark_column, watermark[1], upper)
+                if column[4] not in failed:
+                    markCompleted('data_values', server_name, table_catalog, table_schema, table_name, column[4])
+                continue
+
+        # Unique columns have no heavy hitters, every value appears once
+        rows = None
+        if heavy_hitters > 0 and (getNumDistinctValues(server_name, table_catalog, table_schema, table_name, column[4]) or 0) >= threshold and not isUniqueColumn(server_name, table_catalog, table_schema, table_name, column[4]):
+            rows = getHeavyHitters(server_name, table_catalog, table_schema, table_name, column[4], source)
+        elif watermark_column is not None:
+            where = 'WHERE {} <= {}'.format(quoteIdentifier(watermark_column), sourceParameter())
+            rows = getFrequencyValues(server_name, table_catalog, table_schema, table_name, column[4], threshold, source, where = where, parameters = (upper,))
+            if rows is not None:
+                watermarks[column[4]] = (watermark_column, upper)
+        elif source is not None:
+            rows = getFrequencyValues(server_name, table_catalog, table_schema, table_name, column[4], threshold, source)
+        if column[4] in failed:
+            continue
+        # Columns without rows lose the ones of previous runs too
+        frequencies[column[4]] = rows or []
+
+    if frequencies:
+        conn_metadata = get_metadata_connection()
+        cursor_metadata = conn_metadata.cursor()
+        try:
+            replaceFrequencies(conn_metadata, cursor_metadata, 'data_values', server_name, table_catalog, table_schema, table_name, frequencies, watermarks, batch_size)
+        finally:
+            cursor_metadata.close()
+            conn_metadata.close()
+    for column_name in frequencies:
+        markCompleted('data_values', server_name, table_catalog, table_schema, table_name, column_name)
         if verbose:
-            logger.info('{}.{}.{}.{}.{} updated into data_values...'.format(server_name, table_catalog, table_schema, table_name, column[4]))
+            logger.info('{}.{}.{}.{}.{} updated into data_values...'.format(server_name, table_catalog, table_schema, table_name, column_name))
     
     return
 
-def insertOrUpdateDates(server_name, table_catalog, table_schema, table_name, verbose = False, thresold = 5000):
+def insertOrUpdateDates(server_name, table_catalog, table_schema, table_name, verbose = False, thresold = 5000, batch_size = None, resume = False, incremental = False, watermark_columns = None, with_data_sample = False, n_samples = 10000, progress = True, failed = None):
     """
     Stores each distinct data value of each column based on a threshould of distinct values
     (5000 distinct values by default) and has the frequency of the data value. 
     It stores only data of `date` or `time` types columns.
     It simplifies to group and visualise the time series data.
+
+    `incremental`, `watermark_columns`, `with_data_sample`, `n_samples` and `failed` work
+    as in insertOrUpdateDataValues.
     
     SERVER_NAME 
     TABLE_CATALOG 
@@ -916,195 +2919,132 @@ def insertOrUpdateDates(server_name, table_catalog, table_schema, table_name, ve
     FREQUENCY_NUMBER 
     FREQUENCY_PERCENTAGE
     """
-    if METADATA_ENGINE == 'mssqlserver':
-        conn_metadata = get_db_connection(metadata_connection_params)
-    elif METADATA_ENGINE == 'mysql':
-        conn_metadata = get_mysql_connection('metadata')
+    if failed is None:
+        failed = []
+
+    conn_metadata = get_metadata_connection()
     cursor_metadata = conn_metadata.cursor()
 
-    if SOURCE_ENGINE == 'mssqlserver':
-        conn_source = get_db_connection(source_connection_params)
-    elif SOURCE_ENGINE == 'mysql':
-        conn_source = get_mysql_connection('source')
+    conn_source = get_source_connection()
     cursor_source = get_db_cursor(conn_source)
 
-    def checkIfTableExistInDates(server_name, table_catalog, table_schema, table_name, column_name):
-        if METADATA_ENGINE == 'mssqlserver':
-            sql = """select * from dates
-                WHERE SERVER_NAME = ?
-                AND TABLE_CATALOG = ?
-                AND TABLE_SCHEMA = ?
-                AND TABLE_NAME = ?
-                AND COLUMN_NAME = ?;"""
-        elif METADATA_ENGINE == 'mysql':
-            sql = """select * from dates
-                WHERE SERVER_NAME = %s
-                AND TABLE_CATALOG = %s
-                AND TABLE_SCHEMA = %s
-                AND TABLE_NAME = %s
-                AND COLUMN_NAME = %s;"""
-        cursor_metadata.execute(sql, (server_name, table_catalog, table_schema, table_name, column_name))
-        return len(cursor_metadata.fetchall())
-    
     def getDatetimeColumns(server_name, table_catalog, table_schema, table_name):
-        if METADATA_ENGINE == 'mssqlserver':
-            sql_datetimes = """select server_name
-                                , table_catalog
-                                , table_schema
-                                , table_name
-                                , column_name
-                                from columns 
-                                WHERE SERVER_NAME = ?
-                                AND TABLE_CATALOG = ?
-                                AND TABLE_SCHEMA = ?
-                                AND TABLE_NAME = ?
-                                AND DATA_TYPE IN ('datetime', 'timestamp', 'date', 'datetime2', 'smalldatetime');"""
-        elif METADATA_ENGINE == 'mysql':
-            sql_datetimes = """select server_name
-                                , table_catalog
-                                , table_schema
-                                , table_name
-                                , column_name
-                                from columns 
-                                WHERE SERVER_NAME = %s
-                                AND TABLE_CATALOG = %s
-                                AND TABLE_SCHEMA = %s
-                                AND TABLE_NAME = %s
-                                AND DATA_TYPE IN ('datetime', 'timestamp', 'date', 'datetime2', 'smalldatetime');"""
-        cursor_metadata.execute(sql_datetimes, (server_name, table_catalog, table_schema, table_name))
-        return cursor_metadata.fetchall()
+        return getColumnsOfTypes(server_name, table_catalog, table_schema, table_name, DATE_TYPES)
     
-    def insertDateFrequency(server_name, table_catalog, table_schema, table_name, column_name, thresold):
+    def getDateFrequency(server_name, table_catalog, table_schema, table_name, column_name, thresold, source, where = '', parameters = ()):
         """
         This is working for MS SQL Server. 
         For other SQL engines this function should be implemented with their own date functions.
+        Returns the rows to store, or None when there are more than `thresold` dates or
+        they can't be read.
         """
-        if SOURCE_ENGINE == 'mssqlserver':
-            sql_agg_month = """SELECT DATEFROMPARTS(YEAR({}), MONTH({}), 1) as date, count(*) as N 
-                            FROM {}.{}.{}
-                            GROUP BY DATEFROMPARTS(YEAR({}), MONTH({}), 1)
-                            ORDER BY N DESC;""".format(column_name, column_name, table_catalog, table_schema, table_name, column_name, column_name)
-        elif SOURCE_ENGINE == 'mysql':
-            sql_agg_month = """select makedate(extract(year from `{0}`), DAYOFYEAR(`{0}`)) as date
-                    , count(*) as N
-                    from {1}.{2}
-                    group by makedate(extract(year from `{0}`), DAYOFYEAR(`{0}`));""".format(column_name, table_schema, table_name)
+        sql_agg_month = """SELECT {0} as date, count(*) as N 
+                        FROM {1} {2}
+                        GROUP BY {0}
+                        ORDER BY N DESC;""".format(getDateBucket(column_name), source, where)
         #print(sql_agg_month)
+
+        def getValues(cursor_stream):
+            # More than `thresold` dates stores none of them
+            for n, row in enumerate(iterRows(cursor_stream)):
+                if n >= thresold:
+                    raise OverflowError('More than {} dates'.format(thresold))
+                yield row
+
+        cursor_stream = get_streaming_cursor(conn_source)
         try:
-            cursor_source.execute(sql_agg_month)
-            rows = cursor_source.fetchall()
-            
-            if len(rows) < thresold:
-                for row in rows:
-                    if METADATA_ENGINE == 'mssqlserver':
-                        sql_insert = """INSERT INTO dates (SERVER_NAME, TABLE_CATALOG, TABLE_SCHEMA, TABLE_NAME, COLUMN_NAME, DATA_VALUE, FREQUENCY_NUMBER)
-                                        VALUES (?, ?, ?, ?, ?, ?, ?)"""
-                    elif METADATA_ENGINE == 'mysql':
-                        sql_insert = """INSERT INTO dates (SERVER_NAME, TABLE_CATALOG, TABLE_SCHEMA, TABLE_NAME, COLUMN_NAME, DATA_VALUE, FREQUENCY_NUMBER)
-                                        VALUES (%s, %s, %s, %s, %s, %s, %s)"""
-                    cursor_metadata.execute(sql_insert, (server_name, table_catalog, table_schema, table_name, column_name, row[0], row[1]))
-                    conn_metadata.commit()
-        except:
-            print('Problems with: {}.{}'.format(table_name, column_name))
+            if parameters:
+                cursor_stream.execute(sql_agg_month, parameters)
+            else:
+                cursor_stream.execute(sql_agg_month)
+            return frequencyRows(getValues(cursor_stream))
+        except OverflowError:
             pass
-
-        return
-    
-    def updateFrequencyPercentage(server_name, table_catalog, table_schema, table_name, column_name):
-        if METADATA_ENGINE == 'mssqlserver':
-            sql_total = """SELECT SUM(FREQUENCY_NUMBER) AS TOTAL
-                            FROM dates
-                            WHERE SERVER_NAME = ?
-                            AND TABLE_CATALOG = ?
-                            AND TABLE_SCHEMA = ?
-                            AND TABLE_NAME = ?
-                            AND COLUMN_NAME = ?;"""
-            sql_frequency = """SELECT DATA_VALUE, FREQUENCY_NUMBER
-                            FROM dates
-                            WHERE SERVER_NAME = ?
-                             AND TABLE_CATALOG = ?
-                             AND TABLE_SCHEMA = ?
-                             AND TABLE_NAME = ?
-                             AND COLUMN_NAME = ?;"""
-        elif METADATA_ENGINE == 'mysql':
-            sql_total = """SELECT SUM(FREQUENCY_NUMBER) AS TOTAL
-                            FROM dates
-                            WHERE SERVER_NAME = %s
-                            AND TABLE_CATALOG = %s
-                            AND TABLE_SCHEMA = %s
-                            AND TABLE_NAME = %s
-                            AND COLUMN_NAME = %s;"""
-            sql_frequency = """SELECT DATA_VALUE, FREQUENCY_NUMBER
-                            FROM dates
-                            WHERE SERVER_NAME = %s
-                             AND TABLE_CATALOG = %s
-                             AND TABLE_SCHEMA = %s
-                             AND TABLE_NAME = %s
-                             AND COLUMN_NAME = %s;"""
-        cursor_metadata.execute(sql_total, (server_name, table_catalog, table_schema, table_name, column_name))
-        total = cursor_metadata.fetchall()[0][0]
-        
-        cursor_metadata.execute(sql_frequency, (server_name, table_catalog, table_schema, table_name, column_name))
-        rows = cursor_metadata.fetchall()
-        pbar = tqdm(rows)
-        for row in pbar:
-            pbar.set_description('Updating {}'.format(column_name))
-            if METADATA_ENGINE == 'mssqlserver':
-                sql_update = """UPDATE dates SET FREQUENCY_PERCENTAGE = ?
-                                WHERE SERVER_NAME = ?
-                                AND TABLE_CATALOG = ?
-                                AND TABLE_SCHEMA = ?
-                                AND TABLE_NAME = ?
-                                AND COLUMN_NAME = ?
-                                AND DATA_VALUE = ?;"""
-            elif METADATA_ENGINE == 'mysql':
-                sql_update = """UPDATE dates SET FREQUENCY_PERCENTAGE = %s
-                                WHERE SERVER_NAME = %s
-                                AND TABLE_CATALOG = %s
-                                AND TABLE_SCHEMA = %s
-                                AND TABLE_NAME = %s
-                                AND COLUMN_NAME = %s
-                                AND DATA_VALUE = %s;"""
-            cursor_metadata.execute(sql_update, ((row[1] / total), server_name, table_catalog, table_schema, table_name, column_name, row[0]))
-            conn_metadata.commit()
+        except:
+            print('Problems with: {}.{}'.format(table_name, column_name))
+            failed.append(column_name)
+            # PostgreSQL refuses more queries in a failed transaction
+            conn_source.rollback()
+        finally:
+            cursor_stream.close()
+
+        return None
+
+    def mergeDateFrequency(server_name, table_catalog, table_schema, table_name, column_name, watermark_column, lower, upper):
+        sql_agg_month = """SELECT {0} as date, count(*) as N
+                        FROM {1}
+                        WHERE {2} > {3} AND {2} <= {3}
+                        GROUP BY {0};""".format(getDateBucket(column_name), getTableReference(table_catalog, table_schema, table_name), quoteIdentifier(watermark_column), sourceParameter())
+        try:
+            cursor_source.execute(sql_agg_month, (lower, upper))
+            rows = cursor_source.fetchall()
+            mergeFrequencies(conn_metadata, cursor_metadata, 'dates', server_name, table_catalog, table_schema, table_name, column_name, rows, (watermark_column, upper))
+        except:
+            print('Problems with: {}.{}'.format(table_name, column_name))
+            failed.append(column_name)
+            conn_source.rollback()
         return
     
     columns = getDatetimeColumns(server_name, table_catalog, table_schema, table_name)
-    pbar = tqdm(columns)
+    if resume:
+        completed = getCompletedUnits('dates', server_name, table_catalog, table_schema, table_name)
+        columns = [column for column in columns if (table_name, column[4]) not in completed]
+
+    source = getTableReference(table_catalog, table_schema, table_name)
+    if with_data_sample:
+        source, sample_method, sample_rows = getSample('dates', server_name, table_catalog, table_schema, table_name, n_samples)
+
+    watermark_column = None
+    if incremental and not with_data_sample:
+        watermark_column = (watermark_columns or {}).get(table_name) or getIdentityColumn(cursor_source, table_catalog, table_schema, table_name)
+        if watermark_column is not None:
+            upper = getMaxWatermark(cursor_source, table_catalog, table_schema, table_name, watermark_column)
+            if upper is None:
+                watermark_column = None
+
+    # The rows of the columns are written together once the table is read
+    frequencies = OrderedDict()
+    watermarks = {}
+    pbar = tqdm(columns, disable = not progress)
     for column in pbar:
         pbar.set_description('Column {}'.format(column[4]))
-        if checkIfTableExistInDates(server_name, table_catalog, table_schema, table_name, column[4]) > 0:
-            if METADATA_ENGINE == 'mssqlserver':
-                sql_delete = """delete from dates
-                                WHERE SERVER_NAME = ?
-                                AND TABLE_CATALOG = ?
-                                AND TABLE_SCHEMA = ?
-                                AND TABLE_NAME = ?
-                                AND COLUMN_NAME = ?;"""
-            elif METADATA_ENGINE == 'mysql':
-                sql_delete = """delete from dates
-                                WHERE SERVER_NAME = %s
-                                AND TABLE_CATALOG = %s
-                                AND TABLE_SCHEMA = %s
-                                AND TABLE_NAME = %s
-                                AND COLUMN_NAME = %s;"""
-            cursor_metadata.execute(sql_delete, (server_name, table_catalog, table_schema, table_name, column[4]))
-            conn_metadata.commit()
-        
-        insertDateFrequency(server_name, table_catalog, table_schema, table_name, column[4], thresold)
-        #updateFrequencyPercentage(server_name, table_catalog, table_schema, table_name, column[4])
-    
-        if verbose:
-            logger.info('{}.{}.{}.{}.{} updated into dates...'.format(server_name, table_catalog, table_schema, table_name, column[4]))
-    
-    cursor_source.close()
-    conn_source.close()
+        if watermark_column is not None:
+            watermark = getWatermark('dates', server_name, table_catalog, table_schema, table_name, column[4])
+            if watermark is not None and watermark[0] == watermark_column:
+                mergeDateFrequency(server_name, table_catalog, table_schema, table_name, column[4], watermark_column, watermark[1], upper)
+                if column[4] not in failed:
+                    markCompleted('dates', server_name, table_catalog, table_schema, table_name, column[4])
+                continue
 
-    cursor_metadata.close()
-    conn_metadata.close()
+        rows = None
+        if watermark_column is not None:
+            where = 'WHERE {} <= {}'.format(quoteIdentifier(watermark_column), sourceParameter())
+            rows = getDateFrequency(server_name, table_catalog, table_schema, table_name, column[4], thresold, source, where, (upper,))
+            if rows is not None:
+                watermarks[column[4]] = (watermark_column, upper)
+        elif source is not None:
+            rows = getDateFrequency(server_name, table_catalog, table_schema, table_name, column[4], thresold, source)
+        if column[4] in failed:
+            continue
+        # Columns without rows lose the ones of previous runs too
+        frequencies[column[4]] = rows or []
+
+    try:
+        if frequencies:
+            replaceFrequencies(conn_metadata, cursor_metadata, 'dates', server_name, table_catalog, table_schema, table_name, frequencies, watermarks, batch_size)
+    finally:
+        cursor_source.close()
+        conn_source.close()
+
+        cursor_metadata.close()
+        conn_metadata.close()
+    for column_name in frequencies:
+        markCompleted('dates', server_name, table_catalog, table_schema, table_name, column_name)
+        if verbose:
+            logger.info('{}.{}.{}.{}.{} updated into dates...'.format(server_name, table_catalog, table_schema, table_name, column_name))
     return
 
-def insertOrUpdateStats(server_name, table_catalog, table_schema, table_name, verbose = False, level = 'one', with_data_sample = False, n_samples = 10000):
+def insertOrUpdateStats(server_name, table_catalog, table_schema, table_name, verbose = False, level = 'one', with_data_sample = False, n_samples = 10000, resume = False, progress = True, failed = None):
     """
     Three levels:
     - one: only stats
@@ -1132,135 +3072,134 @@ def insertOrUpdateStats(server_name, table_catalog, table_schema, table_name, ve
     , P975
     , P99 
     , IQR 
+
+    The columns whose percentiles can't be computed are appended to `failed`.
     """
-    conn_source = get_db_connection(source_connection_params)
+    if failed is None:
+        failed = []
+
+    conn_source = get_source_connection()
     cursor_source = get_db_cursor(conn_source)
 
-    conn_metadata = get_db_connection(metadata_connection_params)
+    conn_metadata = get_metadata_connection()
     cursor_metadata = conn_metadata.cursor()
 
-    def checkIfTableExistInStats(server_name, table_catalog, table_schema, table_name, column_name):
-        sql = """select * from stats
-            WHERE SERVER_NAME = ?
-             AND TABLE_CATALOG = ?
-             AND TABLE_SCHEMA = ?
-             AND TABLE_NAME = ?
-             AND COLUMN_NAME = ?;"""
-        cursor_metadata.execute(sql, (server_name, table_catalog, table_schema, table_name, column_name))
-        return len(cursor_metadata.fetchall())
-    
+    stats_columns = METADATA_KEYS['stats'] + ('AVG', 'STDEV', 'VAR', 'SUM', 'MAX', 'MIN', '`RANGE`' if METADATA_ENGINE == 'mysql' else 'RANGE_'
+                                              , 'P01', 'P025', 'P05', 'P10', 'Q1', 'Q2', 'Q3', 'P90', 'P95', 'P975', 'P99', 'IQR', 'QUANTILE_SKETCH')
+
     def getNumericColumnsFromTable(server_name, table_catalog, table_schema, table_name):
-        sql_fields = """select server_name
-                            , table_catalog
-                            , table_schema
-                            , table_name
-                            , column_name
-                        from columns 
-                        WHERE SERVER_NAME = ?
-                         AND TABLE_CATALOG = ?
-                         AND TABLE_SCHEMA = ?
-                         AND TABLE_NAME = ?
-                         AND DATA_TYPE IN ('int', 'decimal', 'numeric', 'float', 'money', 'tinyint', 'bigint', 'smallint', 'real');"""
-        cursor_metadata.execute(sql_fields, (server_name, table_catalog, table_schema, table_name))
-        return cursor_metadata.fetchall()
+        return getColumnsOfTypes(server_name, table_catalog, table_schema, table_name, NUMERIC_TYPES)
     
-    def insertBasicStats(server_name, table_catalog, table_schema, table_name, column_name, with_data_sample = False):
-        if SOURCE_ENGINE == 'mssqlserver' and with_data_sample:
-            sql_stats = """with t as ( SELECT * FROM {1}.{2}.{3} TABLESAMPLE ({4} ROWS) REPEATABLE ({5})
-                            )
-                            SELECT  AVG(CAST("{0}" as FLOAT)) AS AVG_
-                                , STDEV(CAST("{0}" as FLOAT)) as STDEV_
-                                , VAR(CAST("{0}" as FLOAT)) as VAR_
-                                , SUM(CAST("{0}" as FLOAT)) as SUM_
-                                , MAX(CAST("{0}" as FLOAT)) AS MAX_
-                                , MIN(CAST("{0}" as FLOAT)) AS MIN_
-                                , MAX(CAST("{0}" as FLOAT)) - MIN(CAST("{0}" as FLOAT)) as RANGE_
-                        FROM    t;""".format(column_name, table_catalog, table_schema, table_name, n_samples, 42)
+    def insertBasicStats(server_name, table_catalog, table_schema, table_name, column_name, source):
+        if SOURCE_ENGINE == 'mssqlserver':
+            stdev, var = 'STDEV', 'VAR'
         else:
-            sql_stats = """SELECT  AVG(CAST("{0}" as FLOAT)) AS AVG_
-                                , STDEV(CAST("{0}" as FLOAT)) as STDEV_
-                                , VAR(CAST("{0}" as FLOAT)) as VAR_
-                                , SUM(CAST("{0}" as FLOAT)) as SUM_
-                                , MAX(CAST("{0}" as FLOAT)) AS MAX_
-                                , MIN(CAST("{0}" as FLOAT)) AS MIN_
-                                , MAX(CAST("{0}" as FLOAT)) - MIN(CAST("{0}" as FLOAT)) as RANGE_
-                        FROM    {1}.{2}.{3};""".format(column_name, table_catalog, table_schema, table_name)
+            stdev, var = 'STDDEV_SAMP', 'VAR_SAMP'
+        sql_stats = """SELECT  AVG(CAST({0} as FLOAT)) AS AVG_
+                            , {2}(CAST({0} as FLOAT)) as STDEV_
+                            , {3}(CAST({0} as FLOAT)) as VAR_
+                            , SUM(CAST({0} as FLOAT)) as SUM_
+                            , MAX(CAST({0} as FLOAT)) AS MAX_
+                            , MIN(CAST({0} as FLOAT)) AS MIN_
+                            , MAX(CAST({0} as FLOAT)) - MIN(CAST({0} as FLOAT)) as RANGE_
+                    FROM    {1};""".format(quoteIdentifier(column_name), source, stdev, var)
         cursor_source.execute(sql_stats)
         rows = cursor_source.fetchall()
-        for row in rows:
-            sql_insert = """insert into stats (SERVER_NAME, TABLE_CATALOG, TABLE_SCHEMA, TABLE_NAME, COLUMN_NAME, AVG, STDEV, VAR, SUM, MAX, MIN, RANGE_)
-                            values (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?);"""
-            cursor_metadata.execute(sql_insert, (server_name, table_catalog, table_schema, table_name, column_name, row[0], row[1], row[2], row[3], row[4], row[5], row[6]))
-            conn_metadata.commit()
+        # The percentiles of a previous run are cleared, updatePercentiles fills them again
+        upsertRows(conn_metadata, cursor_metadata, 'stats', stats_columns, ((server_name, table_catalog, table_schema, table_name, column_name) + tuple(row) + (None,) * 13 for row in rows))
         return
     
-    def updatePercentiles(server_name, table_catalog, table_schema, table_name, column_name):
-        sql_percentiles = """select distinct 
-                                    percentile_cont(0.01) within group (order by "{0}") over (partition by null) as P01
-                                    , percentile_cont(0.025) within group (order by "{0}") over (partition by null) as P025
-                                    , percentile_cont(0.05) within group (order by "{0}") over (partition by null) as P05
-                                    , percentile_cont(0.10) within group (order by "{0}") over (partition by null) as P10
-                                    , percentile_cont(0.25) within group (order by "{0}") over (partition by null) as Q1
-                                    , percentile_cont(0.5) within group (order by "{0}") over (partition by null) as Q2
-                                    , percentile_cont(0.75) within group (order by "{0}") over (partition by null) as Q3
-                                    , percentile_cont(0.90) within group (order by "{0}") over (partition by null) as P90
-                                    , percentile_cont(0.95) within group (order by "{0}") over (partition by null) as P95
-                                    , percentile_cont(0.975) within group (order by "{0}") over (partition by null) as P975
-                                    , percentile_cont(0.99) within group (order by "{0}") over (partition by null) as P99
-                                    , percentile_cont(0.75) within group (order by "{0}") over (partition by null) - percentile_cont(0.25) within group (order by "{0}") over (partition by null) as IQR
-                            from {1}.{2}.{3}""".format(column_name, table_catalog, table_schema, table_name)
+    def updatePercentiles(server_name, table_catalog, table_schema, table_name, column_name, source):
+        """
+        P01 to P99 and IQR from one streaming pass over the column with a t-digest,
+        instead of one percentile_cont window per percentile. The digest is stored in
+        QUANTILE_SKETCH, getQuantile answers any other quantile from it later.
+        """
+        if METADATA_ENGINE in ('mssqlserver', 'sqlite'):
+            sql_update = """update {} set P01 = ?
+                            , P025 = ?
+                            , P05 = ?
+                            , P10 = ?
+                            , Q1  = ?
+                            , Q2  = ?
+                            , Q3  = ?
+                            , P90  = ?
+                            , P95  = ?
+                            , P975 = ?
+                            , P99  = ?
+                            , IQR  = ?
+                            , QUANTILE_SKETCH = ?
+                            where SERVER_NAME = ?
+                            AND TABLE_CATALOG = ?
+                            AND TABLE_SCHEMA = ?
+                            AND TABLE_NAME = ?
+                            AND COLUMN_NAME = ?;""".format(metadataTable('stats'))
+        elif METADATA_ENGINE in ('mysql', 'postgres'):
+            sql_update = """update {} set P01 = %s
+                            , P025 = %s
+                            , P05 = %s
+                            , P10 = %s
+                            , Q1  = %s
+                            , Q2  = %s
+                            , Q3  = %s
+                            , P90  = %s
+                            , P95  = %s
+                            , P975 = %s
+                            , P99  = %s
+                            , IQR  = %s
+                            , QUANTILE_SKETCH = %s
+                            where SERVER_NAME = %s
+                            AND TABLE_CATALOG = %s
+                            AND TABLE_SCHEMA = %s
+                            AND TABLE_NAME = %s
+                            AND COLUMN_NAME = %s;""".format(metadataTable('stats'))
+        sql_values = """select {0} from {1} where {0} is not null""".format(quoteIdentifier(column_name), source)
+        cursor_stream = get_streaming_cursor(conn_source)
         try:
-            cursor_source.execute(sql_percentiles)
-            rows = cursor_source.fetchall()
-            for row in rows:
-                sql_update = """update stats set P01 = ?
-                                , P025 = ?
-                                , P05 = ?
-                                , P10 = ?
-                                , Q1  = ?
-                                , Q2  = ?
-                                , Q3  = ?
-                                , P90  = ?
-                                , P95  = ?
-                                , P975 = ?
-                                , P99  = ?
-                                , IQR  = ?
-                                where SERVER_NAME = ?
-                                AND TABLE_CATALOG = ?
-                                AND TABLE_SCHEMA = ?
-                                AND TABLE_NAME = ?
-                                AND COLUMN_NAME = ?;"""
-                cursor_metadata.execute(sql_update, (row[0], row[1], row[2], row[3], row[4], row[5], row[6], row[7], row[8], row[9], row[10], row[11], server_name, table_catalog, table_schema, table_name, column_name))
+            cursor_stream.execute(sql_values)
+            digest = TDigest()
+            for rows in fetchInChunks(cursor_stream):
+                digest.update(row[0] for row in rows)
+            if digest.count > 0:
+                percentiles = digest.percentiles(PERCENTILES)
+                values = tuple(percentiles) + (percentiles[6] - percentiles[4], digest.to_json())
+                cursor_metadata.execute(sql_update, values + (server_name, table_catalog, table_schema, table_name, column_name))
                 conn_metadata.commit()
         except:
-            print(sql_percentiles)
-            pass
+            print('Problems with: {}.{}'.format(table_name, column_name))
+            failed.append(column_name)
+            conn_source.rollback()
+            conn_metadata.rollback()
+        finally:
+            cursor_stream.close()
         
         return
     
     columns = getNumericColumnsFromTable(server_name, table_catalog, table_schema, table_name)
-    pbar = tqdm(columns)
+    if resume:
+        completed = getCompletedUnits('stats', server_name, table_catalog, table_schema, table_name)
+        columns = [column for column in columns if (table_name, column[4]) not in completed]
+    source = getTableReference(table_catalog, table_schema, table_name)
+    if with_data_sample and columns:
+        source, sample_method, sample_rows = getSample('stats', server_name, table_catalog, table_schema, table_name, n_samples)
+        if source is None:
+            # No SQL sampling for this engine, statistics are computed on the whole table
+            source = getTableReference(table_catalog, table_schema, table_name)
+    pbar = tqdm(columns, disable = not progress)
     for column in pbar:
         pbar.set_description('Column %s' % column[4])
-        if checkIfTableExistInStats(server_name, table_catalog, table_schema, table_name, column[4]):
-            sql_delete = """delete from stats
-                    WHERE SERVER_NAME = ?
-                     AND TABLE_CATALOG = ?
-                     AND TABLE_SCHEMA = ?
-                     AND TABLE_NAME = ?
-                     AND COLUMN_NAME = ?;"""
-            cursor_metadata.execute(sql_delete, (server_name, table_catalog, table_schema, table_name, column[4]))
-            conn_metadata.commit()
-            
         if level == 'one':
-            insertBasicStats(server_name, table_catalog, table_schema, table_name, column[4])
+            insertBasicStats(server_name, table_catalog, table_schema, table_name, column[4], source)
         elif level == 'two':
-            insertBasicStats(server_name, table_catalog, table_schema, table_name, column[4])
-            updatePercentiles(server_name, table_catalog, table_schema, table_name, column[4])
+            insertBasicStats(server_name, table_catalog, table_schema, table_name, column[4], source)
+            updatePercentiles(server_name, table_catalog, table_schema, table_name, column[4], source)
         elif level == 'three':
-            insertBasicStats(server_name, table_catalog, table_schema, table_name, column[4])
-            updatePercentiles(server_name, table_catalog, table_schema, table_name, column[4])
+            insertBasicStats(server_name, table_catalog, table_schema, table_name, column[4], source)
+            updatePercentiles(server_name, table_catalog, table_schema, table_name, column[4], source)
             #updateKurtSkew(server_name, table_catalog, table_schema, table_name, column[4])
+        if column[4] in failed:
+            continue
+        markCompleted('stats', server_name, table_catalog, table_schema, table_name, column[4])
         
         if verbose:
             logger.info('{}.{}.{}.{}.{} updated into stats...'.format(server_name, table_catalog, table_schema, table_name, column[4]))
@@ -1273,18 +3212,315 @@ def insertOrUpdateStats(server_name, table_catalog, table_schema, table_name, ve
 
     return
 
+def insertOrUpdateProfile(server_name, table_catalog, table_schema, table_name, verbose = False, threshold = 5000, level = 'one', with_data_sample = False, n_samples = 10000, chunk_size = 50000, batch_size = None, progress = True):
+    """
+    Profiles a table, or a sample of it, in one scan and stores the results in `uniques`,
+    `data_values`, `dates` and `stats` at once. The rows are read in chunks of `chunk_size`
+    and the metrics are computed locally, so the table is read once instead of once per stage.
+    Dates are grouped by month and `level` works as in insertOrUpdateStats.
+    The watermarks of the table are forgotten with its data values and dates, the next
+    incremental run of fill_data_values or fill_dates starts from these rows.
+    """
+    if METADATA_ENGINE in ('mssqlserver', 'sqlite'):
+        sql_stats = """insert into {} (SERVER_NAME, TABLE_CATALOG, TABLE_SCHEMA, TABLE_NAME, COLUMN_NAME, AVG, STDEV, VAR, SUM, MAX, MIN, RANGE_, P01, P025, P05, P10, Q1, Q2, Q3, P90, P95, P975, P99, IQR, QUANTILE_SKETCH)
+                        values (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?);""".format(metadataTable('stats'))
+    elif METADATA_ENGINE in ('mysql', 'postgres'):
+        if METADATA_ENGINE == 'mysql':
+            range_column = '`RANGE`'
+        else:
+            range_column = 'RANGE_'
+        sql_stats = """insert into {} (SERVER_NAME, TABLE_CATALOG, TABLE_SCHEMA, TABLE_NAME, COLUMN_NAME, AVG, STDEV, VAR, SUM, MAX, MIN, {}, P01, P025, P05, P10, Q1, Q2, Q3, P90, P95, P975, P99, IQR, QUANTILE_SKETCH)
+                        values (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s);""".format(metadataTable('stats'), range_column)
+    parameter = '?' if METADATA_ENGINE in ('mssqlserver', 'sqlite') else '%s'
+    sql_uniques = """insert into {1} (SERVER_NAME, TABLE_CATALOG, TABLE_SCHEMA, TABLE_NAME, COLUMN_NAME, ORDINAL_POSITION, DATA_TYPE, DISTINCT_VALUES, NULL_VALUES)
+                    values ({0}, {0}, {0}, {0}, {0}, {0}, {0}, {0}, {0});""".format(parameter, metadataTable('uniques'))
+    sql_frequencies = """insert into {1} (SERVER_NAME, TABLE_CATALOG, TABLE_SCHEMA, TABLE_NAME, COLUMN_NAME, DATA_VALUE, FREQUENCY_NUMBER, FREQUENCY_PERCENTAGE)
+                    values ({0}, {0}, {0}, {0}, {0}, {0}, {0}, {0});"""
+    key = (server_name, table_catalog, table_schema, table_name)
+
+    table_columns = getTableMetadata(server_name, table_catalog, table_schema, table_name)['columns']
+    columns = [row for row in table_columns if row[2] not in BLOB_TYPES]
+    if len(columns) == 0:
+        return
+
+    profile = TableProfile([(column[0], column[2]) for column in columns], NUMERIC_TYPES, DATE_TYPES, threshold)
+    pbar = tqdm(desc = 'Rows', unit = ' rows', disable = not progress)
+    if SOURCE_ENGINE == 'files':
+        chunks = filesource.readChunks(getFilePath(table_schema, table_name), [column[0] for column in columns], chunk_size)
+        if with_data_sample:
+            rows = reservoirSample((row for rows in chunks for row in rows), n_samples)
+            recordSample('profile', server_name, table_catalog, table_schema, table_name, 'reservoir', SAMPLE_SEED, n_samples, len(rows))
+            chunks = (rows[i:i + chunk_size] for i in range(0, len(rows), chunk_size))
+        for rows in chunks:
+            pbar.update(profile.update(rows))
+        pbar.close()
+    else:
+        sql_select = ', '.join(quoteIdentifier(column[0]) for column in columns)
+        source = getTableReference(table_catalog, table_schema, table_name)
+        if with_data_sample:
+            source, sample_method, sample_rows = getSample('profile', server_name, table_catalog, table_schema, table_name, n_samples)
+        sql_scan = """SELECT {} FROM {};""".format(sql_select, source or getTableReference(table_catalog, table_schema, table_name))
+
+        conn_source = get_source_connection()
+        cursor_source = get_streaming_cursor(conn_source)
+        try:
+            cursor_source.execute(sql_scan)
+            if source is None:
+                rows = reservoirSample(iterRows(cursor_source, chunk_size), n_samples)
+                chunks = (rows[i:i + chunk_size] for i in range(0, len(rows), chunk_size))
+            else:
+                chunks = fetchInChunks(cursor_source, chunk_size)
+            for rows in chunks:
+                pbar.update(profile.update(rows))
+            pbar.close()
+        finally:
+            cursor_source.close()
+            conn_source.close()
+
+    uniques = []
+    data_values = []
+    dates = []
+    stats = []
+    for column, column_profile in zip(columns, profile.columns):
+        uniques.append(key + (column[0], column[1], column[2], column_profile.distinct_values(), column_profile.n_nulls))
+        frequencies = column_profile.value_frequencies()
+        if frequencies is not None and column_profile.distinct_values() < threshold:
+            data_values.extend(key + (column[0], dataValue(value), n, n / column_profile.n_rows) for value, n in frequencies)
+        if column_profile.dates:
+            months = column_profile.month_frequencies()
+            total = sum(n for _, n in months)
+            if 0 < len(months) < threshold:
+                dates.extend(key + (column[0], month, n, n / total) for month, n in months)
+        if column_profile.numeric:
+            values = column_profile.stats(percentiles = level in ('two', 'three'))
+            stats.append(key + (column[0],) + values + (None,) * (20 - len(values)))
+
+    conn_metadata = get_metadata_connection()
+    cursor_metadata = conn_metadata.cursor()
+    try:
+        for metadata_table in ('uniques', 'data_values', 'dates', 'stats'):
+            cursor_metadata.execute("""delete from {0} 
+                                    WHERE SERVER_NAME = {1}
+                                    AND TABLE_CATALOG = {1}
+                                    AND TABLE_SCHEMA = {1}
+                                    AND TABLE_NAME = {1};""".format(metadataTable(metadata_table), parameter), key)
+        # The watermarks go in the same transaction, they cover the rows just deleted
+        for column in table_columns:
+            for stage in ('data_values', 'dates'):
+                deleteWatermark(cursor_metadata, stage, server_name, table_catalog, table_schema, table_name, column[0])
+        insertManyRows(conn_metadata, cursor_metadata, sql_uniques, uniques, batch_size)
+        insertManyRows(conn_metadata, cursor_metadata, sql_frequencies.format(parameter, metadataTable('data_values')), data_values, batch_size)
+        insertManyRows(conn_metadata, cursor_metadata, sql_frequencies.format(parameter, metadataTable('dates')), dates, batch_size)
+        insertManyRows(conn_metadata, cursor_metadata, sql_stats, stats, batch_size)
+    finally:
+        invalidateMetadata(server_name, table_catalog, table_schema, table_name)
+        cursor_metadata.close()
+        conn_metadata.close()
+
+    if verbose:
+        logger.info('{}.{}.{}.{} profiled into uniques, data_values, dates and stats...'.format(server_name, table_catalog, table_schema, table_name))
+    return
+
+def insertOrUpdateFileStatistics(server_name, table_catalog, table_schema, table_name, verbose = False):
+    """
+    Stores the NULL values of each column in `uniques` and MIN, MAX and RANGE of the
+    numeric columns in `stats` from the row group statistics of a Parquet file,
+    without decoding its data. Columns without statistics and other files are skipped.
+    """
+    parameter = '?' if METADATA_ENGINE in ('mssqlserver', 'sqlite') else '%s'
+    sql_uniques = """insert into {1} (SERVER_NAME, TABLE_CATALOG, TABLE_SCHEMA, TABLE_NAME, COLUMN_NAME, ORDINAL_POSITION, DATA_TYPE, DISTINCT_VALUES, NULL_VALUES)
+                    values ({0}, {0}, {0}, {0}, {0}, {0}, {0}, {0}, {0});""".format(parameter, metadataTable('uniques'))
+    sql_stats = """insert into {2} (SERVER_NAME, TABLE_CATALOG, TABLE_SCHEMA, TABLE_NAME, COLUMN_NAME, MAX, MIN, {1})
+                    values ({0}, {0}, {0}, {0}, {0}, {0}, {0}, {0});""".format(parameter, '`RANGE`' if METADATA_ENGINE == 'mysql' else 'RANGE_', metadataTable('stats'))
+    key = (server_name, table_catalog, table_schema, table_name)
+
+    statistics = filesource.getParquetStatistics(getFilePath(table_schema, table_name))
+    if not statistics:
+        return
+
+    uniques = []
+    stats = []
+    for column_name, ordinal_position, data_type in getTableMetadata(server_name, table_catalog, table_schema, table_name)['columns']:
+        if column_name not in statistics:
+            continue
+        minimum, maximum, null_values = statistics[column_name]
+        uniques.append(key + (column_name, ordinal_position, data_type, None, null_values))
+        if data_type in NUMERIC_TYPES:
+            stats.append(key + (column_name, float(maximum), float(minimum), float(maximum) - float(minimum)))
+
+    conn_metadata = get_metadata_connection()
+    cursor_metadata = conn_metadata.cursor()
+    try:
+        for metadata_table in ('uniques', 'stats'):
+            cursor_metadata.execute("""delete from {0} 
+                                    WHERE SERVER_NAME = {1}
+                                    AND TABLE_CATALOG = {1}
+                                    AND TABLE_SCHEMA = {1}
+                                    AND TABLE_NAME = {1};""".format(metadataTable(metadata_table), parameter), key)
+        insertManyRows(conn_metadata, cursor_metadata, sql_uniques, uniques)
+        insertManyRows(conn_metadata, cursor_metadata, sql_stats, stats)
+    finally:
+        invalidateMetadata(server_name, table_catalog, table_schema, table_name)
+        cursor_metadata.close()
+        conn_metadata.close()
+
+    if verbose:
+        logger.info('{}.{}.{}.{} statistics stored from the Parquet footer...'.format(server_name, table_catalog, table_schema, table_name))
+    return
+
+def insertOrUpdateCatalogStatistics(server_name, table_catalog, table_schema, table_name, verbose = False, threshold = 5000, max_age = 30, max_modified = 0.2):
+    """
+    Fills `uniques`, `data_values` and `stats` of a table from the statistics its engine
+    keeps (getCatalogStatistics) without scanning it, every value flagged as approximate:
+    - uniques: the estimated distinct and NULL values, the distinct values of a unique
+      column are its rows that aren't NULL. What the engine doesn't know keeps the value
+      of previous runs, and columns without an estimate of their distinct values keep
+      their row.
+    - data_values: the values with a known frequency of the columns with less than
+      `threshold` distinct values, and the NULLs.
+    - stats: MIN, MAX, RANGE, the percentiles and a t-digest of the histogram of the
+      numeric columns, AVG, STDEV, VAR and SUM are left empty.
+    Columns whose statistics are older than `max_age` days or have more than a `max_modified`
+    fraction of the rows modified since are skipped, as the columns without statistics.
+    Returns the number of columns filled.
+    """
+    key = (server_name, table_catalog, table_schema, table_name)
+    stats_columns = METADATA_KEYS['stats'] + ('AVG', 'STDEV', 'VAR', 'SUM', 'MAX', 'MIN', '`RANGE`' if METADATA_ENGINE == 'mysql' else 'RANGE_'
+                                              , 'P01', 'P025', 'P05', 'P10', 'Q1', 'Q2', 'Q3', 'P90', 'P95', 'P975', 'P99', 'IQR', 'QUANTILE_SKETCH')
+    parameter = '?' if METADATA_ENGINE in ('mssqlserver', 'sqlite') else '%s'
+    sql_data_values = """insert into {1} (SERVER_NAME, TABLE_CATALOG, TABLE_SCHEMA, TABLE_NAME, COLUMN_NAME, DATA_VALUE, FREQUENCY_NUMBER, FREQUENCY_PERCENTAGE, APPROXIMATE, FREQUENCY_ERROR)
+                    values ({0}, {0}, {0}, {0}, {0}, {0}, {0}, {0}, {0}, {0});""".format(parameter, metadataTable('data_values'))
+    sql_delete = """delete from {1}
+                    WHERE SERVER_NAME = {0}
+                    AND TABLE_CATALOG = {0}
+                    AND TABLE_SCHEMA = {0}
+                    AND TABLE_NAME = {0}
+                    AND COLUMN_NAME = {0};""".format(parameter, metadataTable('data_values'))
+
+    def getBucketsStats(buckets, n_rows):
+        """
+        MAX, MIN, RANGE, percentiles, IQR and t-digest of a numeric histogram, the rows of
+        each bucket are taken at its middle. None for values that aren't numbers.
+        """
+        digest = TDigest()
+        minimum = maximum = None
+        for lower, upper, fraction in buckets:
+            try:
+                lower, upper = float(lower), float(upper)
+            except (TypeError, ValueError):
+                return None
+            minimum = lower if minimum is None else min(minimum, lower)
+            maximum = upper if maximum is None else max(maximum, upper)
+            if fraction > 0:
+                digest.add((lower + upper) / 2, fraction * n_rows)
+        if digest.count == 0:
+            return None
+        percentiles = digest.percentiles(PERCENTILES)
+        return (maximum, minimum, maximum - minimum) + tuple(percentiles) + (percentiles[6] - percentiles[4], digest.to_json())
+
+    conn_source = get_source_connection()
+    cursor_source = get_db_cursor(conn_source)
+    try:
+        statistics = getCatalogStatistics(cursor_source, table_catalog, table_schema, table_name)
+    finally:
+        cursor_source.close()
+        conn_source.close()
+
+    metadata = getTableMetadata(server_name, table_catalog, table_schema, table_name)
+    uniques = []
+    data_values = []
+    data_values_columns = []
+    stats = []
+    stale = 0
+    filled = 0
+    for column_name, ordinal_position, data_type in metadata['columns']:
+        column = statistics.get(column_name)
+        if column is None:
+            continue
+        if not isFreshStatistics(column, max_age, max_modified):
+            stale += 1
+            continue
+        filled += 1
+        n_rows = metadata['n_rows'] if metadata['n_rows'] is not None else column['n_rows']
+        distinct = None if column['distinct'] is None else int(round(column['distinct']))
+        nulls = None if column['null_fraction'] is None else int(round(column['null_fraction'] * n_rows))
+        is_nullable, is_primary_key, is_unique = metadata['constraints'].get(column_name, (None, None, None))
+        if nulls is None:
+            nulls = 0 if is_nullable == 0 else metadata['uniques'].get(column_name, (None, None))[1]
+        if is_unique and nulls is not None and n_rows is not None:
+            distinct = n_rows - nulls
+        if distinct is not None or column_name not in metadata['uniques']:
+            uniques.append(key + (column_name, ordinal_position, data_type, distinct, nulls, 1, None))
+        frequencies = [(lower, fraction) for lower, upper, fraction in column['buckets'] if lower == upper]
+        # Columns without known frequencies keep the data values of previous runs
+        if distinct is not None and distinct < threshold and data_type not in BLOB_TYPES and frequencies:
+            data_values_columns.append(key + (column_name,))
+            for value, fraction in frequencies:
+                data_values.append(key + (column_name, dataValue(value), int(round(fraction * n_rows)), fraction, 1, None))
+            if nulls:
+                data_values.append(key + (column_name, None, nulls, column['null_fraction'], 1, None))
+        if data_type in NUMERIC_TYPES and n_rows:
+            values = getBucketsStats(column['buckets'], n_rows)
+            if values is not None:
+                stats.append(key + (column_name, None, None, None, None) + values)
+
+    conn_metadata = get_metadata_connection()
+    cursor_metadata = conn_metadata.cursor()
+    try:
+        upsertRows(conn_metadata, cursor_metadata, 'uniques', UNIQUES_COLUMNS, uniques)
+        for row in data_values_columns:
+            cursor_metadata.execute(sql_delete, row)
+            deleteWatermark(cursor_metadata, 'data_values', *row)
+        insertManyRows(conn_metadata, cursor_metadata, sql_data_values, data_values)
+        upsertRows(conn_metadata, cursor_metadata, 'stats', stats_columns, stats)
+    finally:
+        invalidateMetadata(server_name, table_catalog, table_schema, table_name)
+        cursor_metadata.close()
+        conn_metadata.close()
+
+    if verbose:
+        logger.info('{}.{}.{}.{} {} columns filled from the catalog statistics, {} stale...'.format(server_name, table_catalog, table_schema, table_name, filled, stale))
+    return filled
+
+def getQuantile(server_name, table_catalog, table_schema, table_name, column_name, q):
+    """
+    Any quantile `q` (0 to 1) of a numeric column, answered from the t-digest stored in
+    `stats` without querying the source. Returns None if the column has no digest.
+    """
+    if METADATA_ENGINE in ('mssqlserver', 'sqlite'):
+        sql = """select QUANTILE_SKETCH from stats
+                WHERE SERVER_NAME = ?
+                AND TABLE_CATALOG = ?
+                AND TABLE_SCHEMA = ?
+                AND TABLE_NAME = ?
+                AND COLUMN_NAME = ?;"""
+    elif METADATA_ENGINE in ('mysql', 'postgres'):
+        sql = """select QUANTILE_SKETCH from stats
+                WHERE SERVER_NAME = %s
+                AND TABLE_CATALOG = %s
+                AND TABLE_SCHEMA = %s
+                AND TABLE_NAME = %s
+                AND COLUMN_NAME = %s;"""
+    conn_metadata = get_metadata_connection()
+    cursor_metadata = conn_metadata.cursor()
+    cursor_metadata.execute(sql, (server_name, table_catalog, table_schema, table_name, column_name))
+    row = cursor_metadata.fetchone()
+
+    cursor_metadata.close()
+    conn_metadata.close()
+    if row is None or row[0] is None:
+        return None
+    return TDigest.from_json(row[0]).quantile(q)
+
 def getTablesFromServer(server_name, table_catalog, table_schema, n_rows_gt = 0):
     """
     Given a server name, it will returns SERVER_NAME, TABLE_CATALOG, TABLE_SCHEMA, TABLE_NAME, and N_ROWS.
     This list can be used to go over each table and process it.
     """
-    if METADATA_ENGINE == 'mssqlserver':
-        conn_metadata = get_db_connection(metadata_connection_params)
-    elif METADATA_ENGINE == 'mysql':
-        conn_metadata = get_mysql_connection('metadata')
+    conn_metadata = get_metadata_connection()
     cursor_metadata = conn_metadata.cursor()
 
-    if METADATA_ENGINE == 'mssqlserver':
+    if METADATA_ENGINE in ('mssqlserver', 'sqlite'):
         sql = """select distinct SERVER_NAME 
                     , TABLE_CATALOG 
                     , TABLE_SCHEMA 
@@ -1296,7 +3532,7 @@ def getTablesFromServer(server_name, table_catalog, table_schema, n_rows_gt = 0)
                     AND TABLE_SCHEMA = ?
                         and N_ROWS > {}
                     order by N_ROWS;""".format(n_rows_gt)
-    elif METADATA_ENGINE == 'mysql':
+    elif METADATA_ENGINE in ('mysql', 'postgres'):
         sql = """select distinct SERVER_NAME 
                     , TABLE_CATALOG 
                     , TABLE_SCHEMA 
@@ -1316,16 +3552,161 @@ def getTablesFromServer(server_name, table_catalog, table_schema, n_rows_gt = 0)
 
     return rows
 
+def getServerSlots(kind, limit):
+    """
+    Returns the semaphore limiting the concurrent jobs on the source or metadata server.
+    It is shared by every stage running against the same server.
+    """
+    if kind == 'source':
+        key = (kind, SOURCE_ENGINE, repr(source_connection_params), limit)
+    else:
+        key = (kind, METADATA_ENGINE, repr(metadata_connection_params), limit)
+    with pools_lock:
+        if key not in server_slots:
+            server_slots[key] = threading.BoundedSemaphore(limit)
+        return server_slots[key]
+
+def processTables(stage, function, tables, n_workers = 1, max_source_jobs = None, max_metadata_jobs = None, resume = False, skip_unchanged = False, **kwargs):
+    """
+    Runs `function(server_name, table_catalog, table_schema, table_name, **kwargs)` for each table
+    returned by getTablesFromServer using `n_workers` threads.
+    Tables are processed longest job first (by N_ROWS) to minimise the total time, and
+    `max_source_jobs` and `max_metadata_jobs` limit how many tables are processed at the
+    same time against the source and metadata servers.
+    Each finished table is recorded in the `ledger` under `stage`, with `resume` the tables
+    already finished are skipped, and the columns already finished too when `function`
+    takes `resume`. With `skip_unchanged` the fingerprints of the tables are refreshed
+    and the tables whose fingerprint hasn't changed since `stage` last profiled them are skipped.
+    `function` gets `progress` when it takes it, its progress bars are hidden when
+    several tables are processed at the same time.
+    When `function` takes `failed` it appends the columns it couldn't profile, the table
+    then fails too: it isn't recorded as finished and its fingerprint isn't stored, so
+    `resume` and `skip_unchanged` process it again.
+    Returns the list of tables that failed.
+    """
+    parameters = inspect.signature(function).parameters
+    if 'resume' in parameters:
+        kwargs['resume'] = resume
+    if 'progress' in parameters:
+        kwargs['progress'] = n_workers == 1
+
+    tables = sorted(tables, key = lambda row: row[4] or 0, reverse = True)
+    if resume and tables:
+        completed = getCompletedUnits(stage, tables[0][0], tables[0][1], tables[0][2])
+        tables = [row for row in tables if (row[3], '') not in completed]
+    if skip_unchanged and tables:
+        refreshFingerprints(tables[0][0], tables[0][1], tables[0][2], tables)
+        unchanged = getUnchangedTables(stage, tables[0][0], tables[0][1], tables[0][2])
+        tables = [row for row in tables if row[3] not in unchanged]
+    source_slots = getServerSlots('source', max_source_jobs or n_workers)
+    metadata_slots = getServerSlots('metadata', max_metadata_jobs or n_workers)
+
+    def processTable(row):
+        failed_columns = []
+        table_kwargs = dict(kwargs, failed = failed_columns) if 'failed' in parameters else kwargs
+        with source_slots, metadata_slots:
+            if MATERIALISE_SAMPLES:
+                with pinnedSourceConnection():
+                    function(row[0], row[1], row[2], row[3], **table_kwargs)
+            else:
+                function(row[0], row[1], row[2], row[3], **table_kwargs)
+        if failed_columns:
+            raise RuntimeError('columns not profiled: {}'.format(', '.join(failed_columns)))
+        markCompleted(stage, row[0], row[1], row[2], row[3])
+        storeProfiledFingerprint(stage, row[0], row[1], row[2], row[3])
+        return row
+
+    # Each worker holds up to one source and two metadata connections at the same time,
+    # the pools are sized before any work is submitted
+    ensurePoolSize(2 * n_workers)
+
+    failed = []
+    total_rows = sum(row[4] or 0 for row in tables)
+    pbar = tqdm(total = len(tables), desc = stage)
+    try:
+        with ThreadPoolExecutor(max_workers = n_workers) as executor:
+            futures = {executor.submit(processTable, row): row for row in tables}
+            processed_rows = 0
+            for future in as_completed(futures):
+                row = futures[future]
+                try:
+                    future.result()
+                except Exception as e:
+                    print('Problems with: {}.{} {}'.format(row[2], row[3], e))
+                    failed.append(row)
+                processed_rows += row[4] or 0
+                pbar.set_postfix_str('{} {:,}/{:,} records'.format(row[3], processed_rows, total_rows))
+                pbar.update(1)
+    finally:
+        pbar.close()
+    return failed
+
+def fill_file_columns(server_name, table_catalog, table_schema):
+    """
+    fill_columns for the 'files' source engine, each file of the schema directory is a table.
+    """
+    conn_metadata = get_metadata_connection()
+    cursor_metadata = conn_metadata.cursor()
+
+    pbar = tqdm(filesource.listFiles(getFilesDirectory(table_schema)), desc = 'Files')
+    for table_name, path in pbar:
+        columns = filesource.getFileColumns(path)
+        upsertRows(conn_metadata, cursor_metadata, 'columns', COLUMNS_COLUMNS, ((server_name, table_catalog, table_schema, table_name) + tuple(column) for column in columns))
+    invalidateMetadata(server_name, table_catalog, table_schema)
+
+    cursor_metadata.close()
+    conn_metadata.close()
+    return
+
+def fill_file_tables(server_name, table_catalog, table_schema):
+    """
+    fill_tables for the 'files' source engine. Parquet files have their number of rows in
+    their footer, CSV files have their lines counted. The fingerprint is the number of
+    rows and the modification time of the file.
+    """
+    if METADATA_ENGINE in ('mssqlserver', 'sqlite'):
+        sql_delete = """delete from tables
+                WHERE SERVER_NAME = ?
+                AND TABLE_CATALOG = ?
+                AND TABLE_SCHEMA = ?;"""
+    elif METADATA_ENGINE in ('mysql', 'postgres'):
+        sql_delete = """delete from tables
+                WHERE SERVER_NAME = %s
+                AND TABLE_CATALOG = %s
+                AND TABLE_SCHEMA = %s;"""
+    rows = []
+    row_counts = {}
+    pbar = tqdm(filesource.listFiles(getFilesDirectory(table_schema)), desc = 'Files')
+    for table_name, path in pbar:
+        row_counts[table_name] = filesource.countRows(path)
+        rows.append((server_name, table_catalog, table_schema, table_name, len(filesource.getFileColumns(path)), row_counts[table_name], 0))
+
+    conn_metadata = get_metadata_connection()
+    cursor_metadata = conn_metadata.cursor()
+    # The delete and the upserts are committed together by upsertRows
+    cursor_metadata.execute(sql_delete, (server_name, table_catalog, table_schema))
+    upsertRows(conn_metadata, cursor_metadata, 'tables', TABLES_COLUMNS[:7], rows)
+    invalidateMetadata(server_name, table_catalog, table_schema)
+    updateFingerprints(None, conn_metadata, cursor_metadata, server_name, table_catalog, table_schema, row_counts)
+
+    cursor_metadata.close()
+    conn_metadata.close()
+    return
+
 def fill_columns(server_name, table_catalog, table_schema):
-    if SOURCE_ENGINE == 'mssqlserver':
-        conn_source = get_db_connection(source_connection_params)
-    elif SOURCE_ENGINE == 'mysql':
-        conn_source = get_mysql_connection('source')
-    cursor_source = get_db_cursor(conn_source)
+    if SOURCE_ENGINE == 'files':
+        return fill_file_columns(server_name, table_catalog, table_schema)
+    conn_source = get_source_connection()
+    cursor_source = get_streaming_cursor(conn_source)
 
     print('\n[', colored('OK', 'green'), ']', """\tCollecting data about the:
     \tserver, catalog, database, table names, and column names. 
     \tEach row is a column of a table of the database.\n""")
+    # Keys are read first, the columns are streamed afterwards on the same connection
+    cursor_constraints = get_db_cursor(conn_source)
+    constraints = getSourceConstraints(cursor_constraints, table_catalog, table_schema)
+    cursor_constraints.close()
+
     if SOURCE_ENGINE == 'mssqlserver':
         sql = """SELECT ? AS SERVER_NAME
                 , C.TABLE_CATALOG
@@ -1334,6 +3715,7 @@ def fill_columns(server_name, table_catalog, table_schema):
                 , C.COLUMN_NAME
                 , C.ORDINAL_POSITION
                 , C.DATA_TYPE
+                , CASE WHEN C.IS_NULLABLE = 'YES' THEN 1 ELSE 0 END AS IS_NULLABLE
             FROM INFORMATION_SCHEMA.COLUMNS AS C INNER JOIN INFORMATION_SCHEMA.TABLES AS T
             ON C.TABLE_CATALOG = T.TABLE_CATALOG
             AND C.TABLE_SCHEMA = T.TABLE_SCHEMA
@@ -1341,7 +3723,7 @@ def fill_columns(server_name, table_catalog, table_schema):
             AND T.TABLE_TYPE = 'BASE TABLE'
             AND T.TABLE_CATALOG = ?
             AND T.TABLE_SCHEMA = ?;"""
-    elif SOURCE_ENGINE == 'mysql':
+    elif SOURCE_ENGINE in ('mysql', 'postgres'):
         sql = """SELECT %s AS SERVER_NAME
                 , C.TABLE_CATALOG
                 , C.TABLE_SCHEMA
@@ -1349,6 +3731,7 @@ def fill_columns(server_name, table_catalog, table_schema):
                 , C.COLUMN_NAME
                 , C.ORDINAL_POSITION
                 , C.DATA_TYPE
+                , CASE WHEN C.IS_NULLABLE = 'YES' THEN 1 ELSE 0 END AS IS_NULLABLE
             FROM INFORMATION_SCHEMA.COLUMNS AS C INNER JOIN INFORMATION_SCHEMA.TABLES AS T
             ON C.TABLE_CATALOG = T.TABLE_CATALOG
             AND C.TABLE_SCHEMA = T.TABLE_SCHEMA
@@ -1356,87 +3739,373 @@ def fill_columns(server_name, table_catalog, table_schema):
             AND T.TABLE_TYPE = 'BASE TABLE'
             AND T.TABLE_CATALOG = %s
             AND T.TABLE_SCHEMA = %s;"""
-
+    elif SOURCE_ENGINE == 'sqlite':
+        # TEXT is the string type of SQLite, not a large object, it's profiled as varchar
+        sql = """WITH S AS (SELECT ? AS SERVER_NAME, ? AS TABLE_CATALOG, ? AS TABLE_SCHEMA)
+            SELECT S.SERVER_NAME
+                , S.TABLE_CATALOG
+                , S.TABLE_SCHEMA
+                , M.name AS TABLE_NAME
+                , C.name AS COLUMN_NAME
+                , C.cid + 1 AS ORDINAL_POSITION
+                , {1} AS DATA_TYPE
+                , CASE WHEN C."notnull" = 1 THEN 0 ELSE 1 END AS IS_NULLABLE
+            FROM S CROSS JOIN {0}.sqlite_master AS M CROSS JOIN pragma_table_info(M.name, S.TABLE_SCHEMA) AS C
+            WHERE M.type = 'table'
+            AND M.name NOT LIKE 'sqlite~_%' ESCAPE '~';""".format(quoteIdentifier(table_schema), SQLITE_DATA_TYPE)
 
     cursor_source.execute(sql, (server_name, table_catalog, table_schema))
-    rows = cursor_source.fetchall()
-
-    cursor_source.close()
-    conn_source.close()
 
-    conn_metadata = get_mysql_connection('metadata')
-    #conn_metadata = get_db_connection(metadata_connection_params)
+    conn_metadata = get_metadata_connection()
     cursor_metadata = conn_metadata.cursor()
 
-    for row in tqdm(rows, desc = 'Columns'):
-        server_name, table_catalog, table_schema, table_name, column_name, ordinal_position, data_type = row
-        insertOrUpdateColumns(conn_metadata, cursor_metadata, server_name, table_catalog, table_schema, table_name, column_name, ordinal_position, data_type)
+    pbar = tqdm(desc = 'Columns', unit = ' columns')
+    for rows in fetchInChunks(cursor_source):
+        # Each chunk of columns is inserted or updated in one transaction
+        pbar.update(upsertRows(conn_metadata, cursor_metadata, 'columns', COLUMNS_COLUMNS + CONSTRAINTS_COLUMNS, (tuple(row) + constraints.get((row[3], row[4]), (0, 0)) for row in rows)))
+    pbar.close()
+    invalidateMetadata(server_name, table_catalog, table_schema)
     
+    cursor_source.close()
+    conn_source.close()
+
     cursor_metadata.close()
     conn_metadata.close()
 
     return
 
-def fill_tables(server_name, table_catalog, table_schema):
+def fill_tables(server_name, table_catalog, table_schema, row_count_mode = 'exact', exact_below = None, fingerprint_checksum = False):
+    """
+    Number of columns of every table of the schema with a single catalog query,
+    stored at once in `tables`, followed by the number of rows of each table.
+
+    Two modes to get the number of rows:
+    - exact: `select count(*)` on each table.
+    - estimated: row counts from the engine statistics, without scanning the tables.
+      Tables with less than `exact_below` estimated rows are counted exactly, and so are
+      the tables without an estimate or estimated empty.
+
+    It also stores the fingerprint of each table used to skip unchanged tables,
+    `fingerprint_checksum` adds a checksum of the table data to it.
+    """
     print('\n[', colored('OK', 'green'), ']', """\tCollecting number of rows and columns of each table. 
     \tEach row is a table of the database.\n""")
+    if SOURCE_ENGINE == 'files':
+        return fill_file_tables(server_name, table_catalog, table_schema)
+
+    conn_source = get_source_connection()
+    cursor_source = get_db_cursor(conn_source)
+
+    if SOURCE_ENGINE == 'mssqlserver':
+        sql = """SELECT ? AS SERVER_NAME
+                , C.TABLE_CATALOG
+                , C.TABLE_SCHEMA
+                , C.TABLE_NAME
+                , COUNT(*) AS N_COLUMNS
+            FROM INFORMATION_SCHEMA.COLUMNS AS C INNER JOIN INFORMATION_SCHEMA.TABLES AS T
+            ON C.TABLE_CATALOG = T.TABLE_CATALOG
+            AND C.TABLE_SCHEMA = T.TABLE_SCHEMA
+            AND C.TABLE_NAME = T.TABLE_NAME
+            AND T.TABLE_TYPE = 'BASE TABLE'
+            AND T.TABLE_CATALOG = ?
+            AND T.TABLE_SCHEMA = ?
+            GROUP BY C.TABLE_CATALOG
+                , C.TABLE_SCHEMA
+                , C.TABLE_NAME;"""
+    elif SOURCE_ENGINE in ('mysql', 'postgres'):
+        sql = """SELECT %s AS SERVER_NAME
+                , C.TABLE_CATALOG
+                , C.TABLE_SCHEMA
+                , C.TABLE_NAME
+                , COUNT(*) AS N_COLUMNS
+            FROM INFORMATION_SCHEMA.COLUMNS AS C INNER JOIN INFORMATION_SCHEMA.TABLES AS T
+            ON C.TABLE_CATALOG = T.TABLE_CATALOG
+            AND C.TABLE_SCHEMA = T.TABLE_SCHEMA
+            AND C.TABLE_NAME = T.TABLE_NAME
+            AND T.TABLE_TYPE = 'BASE TABLE'
+            AND T.TABLE_CATALOG = %s
+            AND T.TABLE_SCHEMA = %s
+            GROUP BY C.TABLE_CATALOG
+                , C.TABLE_SCHEMA
+                , C.TABLE_NAME;"""
+    elif SOURCE_ENGINE == 'sqlite':
+        sql = """WITH S AS (SELECT ? AS SERVER_NAME, ? AS TABLE_CATALOG, ? AS TABLE_SCHEMA)
+            SELECT S.SERVER_NAME
+                , S.TABLE_CATALOG
+                , S.TABLE_SCHEMA
+                , M.name AS TABLE_NAME
+                , COUNT(*) AS N_COLUMNS
+            FROM S CROSS JOIN {}.sqlite_master AS M CROSS JOIN pragma_table_info(M.name, S.TABLE_SCHEMA) AS C
+            WHERE M.type = 'table'
+            AND M.name NOT LIKE 'sqlite~_%' ESCAPE '~'
+            GROUP BY M.name;""".format(quoteIdentifier(table_schema))
+    cursor_source.execute(sql, (server_name, table_catalog, table_schema))
+    rows = cursor_source.fetchall()
+
+    conn_metadata = get_metadata_connection()
+    cursor_metadata = conn_metadata.cursor()
+
+    if METADATA_ENGINE in ('mssqlserver', 'sqlite'):
+        sql_delete = """delete from tables
+                WHERE SERVER_NAME = ?
+                AND TABLE_CATALOG = ?
+                AND TABLE_SCHEMA = ?;"""
+    elif METADATA_ENGINE in ('mysql', 'postgres'):
+        sql_delete = """delete from tables
+                WHERE SERVER_NAME = %s
+                AND TABLE_CATALOG = %s
+                AND TABLE_SCHEMA = %s;"""
+    # The delete and the upserts are committed together by upsertRows
+    cursor_metadata.execute(sql_delete, (server_name, table_catalog, table_schema))
+    upsertRows(conn_metadata, cursor_metadata, 'tables', TABLES_COLUMNS[:6], (tuple(row) + (None,) for row in rows))
+    invalidateMetadata(server_name, table_catalog, table_schema)
 
-    pbar = tqdm(getColumnsFromServer(server_name, table_catalog, table_schema))
+    row_counts = {}
+    if row_count_mode == 'estimated':
+        tables = set(row[3] for row in rows)
+        estimates = getEstimatedNumberOfRows(cursor_source, table_catalog, table_schema)
+        # Unknown or empty estimates are counted, unanalysed tables often report 0 rows
+        # and would be left out of every stage by getTablesFromServer
+        estimates = {table_name: n_rows for table_name, n_rows in estimates.items() if table_name in tables and n_rows}
+        updateEstimatedNumberOfRows(conn_metadata, cursor_metadata, server_name, table_catalog, table_schema, estimates)
+        row_counts.update(estimates)
+        if exact_below is None:
+            rows = [row for row in rows if row[3] not in estimates]
+        else:
+            rows = [row for row in rows if row[3] not in estimates or estimates[row[3]] < exact_below]
+
+    pbar = tqdm(rows)
     for row in pbar:
         pbar.set_description('Table {}'.format(row[3]))
-        insertOrUpdateTables(row[0],row[1],row[2],row[3], verbose = False)
-    
+        row_counts[row[3]] = updateTableNumberOfRows(cursor_source, conn_metadata, cursor_metadata, row[0], row[1], row[2], row[3])
+
+    updateFingerprints(cursor_source, conn_metadata, cursor_metadata, server_name, table_catalog, table_schema, row_counts, fingerprint_checksum)
+
+    cursor_source.close()
+    conn_source.close()
+
+    cursor_metadata.close()
+    conn_metadata.close()
     return
 
-def fill_uniques(server_name, table_catalog, table_schema, n_rows_gt = 0):
+def fill_uniques(server_name, table_catalog, table_schema, n_rows_gt = 0, single_scan = True, columns_per_query = 100, approximate_above = None, hll_precision = 14, n_workers = 1, max_source_jobs = None, max_metadata_jobs = None, resume = False, skip_unchanged = False):
     print('\n[', colored('OK', 'green'), ']', """\tCollecting the number of NULL values and 
     \tthe number of unique data values. 
     \tEach row represents a column of a table.\n""")
     
-    pbar = tqdm(getTablesFromServer(server_name, table_catalog, table_schema, n_rows_gt))
-    for row in pbar:
-        pbar.set_description('Table {} {:,} records'.format(row[3], row[4]))
-        insertOrUpdateUniques(row[0],row[1],row[2],row[3], verbose = False)
+    tables = getTablesFromServer(server_name, table_catalog, table_schema, n_rows_gt)
+    processTables('uniques', insertOrUpdateUniques, tables, n_workers, max_source_jobs, max_metadata_jobs, resume, skip_unchanged, verbose = False, single_scan = single_scan, columns_per_query = columns_per_query, approximate_above = approximate_above, hll_precision = hll_precision)
     return
 
-def fill_data_values(server_name, table_catalog, table_schema, n_rows_gt = 0, with_data_sample = False, n_samples = 10000):
+def fill_data_values(server_name, table_catalog, table_schema, n_rows_gt = 0, with_data_sample = False, n_samples = 10000, batch_size = None, heavy_hitters = 0, heavy_hitters_capacity = None, n_workers = 1, max_source_jobs = None, max_metadata_jobs = None, resume = False, skip_unchanged = False, incremental = False, watermark_columns = None):
     print('\n[', colored('OK', 'green'), ']', """\tCollecting the frequency count of each data 
     \tvalue of each columns up to a threshould of 5,000 
     \tdistinct values by default.\n""")
     
-    pbar = tqdm(getTablesFromServer(server_name, table_catalog, table_schema, n_rows_gt))
-    for row in pbar:
-        pbar.set_description('Table {} {:,} records'.format(row[3], row[4]))
-        insertOrUpdateDataValues(row[0],row[1],row[2],row[3], verbose = False, with_data_sample=with_data_sample, n_samples=n_samples)
+    tables = getTablesFromServer(server_name, table_catalog, table_schema, n_rows_gt)
+    processTables('data_values', insertOrUpdateDataValues, tables, n_workers, max_source_jobs, max_metadata_jobs, resume, skip_unchanged, verbose = False, with_data_sample=with_data_sample, n_samples=n_samples, batch_size=batch_size, incremental=incremental, watermark_columns=watermark_columns, heavy_hitters=heavy_hitters, heavy_hitters_capacity=heavy_hitters_capacity)
     return
 
-def fill_dates(server_name, table_catalog, table_schema, n_rows_gt = 0):
+def fill_dates(server_name, table_catalog, table_schema, n_rows_gt = 0, batch_size = None, with_data_sample = False, n_samples = 10000, n_workers = 1, max_source_jobs = None, max_metadata_jobs = None, resume = False, skip_unchanged = False, incremental = False, watermark_columns = None):
     print('\n[', colored('OK', 'green'), ']', """\tCollecting monthly summary of columns of types 
     \t'datetime', 'timestamp', or 'date'\n""")
     
-    pbar = tqdm(getTablesFromServer(server_name, table_catalog, table_schema, n_rows_gt))
-    for row in pbar:
-        pbar.set_description('Table {} {:,} records'.format(row[3], row[4]))
-        insertOrUpdateDates(row[0],row[1],row[2],row[3], verbose = False)
+    tables = getTablesFromServer(server_name, table_catalog, table_schema, n_rows_gt)
+    processTables('dates', insertOrUpdateDates, tables, n_workers, max_source_jobs, max_metadata_jobs, resume, skip_unchanged, verbose = False, batch_size=batch_size, incremental=incremental, watermark_columns=watermark_columns, with_data_sample=with_data_sample, n_samples=n_samples)
     return
 
-def fill_stats(server_name, table_catalog, table_schema, n_rows_gt = 0, with_data_sample = False):
+def fill_stats(server_name, table_catalog, table_schema, n_rows_gt = 0, with_data_sample = False, n_samples = 10000, n_workers = 1, max_source_jobs = None, max_metadata_jobs = None, resume = False, skip_unchanged = False):
     print('\n[', colored('OK', 'green'), ']', """\tCollecting Statistics from the numeric variables.\n""")
     
-    pbar = tqdm(getTablesFromServer(server_name, table_catalog, table_schema, n_rows_gt))
-    for row in pbar:
-        pbar.set_description('Table {} {:,} records'.format(row[3], row[4]))
-        insertOrUpdateStats(row[0],row[1],row[2],row[3], verbose = False, level = 'two')
+    tables = getTablesFromServer(server_name, table_catalog, table_schema, n_rows_gt)
+    processTables('stats', insertOrUpdateStats, tables, n_workers, max_source_jobs, max_metadata_jobs, resume, skip_unchanged, verbose = False, level = 'two', with_data_sample = with_data_sample, n_samples = n_samples)
+    return
+
+def fill_profiles(server_name, table_catalog, table_schema, n_rows_gt = 0, threshold = 5000, level = 'one', with_data_sample = False, n_samples = 10000, chunk_size = 50000, batch_size = None, n_workers = 1, max_source_jobs = None, max_metadata_jobs = None, resume = False, skip_unchanged = False):
+    print('\n[', colored('OK', 'green'), ']', """\tProfiling each table in one scan: distinct values, 
+    \tfrequencies, monthly dates and statistics.\n""")
+
+    tables = getTablesFromServer(server_name, table_catalog, table_schema, n_rows_gt)
+    processTables('profile', insertOrUpdateProfile, tables, n_workers, max_source_jobs, max_metadata_jobs, resume, skip_unchanged, verbose = False, threshold = threshold, level = level, with_data_sample = with_data_sample, n_samples = n_samples, chunk_size = chunk_size, batch_size = batch_size)
+    return
+
+def fill_file_statistics(server_name, table_catalog, table_schema, n_rows_gt = 0, n_workers = 1, max_source_jobs = None, max_metadata_jobs = None, resume = False, skip_unchanged = False):
+    print('\n[', colored('OK', 'green'), ']', """\tReading NULL values, minimums and maximums 
+    \tfrom the statistics of the Parquet files.\n""")
+
+    tables = getTablesFromServer(server_name, table_catalog, table_schema, n_rows_gt)
+    processTables('file_statistics', insertOrUpdateFileStatistics, tables, n_workers, max_source_jobs, max_metadata_jobs, resume, skip_unchanged, verbose = False)
     return
 
-def describe_server(server_name, table_catalog, table_schema):
+def fill_catalog_statistics(server_name, table_catalog, table_schema, n_rows_gt = 0, threshold = 5000, max_age = 30, max_modified = 0.2, n_workers = 1, max_source_jobs = None, max_metadata_jobs = None, resume = False, skip_unchanged = False):
+    print('\n[', colored('OK', 'green'), ']', """\tReading distinct values, frequencies and histograms 
+    \tfrom the statistics kept by the source engine.\n""")
+
+    tables = getTablesFromServer(server_name, table_catalog, table_schema, n_rows_gt)
+    processTables('catalog_statistics', insertOrUpdateCatalogStatistics, tables, n_workers, max_source_jobs, max_metadata_jobs, resume, skip_unchanged, verbose = False, threshold = threshold, max_age = max_age, max_modified = max_modified)
+    return
+
+def compactMetadata(server_name = None, table_catalog = None, table_schema = None):
+    """
+    Moves the staged rows of the normalized layout to the norm_* tables in one transaction:
+    missing tables, columns and values get their ids and the staged rows of each column
+    replace its previous rows. Columns with a watermark stay staged, their next incremental
+    run merges into them. Returns the number of rows moved.
+    """
+    if METADATA_LAYOUT != 'normalized':
+        return 0
+    if METADATA_ENGINE in ('mssqlserver', 'sqlite'):
+        parameter = '?'
+    elif METADATA_ENGINE in ('mysql', 'postgres'):
+        parameter = '%s'
+    names = ('SERVER_NAME', 'TABLE_CATALOG', 'TABLE_SCHEMA')
+    filters = [(name, value) for name, value in zip(names, (server_name, table_catalog, table_schema)) if value is not None]
+    values = tuple(value for _, value in filters)
+
+    def movable(name, prefix):
+        conditions = ['{}.{} = {}'.format(prefix, column, parameter) for column, _ in filters]
+        if name in ('data_values', 'dates'):
+            conditions.append("""NOT EXISTS (SELECT 1 FROM watermarks AS W
+                            WHERE W.STAGE = '{0}'
+                            AND W.SERVER_NAME = {1}.SERVER_NAME
+                            AND W.TABLE_CATALOG = {1}.TABLE_CATALOG
+                            AND W.TABLE_SCHEMA = {1}.TABLE_SCHEMA
+                            AND W.TABLE_NAME = {1}.TABLE_NAME
+                            AND W.COLUMN_NAME = {1}.COLUMN_NAME)""".format(name, prefix))
+        return ' AND '.join(conditions) if conditions else '1 = 1'
+
+    ids = """INNER JOIN norm_tables AS T ON T.SERVER_NAME = S.SERVER_NAME
+                AND T.TABLE_CATALOG = S.TABLE_CATALOG
+                AND T.TABLE_SCHEMA = S.TABLE_SCHEMA
+                AND T.TABLE_NAME = S.TABLE_NAME
+            INNER JOIN norm_columns AS C ON C.TABLE_ID = T.TABLE_ID
+                AND C.COLUMN_NAME = S.COLUMN_NAME"""
+
+    conn_metadata = get_metadata_connection()
+    cursor_metadata = conn_metadata.cursor()
+    n_moved = 0
+    try:
+        for name in NORMALIZED_TABLES:
+            staging = metadataTable(name)
+            columns = [quoteIdentifier('RANGE', METADATA_ENGINE) if column == 'RANGE_' and METADATA_ENGINE == 'mysql' else column for column in NORMALIZED_COLUMNS[name]]
+            cursor_metadata.execute("""INSERT INTO norm_tables (SERVER_NAME, TABLE_CATALOG, TABLE_SCHEMA, TABLE_NAME)
+                    SELECT DISTINCT S.SERVER_NAME, S.TABLE_CATALOG, S.TABLE_SCHEMA, S.TABLE_NAME
+                    FROM {0} AS S
+                    WHERE {1}
+                    AND NOT EXISTS (SELECT 1 FROM norm_tables AS T
+                                    WHERE T.SERVER_NAME = S.SERVER_NAME
+                                    AND T.TABLE_CATALOG = S.TABLE_CATALOG
+                                    AND T.TABLE_SCHEMA = S.TABLE_SCHEMA
+                                    AND T.TABLE_NAME = S.TABLE_NAME);""".format(staging, movable(name, 'S')), values)
+            cursor_metadata.execute("""INSERT INTO norm_columns (TABLE_ID, COLUMN_NAME)
+                    SELECT DISTINCT T.TABLE_ID, S.COLUMN_NAME
+                    FROM {0} AS S
+                    INNER JOIN norm_tables AS T ON T.SERVER_NAME = S.SERVER_NAME
+                        AND T.TABLE_CATALOG = S.TABLE_CATALOG
+                        AND T.TABLE_SCHEMA = S.TABLE_SCHEMA
+                        AND T.TABLE_NAME = S.TABLE_NAME
+                    WHERE {1}
+                    AND NOT EXISTS (SELECT 1 FROM norm_columns AS C
+                                    WHERE C.TABLE_ID = T.TABLE_ID
+                                    AND C.COLUMN_NAME = S.COLUMN_NAME);""".format(staging, movable(name, 'S')), values)
+            if name in ('data_values', 'dates'):
+                cursor_metadata.execute("""INSERT INTO norm_values (DATA_VALUE)
+                        SELECT DISTINCT S.DATA_VALUE
+                        FROM {0} AS S
+                        WHERE {1}
+                        AND S.DATA_VALUE IS NOT NULL
+                        AND NOT EXISTS (SELECT 1 FROM norm_values AS V
+                                        WHERE V.DATA_VALUE = S.DATA_VALUE);""".format(staging, movable(name, 'S')), values)
+            cursor_metadata.execute("""DELETE FROM norm_{0}
+                    WHERE EXISTS (SELECT 1 FROM {1} AS S
+                                {2}
+                                WHERE {3}
+                                AND T.TABLE_ID = norm_{0}.TABLE_ID
+                                AND C.COLUMN_ID = norm_{0}.COLUMN_ID);""".format(name, staging, ids, movable(name, 'S')), values)
+            if name in ('data_values', 'dates'):
+                cursor_metadata.execute("""INSERT INTO norm_{0} (TABLE_ID, COLUMN_ID, VALUE_ID, {2})
+                        SELECT T.TABLE_ID, C.COLUMN_ID, COALESCE(V.VALUE_ID, 0), {3}
+                        FROM {1} AS S
+                        {4}
+                        LEFT JOIN norm_values AS V ON V.DATA_VALUE = S.DATA_VALUE
+                        WHERE {5};""".format(name, staging, ', '.join(columns), ', '.join('S.' + column for column in columns), ids, movable(name, 'S')), values)
+            else:
+                cursor_metadata.execute("""INSERT INTO norm_{0} (TABLE_ID, COLUMN_ID, {2})
+                        SELECT T.TABLE_ID, C.COLUMN_ID, {3}
+                        FROM {1} AS S
+                        {4}
+                        WHERE {5};""".format(name, staging, ', '.join(columns), ', '.join('S.' + column for column in columns), ids, movable(name, 'S')), values)
+            cursor_metadata.execute("""DELETE FROM {0}
+                    WHERE {1};""".format(staging, movable(name, staging)), values)
+            n_moved += max(cursor_metadata.rowcount, 0)
+        conn_metadata.commit()
+    except Exception as e:
+        conn_metadata.rollback()
+        print('Problems compacting the metadata: {}'.format(e))
+        raise
+    finally:
+        cursor_metadata.close()
+        conn_metadata.close()
+    return n_moved
+
+def describe_server(server_name, table_catalog, table_schema, row_count_mode = 'exact', exact_below = None, n_workers = 1, max_source_jobs = None, max_metadata_jobs = None, resume = False, skip_unchanged = False, fingerprint_checksum = False, profile_engine = 'server', with_data_sample = False, n_samples = 10000, sample_seed = None, materialise_samples = False):
+    """
+    Collects all the metadata of a schema.
+    With `profile_engine = 'local'` each table is read once and profiled locally
+    (fill_profiles) instead of running one set of queries per stage on the server.
+    With `resume` an interrupted run continues where it stopped, skipping the stages,
+    tables and columns recorded as completed in the `ledger`.
+    With `skip_unchanged` the tables that haven't changed since they were last profiled
+    are skipped, according to their fingerprint in `tables`.
+    With the 'files' source engine the tables are the CSV and Parquet files of a directory
+    and they are always profiled locally, `profile_engine = 'statistics'` only reads the
+    statistics kept in the Parquet files.
+    With `profile_engine = 'catalog'` the uniques, data values and stats are estimated from
+    the statistics and histograms kept by the source engine (fill_catalog_statistics),
+    without scanning the tables. Columns with stale or no statistics are left out.
+    With `with_data_sample` the data values, dates and stats are computed on samples of
+    about `n_samples` rows per table, the same rows for the same `sample_seed`.
+    With `materialise_samples` each sample is copied once per table and stage into a
+    temporary table read by all the columns, and dropped when the table is done.
+    With the 'normalized' metadata layout the staged rows are compacted at the end.
+    """
     print('\n[', colored('OK', 'green'), ']', """\tCollecting metadata from {}""".format(server_name))
-    fill_columns(server_name, table_catalog, table_schema)
-    fill_tables(server_name, table_catalog, table_schema)
-    fill_uniques(server_name, table_catalog, table_schema)
-    fill_data_values(server_name, table_catalog, table_schema)
-    fill_dates(server_name, table_catalog, table_schema)
-    #fill_stats(server_name, table_catalog, table_schema)
+    if sample_seed is not None:
+        setSampleSeed(sample_seed)
+    setMaterialiseSamples(materialise_samples)
+    if not resume:
+        clearLedger(server_name, table_catalog, table_schema)
+
+    def stageCompleted(stage):
+        return resume and ('', '') in getCompletedUnits(stage, server_name, table_catalog, table_schema, '')
+
+    if not stageCompleted('columns'):
+        fill_columns(server_name, table_catalog, table_schema)
+        markCompleted('columns', server_name, table_catalog, table_schema)
+    if not stageCompleted('tables'):
+        fill_tables(server_name, table_catalog, table_schema, row_count_mode, exact_below, fingerprint_checksum)
+        markCompleted('tables', server_name, table_catalog, table_schema)
+    invalidateMetadata(server_name, table_catalog, table_schema)
+    prefetchMetadata(server_name, table_catalog, table_schema)
+    scheduling = {'n_workers': n_workers, 'max_source_jobs': max_source_jobs, 'max_metadata_jobs': max_metadata_jobs, 'resume': resume, 'skip_unchanged': skip_unchanged}
+    sampling = {'with_data_sample': with_data_sample, 'n_samples': n_samples}
+    if SOURCE_ENGINE == 'files' and profile_engine != 'statistics':
+        profile_engine = 'local'
+    if profile_engine == 'statistics':
+        fill_file_statistics(server_name, table_catalog, table_schema, **scheduling)
+    elif profile_engine == 'catalog':
+        fill_catalog_statistics(server_name, table_catalog, table_schema, **scheduling)
+    elif profile_engine == 'local':
+        fill_profiles(server_name, table_catalog, table_schema, **sampling, **scheduling)
+    else:
+        fill_uniques(server_name, table_catalog, table_schema, **scheduling)
+        fill_data_values(server_name, table_catalog, table_schema, **sampling, **scheduling)
+        fill_dates(server_name, table_catalog, table_schema, **sampling, **scheduling)
+        #fill_stats(server_name, table_catalog, table_schema, **scheduling)
+    if METADATA_LAYOUT == 'normalized':
+        compactMetadata(server_name, table_catalog, table_schema)
+    for stats in get_pool_stats():
+        logger.info('Connection pool {name}: {hits} hits, {misses} misses, {recycled} recycled, {discarded} discarded'.format(**stats))
     return
 
 ignore_columns = ['InsertETLLoadID', 'UpdateETLLoadID']
@@ -0,0 +1,151 @@
+import mmap
+import os
+import pandas as pd
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
+
+FILE_EXTENSIONS = ('.csv', '.parquet')
+# Rows read to guess the data types of the columns of a CSV file
+CSV_INFER_ROWS = 10000
+
+def listFiles(directory):
+    """
+    Returns [(TABLE_NAME, path)] of the CSV and Parquet files of a directory,
+    each file is a table named after the file without its extension.
+    """
+    files = []
+    for file_name in sorted(os.listdir(directory)):
+        table_name, extension = os.path.splitext(file_name)
+        if extension.lower() in FILE_EXTENSIONS:
+            files.append((table_name, os.path.join(directory, file_name)))
+    return files
+
+def isParquet(path):
+    return path.lower().endswith('.parquet')
+
+def getParquetFile(path):
+    if pq is None:
+        raise ImportError('pyarrow is needed to read Parquet files')
+    return pq.ParquetFile(path, memory_map = True)
+
+def getArrowType(arrow_type):
+    """
+    Name of an Arrow type in the SQL types used by the metadata, so numbers and dates
+    are profiled as they are for database tables.
+    """
+    if pa.types.is_boolean(arrow_type):
+        return 'bit'
+    elif pa.types.is_integer(arrow_type):
+        return 'bigint'
+    elif pa.types.is_floating(arrow_type):
+        return 'float'
+    elif pa.types.is_decimal(arrow_type):
+        return 'decimal'
+    elif pa.types.is_timestamp(arrow_type):
+        return 'datetime'
+    elif pa.types.is_date(arrow_type):
+        return 'date'
+    elif pa.types.is_binary(arrow_type) or pa.types.is_large_binary(arrow_type):
+        return 'varbinary'
+    return 'varchar'
+
+def getSeriesType(values):
+    """
+    SQL type of a column of a CSV file guessed from its first values.
+    """
+    values = values.dropna()
+    if len(values) == 0:
+        return 'varchar'
+    numbers = pd.to_numeric(values, errors = 'coerce')
+    if numbers.notnull().all():
+        if (numbers == numbers.round()).all() and not values.str.contains('.', regex = False).any():
+            return 'bigint'
+        return 'float'
+    dates = pd.to_datetime(values, errors = 'coerce')
+    if dates.notnull().all():
+        return 'datetime'
+    return 'varchar'
+
+def getFileColumns(path):
+    """
+    Returns [(COLUMN_NAME, ORDINAL_POSITION, DATA_TYPE)] of a file.
+    Parquet types come from the schema, CSV types are guessed from the first CSV_INFER_ROWS rows.
+    """
+    if isParquet(path):
+        schema = getParquetFile(path).schema_arrow
+        return [(field.name, i + 1, getArrowType(field.type)) for i, field in enumerate(schema)]
+    head = pd.read_csv(path, nrows = CSV_INFER_ROWS, dtype = str)
+    return [(column_name, i + 1, getSeriesType(head[column_name])) for i, column_name in enumerate(head.columns)]
+
+def countRows(path):
+    """
+    Number of rows of a file. Parquet files keep it in their footer, CSV lines are
+    counted over a memory map of the file without parsing them, so quoted values
+    with line breaks are counted as several rows.
+    """
+    if isParquet(path):
+        return getParquetFile(path).metadata.num_rows
+    if os.path.getsize(path) == 0:
+        return 0
+    with open(path, 'rb') as f:
+        with mmap.mmap(f.fileno(), 0, access = mmap.ACCESS_READ) as data:
+            n_lines = 0
+            block_size = 1 << 24
+            for start in range(0, len(data), block_size):
+                n_lines += data[start:start + block_size].count(b'\n')
+            if data[-1:] != b'\n':
+                n_lines += 1
+    # The first line is the header
+    return max(n_lines - 1, 0)
+
+def getLastModified(path):
+    return os.path.getmtime(path)
+
+def readChunks(path, column_names, chunk_size = 50000):
+    """
+    Yields the rows of the columns `column_names` of a file in lists of up to `chunk_size` tuples.
+    Parquet files are memory mapped and only the requested columns are decoded, CSV files
+    are parsed in chunks keeping the values as text.
+    """
+    if isParquet(path):
+        for batch in getParquetFile(path).iter_batches(batch_size = chunk_size, columns = list(column_names)):
+            chunk = batch.to_pandas(integer_object_nulls = True, date_as_object = True)
+            yield list(chunk.itertuples(index = False, name = None))
+        return
+    for chunk in pd.read_csv(path, usecols = list(column_names), dtype = str, chunksize = chunk_size, memory_map = True):
+        # usecols doesn't keep the order of `column_names`
+        chunk = chunk[list(column_names)]
+        yield list(chunk.itertuples(index = False, name = None))
+    return
+
+def getParquetStatistics(path):
+    """
+    Minimum, maximum and number of NULLs of each column from the statistics of the row
+    groups of a Parquet file, without decoding any data.
+    Returns {COLUMN_NAME: (MIN, MAX, NULL_VALUES)}, columns without statistics in some
+    row group are missing. Returns an empty dictionary for other files.
+    """
+    if not isParquet(path):
+        return {}
+    metadata = getParquetFile(path).metadata
+    statistics = {}
+    missing = set()
+    for i in range(metadata.num_row_groups):
+        row_group = metadata.row_group(i)
+        for j in range(row_group.num_columns):
+            column = row_group.column(j)
+            column_name = column.path_in_schema
+            stats = column.statistics
+            if stats is None or not stats.has_min_max or stats.null_count is None:
+                missing.add(column_name)
+                continue
+            if column_name in statistics:
+                minimum, maximum, nulls = statistics[column_name]
+                statistics[column_name] = (min(minimum, stats.min), max(maximum, stats.max), nulls + stats.null_count)
+            else:
+                statistics[column_name] = (stats.min, stats.max, stats.null_count)
+    return dict((column_name, value) for column_name, value in statistics.items() if column_name not in missing)
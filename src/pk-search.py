@@ -81,15 +81,44 @@ def get_columns_for_pk_search(server_name, table_catalog, table_schema, table_na
     conn_metadata.close()
     return columns
 
-def get_df_sql(sql, connection):
+def get_declared_keys(server_name, table_catalog, table_schema, table_name):
+    """
+    Returns the columns of the primary key and the columns that are unique alone,
+    from the constraints stored in `columns` by fill_columns. They are read with
+    aeda.getTableMetadata, through the metadata connection pool.
+    """
+    metadata = aeda.getTableMetadata(server_name, table_catalog, table_schema, table_name)
+    constraints = metadata['constraints']
+    # Columns are in ORDINAL_POSITION order
+    columns = [column[0] for column in metadata['columns']]
+    primary_key = [c for c in columns if constraints[c][1] == 1]
+    unique_columns = [c for c in columns if constraints[c][2] == 1]
+    return primary_key, unique_columns
+
+def get_df_sql(sql, connection, chunksize = 100_000):
     """
     Returns a dataframe with the results of a query.
     Used to execute evaluations of the PKs on a subsample of the data.
+
+    Every combination of columns is tested against the same rows, so the sample has to
+    be kept whole. It's kept as codes: the result is streamed with a server side cursor
+    in chunks of `chunksize` rows and each value is replaced by an Int32 code of its
+    column as the chunk is read. Equal values get equal codes and NULLs stay missing,
+    so groupby counts the same groups as on the values, and only the codes and one copy
+    of each distinct value stay in memory.
     """
-    connection = source_engine.connect()
-    df = pd.read_sql_query(sql, connection)
+    connection = source_engine.connect().execution_options(stream_results = True)
+    dictionaries = {}
+    codes = {}
+    for chunk in pd.read_sql_query(sql, connection, chunksize = chunksize):
+        for column in chunk.columns:
+            dictionary = dictionaries.setdefault(column, {})
+            for value in pd.unique(chunk[column].dropna()):
+                if value not in dictionary:
+                    dictionary[value] = len(dictionary)
+            codes.setdefault(column, []).append(chunk[column].map(dictionary).astype('Int32'))
     connection.close()
-    return df
+    return pd.DataFrame(dict((column, pd.concat(parts, ignore_index = True)) for column, parts in codes.items()))
 
 def get_sql_count(columns, top_n, table_name):
     if len(columns) == 1:
@@ -112,8 +141,12 @@ def get_sql(fields, table_name, top_n=10_000):
     return sql
 
 # get a dataset and compare uniques in Python
-def get_sql_sample(table_name, top_n):
-    sql = """select top {} * from {};""".format(top_n, table_name)
+def get_sql_sample(table_name, top_n, columns = None):
+    """
+    The first `top_n` rows of a table, only the `columns` of the search space when given.
+    """
+    fields = ', '.join(aeda.quoteIdentifier(c) for c in columns) if columns else '*'
+    sql = """select top {} {} from {};""".format(top_n, fields, table_name)
     return sql
 
 def get_column_combinations(columns, k = 5):
@@ -153,25 +186,34 @@ not_include = ['<List of columns you dont want to use in the search>']
 columns = [c for c in columns if c not in not_include]
 # You can add more criterias to filter the list of columns based on expert knowledge of the data source
 
+# Declared keys don't need to be searched. Unique columns are keys alone, so any
+# combination with them isn't minimal and they are left out of the search space.
+primary_key, unique_columns = get_declared_keys(server_name, table_catalog, table_schema, table_name)
+if primary_key:
+    logger.info('Declared primary key: {}'.format(tuple(primary_key)))
+for column in unique_columns:
+    logger.info('Declared unique column: {}'.format(column))
+columns = [c for c in columns if c not in unique_columns]
+
 # Creating 3 datasets for testing
 logger.info('Creating a 10k dataset')
-sql = get_sql_sample(table_name, 10_000)
-df_10k = get_df_sql(sql, connection) # memory usage: ~27.3 MB
+sql = get_sql_sample(table_name, 10_000, columns)
+df_10k = get_df_sql(sql, connection)
 logger.info('10k dataset created')
 
 logger.info('Creating a 100k dataset')
-sql = get_sql_sample(table_name, 100_000)
-df_100k = get_df_sql(sql, connection) # memory usage: ~244.6 MB 
+sql = get_sql_sample(table_name, 100_000, columns)
+df_100k = get_df_sql(sql, connection)
 logger.info('100k dataset created')
 
 logger.info('Creating a 1M dataset')
-sql = get_sql_sample(table_name, 1_000_000)
-df_1M = get_df_sql(sql, connection) # memory usage: ~2.0 GB
+sql = get_sql_sample(table_name, 1_000_000, columns)
+df_1M = get_df_sql(sql, connection) # ~5 bytes per value
 logger.info('1M dataset created')
 
 # Algorithm, it sends the results to the a log file
 threshold = 0.99999
-all_candidates = []
+all_candidates = [(c,) for c in unique_columns]
 for number_of_columns in [1,2,3,4,5]:
     logger.info('Searching PKs in combinations of {} columns'.format(number_of_columns))
     
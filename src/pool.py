@@ -0,0 +1,193 @@
+import threading
+import time
+import logging
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+class PooledConnection(object):
+    """
+    Thin proxy around a DB-API connection handed out by a `ConnectionPool`.
+    Calling `close()` returns the connection to the pool instead of closing it,
+    so the existing `conn.close()` calls keep working unchanged.
+    """
+    def __init__(self, pool, connection):
+        self._pool = pool
+        self._connection = connection
+
+    def __getattr__(self, name):
+        if self._connection is None:
+            raise AttributeError('Connection already returned to the pool')
+        return getattr(self._connection, name)
+
+    def cursor(self, *args, **kwargs):
+        return self._connection.cursor(*args, **kwargs)
+
+    def commit(self):
+        return self._connection.commit()
+
+    def rollback(self):
+        return self._connection.rollback()
+
+    def close(self):
+        if self._connection is not None:
+            connection = self._connection
+            self._connection = None
+            self._pool.release(connection)
+        return
+
+class SharedConnection(object):
+    """
+    Proxy around a connection lent to code that calls `close()` when it is done,
+    the connection stays open for its owner.
+    """
+    def __init__(self, connection):
+        self._connection = connection
+
+    def __getattr__(self, name):
+        return getattr(self._connection, name)
+
+    def cursor(self, *args, **kwargs):
+        return self._connection.cursor(*args, **kwargs)
+
+    def commit(self):
+        return self._connection.commit()
+
+    def rollback(self):
+        return self._connection.rollback()
+
+    def close(self):
+        return
+
+class ConnectionPool(object):
+    """
+    Bounded, thread-safe pool of DB-API connections.
+
+    - `connect` is a function without arguments that returns a new connection.
+    - `max_size` is the maximum number of connections checked out at the same time.
+    - `max_idle` seconds after which an idle connection is recycled (closed and replaced).
+    - `ping_after` seconds of idleness after which the connection is health checked
+      with `health_check_sql` before being handed out.
+    - `timeout` seconds to wait for a free connection before raising an error,
+      None waits forever.
+    """
+    def __init__(self, connect, max_size = 8, max_idle = 300, ping_after = 30, health_check_sql = 'select 1', timeout = None, name = 'pool'):
+        self.connect = connect
+        self.max_size = max_size
+        self.max_idle = max_idle
+        self.ping_after = ping_after
+        self.health_check_sql = health_check_sql
+        self.timeout = timeout
+        self.name = name
+
+        self._idle = deque()
+        self._lock = threading.Lock()
+        # Not bounded, resize() adds slots
+        self._slots = threading.Semaphore(max_size)
+
+        self.hits = 0
+        self.misses = 0
+        self.recycled = 0
+        self.discarded = 0
+
+    def _close_quietly(self, connection):
+        try:
+            connection.close()
+        except Exception:
+            pass
+        return
+
+    def _is_healthy(self, connection):
+        try:
+            cursor = connection.cursor()
+            cursor.execute(self.health_check_sql)
+            cursor.fetchall()
+            cursor.close()
+            return True
+        except Exception:
+            return False
+
+    def acquire(self):
+        """
+        Returns a `PooledConnection`, reusing an idle connection when possible.
+        Blocks while `max_size` connections are checked out.
+        """
+        if not self._slots.acquire(timeout = self.timeout):
+            raise RuntimeError('Connection pool {} exhausted ({} connections) after waiting {} seconds'.format(self.name, self.max_size, self.timeout))
+        try:
+            while True:
+                with self._lock:
+                    if not self._idle:
+                        break
+                    connection, last_used = self._idle.pop()
+                idle_time = time.time() - last_used
+                if idle_time > self.max_idle:
+                    self._close_quietly(connection)
+                    with self._lock:
+                        self.recycled += 1
+                    continue
+                if idle_time > self.ping_after and not self._is_healthy(connection):
+                    self._close_quietly(connection)
+                    with self._lock:
+                        self.discarded += 1
+                    continue
+                with self._lock:
+                    self.hits += 1
+                return PooledConnection(self, connection)
+
+            connection = self.connect()
+            with self._lock:
+                self.misses += 1
+            return PooledConnection(self, connection)
+        except Exception:
+            self._slots.release()
+            raise
+
+    def release(self, connection):
+        """
+        Puts back a connection in the pool. Pending transactions are rolled back,
+        connections that can't be reset are discarded.
+        """
+        try:
+            connection.rollback()
+            with self._lock:
+                self._idle.append((connection, time.time()))
+        except Exception:
+            self._close_quietly(connection)
+            with self._lock:
+                self.discarded += 1
+        finally:
+            self._slots.release()
+        return
+
+    def resize(self, max_size):
+        """
+        Allows up to `max_size` connections checked out, the pool can only grow.
+        Connections in use and idle ones are kept.
+        """
+        with self._lock:
+            added = max_size - self.max_size
+            if added <= 0:
+                return
+            self.max_size = max_size
+        for _ in range(added):
+            self._slots.release()
+        return
+
+    def close_all(self):
+        with self._lock:
+            idle = list(self._idle)
+            self._idle.clear()
+        for connection, _ in idle:
+            self._close_quietly(connection)
+        return
+
+    def stats(self):
+        with self._lock:
+            return {'name': self.name
+                    , 'hits': self.hits
+                    , 'misses': self.misses
+                    , 'recycled': self.recycled
+                    , 'discarded': self.discarded
+                    , 'idle': len(self._idle)
+                    , 'max_size': self.max_size}
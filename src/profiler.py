@@ -0,0 +1,133 @@
+import numpy as np
+import pandas as pd
+from sketches import TDigest
+
+PERCENTILES = [1, 2.5, 5, 10, 25, 50, 75, 90, 95, 97.5, 99]
+
+class ColumnProfile(object):
+    """
+    Accumulates the profile of one column over the chunks of a table.
+
+    - `frequencies` counts each non NULL value until more than `threshold` distinct
+      values are seen, then only the hashes of the distinct values are kept to count them.
+    - `numeric` columns accumulate count, mean and M2 (merged with Chan's formula),
+      sum, min, max and a t-digest for the percentiles.
+    - `dates` columns count the rows per month.
+    """
+    def __init__(self, column_name, numeric = False, dates = False, threshold = 5000):
+        self.column_name = column_name
+        self.numeric = numeric
+        self.dates = dates
+        self.threshold = threshold
+
+        self.n_rows = 0
+        self.n_nulls = 0
+        self.frequencies = pd.Series(dtype = 'int64')
+        self.hashes = None
+
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.sum = 0.0
+        self.min = None
+        self.max = None
+        self.digest = TDigest()
+
+        self.months = pd.Series(dtype = 'int64')
+
+    def update(self, values):
+        """
+        Adds a chunk of values, a pandas Series of python objects.
+        """
+        nulls = values.isnull()
+        self.n_rows += len(values)
+        self.n_nulls += int(nulls.sum())
+        not_null = values[~nulls]
+
+        if self.hashes is None:
+            self.frequencies = self.frequencies.add(not_null.value_counts(), fill_value = 0)
+            if len(self.frequencies) > self.threshold:
+                keys = pd.Series(self.frequencies.index, dtype = object)
+                self.hashes = np.unique(pd.util.hash_pandas_object(keys.astype(str), index = False).values)
+                self.frequencies = None
+        else:
+            hashes = pd.util.hash_pandas_object(not_null.astype(str), index = False).values
+            self.hashes = np.union1d(self.hashes, hashes)
+
+        if self.numeric:
+            numbers = pd.to_numeric(not_null, errors = 'coerce').dropna().astype('float64').values
+            if len(numbers):
+                count = len(numbers)
+                mean = numbers.mean()
+                m2 = ((numbers - mean) ** 2).sum()
+                delta = mean - self.mean
+                total = self.count + count
+                self.m2 += m2 + delta ** 2 * self.count * count / total
+                self.mean += delta * count / total
+                self.count = total
+                self.sum += numbers.sum()
+                self.min = numbers.min() if self.min is None else min(self.min, numbers.min())
+                self.max = numbers.max() if self.max is None else max(self.max, numbers.max())
+                self.digest.update(numbers)
+
+        if self.dates:
+            months = pd.to_datetime(not_null, errors = 'coerce').dropna()
+            months = months.dt.to_period('M').dt.to_timestamp().dt.strftime('%Y-%m-%d').value_counts()
+            self.months = self.months.add(months, fill_value = 0)
+        return
+
+    def distinct_values(self):
+        if self.hashes is not None:
+            return len(self.hashes)
+        return len(self.frequencies)
+
+    def value_frequencies(self):
+        """
+        Returns [(DATA_VALUE, FREQUENCY_NUMBER)] or None if there are too many distinct values.
+        NULLs are counted as a None value, like GROUP BY does.
+        """
+        if self.frequencies is None:
+            return None
+        frequencies = [(value, int(n)) for value, n in self.frequencies.sort_values(ascending = False).items()]
+        if self.n_nulls:
+            frequencies.append((None, self.n_nulls))
+        return frequencies
+
+    def month_frequencies(self):
+        return [(month, int(n)) for month, n in self.months.sort_values(ascending = False).items()]
+
+    def stats(self, percentiles = False):
+        """
+        Returns (AVG, STDEV, VAR, SUM, MAX, MIN, RANGE) and, with `percentiles`,
+        (P01, P025, P05, P10, Q1, Q2, Q3, P90, P95, P975, P99, IQR, QUANTILE_SKETCH).
+        STDEV and VAR are the sample ones, as in SQL Server.
+        """
+        if self.count == 0:
+            basic = (None,) * 7
+        else:
+            var = self.m2 / (self.count - 1) if self.count > 1 else None
+            basic = (self.mean, None if var is None else var ** 0.5, var, self.sum, self.max, self.min, self.max - self.min)
+        if not percentiles:
+            return basic
+        if self.count == 0:
+            return basic + (None,) * 13
+        values = self.digest.percentiles(PERCENTILES)
+        return basic + tuple(values) + (values[6] - values[4], self.digest.to_json())
+
+class TableProfile(object):
+    """
+    Profile of the columns of a table computed from one scan, fed in chunks of rows.
+    `columns` is a list of (COLUMN_NAME, DATA_TYPE).
+    """
+    def __init__(self, columns, numeric_types, date_types, threshold = 5000):
+        self.columns = [ColumnProfile(column_name
+                                      , numeric = data_type in numeric_types
+                                      , dates = data_type in date_types
+                                      , threshold = threshold) for column_name, data_type in columns]
+
+    def update(self, rows):
+        # Object dtype keeps the values as the driver returns them, ints with NULLs aren't turned into floats
+        chunk = pd.DataFrame(np.array([tuple(row) for row in rows], dtype = object).reshape(-1, len(self.columns)))
+        for i, column in enumerate(self.columns):
+            column.update(chunk[i])
+        return len(chunk)
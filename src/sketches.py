@@ -0,0 +1,252 @@
+import hashlib
+import heapq
+import json
+import math
+from collections import Counter
+
+def hash64(value):
+    """
+    64 bits hash of the text representation of a value, stable between runs and processes.
+    """
+    if not isinstance(value, bytes):
+        value = str(value).encode('utf-8')
+    return int.from_bytes(hashlib.blake2b(value, digest_size = 8).digest(), 'big')
+
+class HyperLogLog(object):
+    """
+    HyperLogLog sketch to approximate the number of distinct values of a column
+    using 2 ** `precision` bytes, whatever the number of rows.
+    The relative standard error is 1.04 / sqrt(2 ** precision), ~0.8% with precision 14.
+    """
+    def __init__(self, precision = 14):
+        if not 4 <= precision <= 18:
+            raise ValueError('precision must be between 4 and 18: {}'.format(precision))
+        self.precision = precision
+        self.m = 1 << precision
+        self.registers = bytearray(self.m)
+        if self.m == 16:
+            self.alpha = 0.673
+        elif self.m == 32:
+            self.alpha = 0.697
+        elif self.m == 64:
+            self.alpha = 0.709
+        else:
+            self.alpha = 0.7213 / (1 + 1.079 / self.m)
+
+    def add(self, value):
+        x = hash64(value)
+        j = x >> (64 - self.precision)
+        w = x & ((1 << (64 - self.precision)) - 1)
+        rank = (64 - self.precision) - w.bit_length() + 1
+        if rank > self.registers[j]:
+            self.registers[j] = rank
+        return
+
+    def update(self, values):
+        for value in values:
+            self.add(value)
+        return
+
+    def merge(self, other):
+        """
+        Adds the values seen by another sketch with the same precision.
+        """
+        if other.precision != self.precision:
+            raise ValueError('Sketches with different precision can\'t be merged')
+        self.registers = bytearray(max(a, b) for a, b in zip(self.registers, other.registers))
+        return
+
+    def count(self):
+        estimate = self.alpha * self.m * self.m / sum(2.0 ** -r for r in self.registers)
+        zeros = self.registers.count(0)
+        # Linear counting is more accurate for small cardinalities
+        if estimate <= 2.5 * self.m and zeros > 0:
+            estimate = self.m * math.log(self.m / zeros)
+        return int(round(estimate))
+
+    def error(self):
+        return 1.04 / math.sqrt(self.m)
+
+class TDigest(object):
+    """
+    Merging t-digest to approximate quantiles in one pass with bounded memory,
+    at most ~`compression` centroids whatever the number of values.
+    Quantiles near the tails are more accurate than around the median.
+    Digests can be merged and serialized with to_json() / from_json().
+    """
+    def __init__(self, compression = 200):
+        self.compression = compression
+        self.centroids = []
+        self.buffer = []
+        self.buffer_size = 10 * compression
+        self.count = 0
+        self.min = None
+        self.max = None
+
+    def add(self, value, weight = 1):
+        self.update([value], weight)
+        return
+
+    def update(self, values, weight = 1):
+        values = [float(value) for value in values]
+        values = [value for value in values if value == value]
+        if not values:
+            return
+        self.buffer.extend((value, weight) for value in values)
+        self.count += weight * len(values)
+        self.min = min(values) if self.min is None else min(self.min, min(values))
+        self.max = max(values) if self.max is None else max(self.max, max(values))
+        if len(self.buffer) >= self.buffer_size:
+            self.compress()
+        return
+
+    def _k(self, q):
+        return self.compression / (2 * math.pi) * math.asin(2 * q - 1)
+
+    def _q(self, k):
+        if k >= self.compression / 4:
+            return 1.0
+        return (math.sin(2 * math.pi * k / self.compression) + 1) / 2
+
+    def compress(self):
+        """
+        Merges the buffered values into the centroids. Neighbour centroids are merged while
+        they fit in one unit of the k1 scale function, which keeps the tails small.
+        """
+        if not self.buffer:
+            return
+        points = sorted(self.centroids + self.buffer)
+        self.buffer = []
+        total = float(self.count)
+
+        merged = []
+        mean, weight = points[0]
+        weight_so_far = 0
+        weight_limit = total * self._q(self._k(0) + 1)
+        for point_mean, point_weight in points[1:]:
+            if weight_so_far + weight + point_weight <= weight_limit:
+                weight += point_weight
+                mean += (point_mean - mean) * point_weight / weight
+            else:
+                merged.append((mean, weight))
+                weight_so_far += weight
+                weight_limit = total * self._q(self._k(weight_so_far / total) + 1)
+                mean, weight = point_mean, point_weight
+        merged.append((mean, weight))
+        self.centroids = merged
+        return
+
+    def merge(self, other):
+        other.compress()
+        if other.count == 0:
+            return
+        self.buffer.extend(other.centroids)
+        self.count += other.count
+        self.min = other.min if self.min is None else min(self.min, other.min)
+        self.max = other.max if self.max is None else max(self.max, other.max)
+        self.compress()
+        return
+
+    def quantile(self, q):
+        """
+        Value at quantile `q` (0 to 1), interpolated like percentile_cont.
+        """
+        self.compress()
+        if self.count == 0:
+            return None
+        if q <= 0:
+            return self.min
+        if q >= 1:
+            return self.max
+        # Position of the quantile measured from the center of the first value
+        target = q * (self.count - 1) + 0.5
+        previous_center = 0.5
+        previous_mean = self.min
+        cumulative = 0
+        for mean, weight in self.centroids:
+            center = cumulative + weight / 2.0
+            if target <= center:
+                if center == previous_center:
+                    return mean
+                return previous_mean + (mean - previous_mean) * (target - previous_center) / (center - previous_center)
+            previous_center, previous_mean = center, mean
+            cumulative += weight
+        last_center = self.count - 0.5
+        if last_center <= previous_center:
+            return self.max
+        return previous_mean + (self.max - previous_mean) * (target - previous_center) / (last_center - previous_center)
+
+    def percentiles(self, percentiles):
+        return [self.quantile(p / 100.0) for p in percentiles]
+
+    def to_json(self):
+        self.compress()
+        return json.dumps({'compression': self.compression
+                           , 'count': self.count
+                           , 'min': self.min
+                           , 'max': self.max
+                           , 'centroids': self.centroids})
+
+    @classmethod
+    def from_json(cls, text):
+        data = json.loads(text)
+        digest = cls(data['compression'])
+        digest.count = data['count']
+        digest.min = data['min']
+        digest.max = data['max']
+        digest.centroids = [tuple(centroid) for centroid in data['centroids']]
+        return digest
+
+class SpaceSaving(object):
+    """
+    Mergeable Space-Saving summary of the most frequent values of a column, keeping at
+    most `capacity` counters whatever the number of distinct values.
+    Counts are overestimated by at most `error` each, and never by more than N / capacity
+    for N values seen, so any value more frequent than that is in the summary.
+    """
+    def __init__(self, capacity = 1000):
+        self.capacity = capacity
+        self.counts = {}
+        self.errors = {}
+        self.n = 0
+
+    def _minimum(self):
+        if len(self.counts) < self.capacity:
+            return 0
+        return min(self.counts.values())
+
+    def update(self, values):
+        """
+        Adds a chunk of values, counted exactly and merged into the summary.
+        """
+        counts = Counter(values)
+        self.n += sum(counts.values())
+        self._merge(counts, {}, 0)
+        return
+
+    def merge(self, other):
+        self.n += other.n
+        self._merge(other.counts, other.errors, other._minimum())
+        return
+
+    def _merge(self, counts, errors, minimum):
+        # A value missing from a full summary may have been seen up to its minimum count
+        own_minimum = self._minimum()
+        merged_counts = {}
+        merged_errors = {}
+        for value in set(self.counts) | set(counts):
+            merged_counts[value] = self.counts.get(value, own_minimum) + counts.get(value, minimum)
+            merged_errors[value] = (self.errors.get(value, 0) if value in self.counts else own_minimum) + (errors.get(value, 0) if value in counts else minimum)
+        if len(merged_counts) > self.capacity:
+            kept = heapq.nlargest(self.capacity, merged_counts, key = merged_counts.get)
+            merged_counts = dict((value, merged_counts[value]) for value in kept)
+        self.counts = merged_counts
+        self.errors = dict((value, merged_errors[value]) for value in merged_counts)
+        return
+
+    def top(self, k):
+        """
+        Returns the `k` most frequent values as [(value, count, error)], count descending.
+        """
+        values = heapq.nlargest(k, self.counts, key = self.counts.get)
+        return [(value, self.counts[value], self.errors[value]) for value in values]
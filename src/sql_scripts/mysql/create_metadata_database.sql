@@ -7,14 +7,22 @@ CREATE TABLE IF NOT EXISTS columns (SERVER_NAME VARCHAR(255)
       , TABLE_NAME VARCHAR(255)
       , COLUMN_NAME VARCHAR(255)
       , ORDINAL_POSITION INTEGER
-      , DATA_TYPE VARCHAR(255));
+      , DATA_TYPE VARCHAR(255)
+      , IS_NULLABLE TINYINT
+      , IS_PRIMARY_KEY TINYINT
+      , IS_UNIQUE TINYINT
+      , UNIQUE KEY idx_columns (SERVER_NAME, TABLE_CATALOG, TABLE_SCHEMA, TABLE_NAME, COLUMN_NAME));
 
 CREATE TABLE IF NOT EXISTS tables (SERVER_NAME VARCHAR(255)
       , TABLE_CATALOG VARCHAR(255)
       , TABLE_SCHEMA VARCHAR(255)
       , TABLE_NAME VARCHAR(255)
       , N_COLUMNS INTEGER
-      , N_ROWS INTEGER);
+      , N_ROWS BIGINT
+      , N_ROWS_ESTIMATED BOOLEAN
+      , LAST_MODIFIED VARCHAR(64)
+      , FINGERPRINT VARCHAR(255)
+      , UNIQUE KEY idx_tables (SERVER_NAME, TABLE_CATALOG, TABLE_SCHEMA, TABLE_NAME));
 
 CREATE TABLE IF NOT EXISTS uniques (SERVER_NAME VARCHAR(255)
       , TABLE_CATALOG VARCHAR(255)
@@ -24,7 +32,10 @@ CREATE TABLE IF NOT EXISTS uniques (SERVER_NAME VARCHAR(255)
       , ORDINAL_POSITION INTEGER
       , DATA_TYPE VARCHAR(255)
       , DISTINCT_VALUES INTEGER
-      , NULL_VALUES INTEGER);
+      , NULL_VALUES INTEGER
+      , DISTINCT_APPROXIMATE BOOLEAN DEFAULT 0
+      , DISTINCT_ERROR FLOAT
+      , UNIQUE KEY idx_uniques (SERVER_NAME, TABLE_CATALOG, TABLE_SCHEMA, TABLE_NAME, COLUMN_NAME));
 
 CREATE TABLE IF NOT EXISTS data_values (SERVER_NAME VARCHAR(255)
       , TABLE_CATALOG VARCHAR(255)
@@ -33,7 +44,9 @@ CREATE TABLE IF NOT EXISTS data_values (SERVER_NAME VARCHAR(255)
       , COLUMN_NAME VARCHAR(255)
       , DATA_VALUE VARCHAR(255)
       , FREQUENCY_NUMBER INTEGER
-      , FREQUENCY_PERCENTAGE FLOAT);
+      , FREQUENCY_PERCENTAGE FLOAT
+      , APPROXIMATE BOOLEAN DEFAULT 0
+      , FREQUENCY_ERROR BIGINT);
 
 CREATE TABLE IF NOT EXISTS dates (SERVER_NAME VARCHAR(255)
       , TABLE_CATALOG VARCHAR(255)
@@ -67,4 +80,45 @@ CREATE TABLE IF NOT EXISTS stats (SERVER_NAME VARCHAR(255)
       , P95 FLOAT
       , P975 FLOAT
       , P99 FLOAT
-      , IQR FLOAT);
\ No newline at end of file
+      , IQR FLOAT
+      , QUANTILE_SKETCH MEDIUMTEXT
+      , UNIQUE KEY idx_stats (SERVER_NAME, TABLE_CATALOG, TABLE_SCHEMA, TABLE_NAME, COLUMN_NAME));
+
+CREATE TABLE IF NOT EXISTS ledger (STAGE VARCHAR(32)
+      , SERVER_NAME VARCHAR(255)
+      , TABLE_CATALOG VARCHAR(255)
+      , TABLE_SCHEMA VARCHAR(255)
+      , TABLE_NAME VARCHAR(255)
+      , COLUMN_NAME VARCHAR(255)
+      , COMPLETED_AT DATETIME
+      , UNIQUE KEY idx_ledger (STAGE, SERVER_NAME, TABLE_CATALOG, TABLE_SCHEMA, TABLE_NAME, COLUMN_NAME));
+
+CREATE TABLE IF NOT EXISTS fingerprints (STAGE VARCHAR(32)
+      , SERVER_NAME VARCHAR(255)
+      , TABLE_CATALOG VARCHAR(255)
+      , TABLE_SCHEMA VARCHAR(255)
+      , TABLE_NAME VARCHAR(255)
+      , FINGERPRINT VARCHAR(255)
+      , UNIQUE KEY idx_fingerprints (STAGE, SERVER_NAME, TABLE_CATALOG, TABLE_SCHEMA, TABLE_NAME));
+
+CREATE TABLE IF NOT EXISTS watermarks (STAGE VARCHAR(32)
+      , SERVER_NAME VARCHAR(255)
+      , TABLE_CATALOG VARCHAR(255)
+      , TABLE_SCHEMA VARCHAR(255)
+      , TABLE_NAME VARCHAR(255)
+      , COLUMN_NAME VARCHAR(255)
+      , WATERMARK_COLUMN VARCHAR(255)
+      , WATERMARK_VALUE VARCHAR(64)
+      , UNIQUE KEY idx_watermarks (STAGE, SERVER_NAME, TABLE_CATALOG, TABLE_SCHEMA, TABLE_NAME, COLUMN_NAME));
+
+CREATE TABLE IF NOT EXISTS samples (STAGE VARCHAR(32)
+      , SERVER_NAME VARCHAR(255)
+      , TABLE_CATALOG VARCHAR(255)
+      , TABLE_SCHEMA VARCHAR(255)
+      , TABLE_NAME VARCHAR(255)
+      , METHOD VARCHAR(32)
+      , SEED BIGINT
+      , REQUESTED_ROWS BIGINT
+      , SAMPLE_ROWS BIGINT
+      , SAMPLED_AT TIMESTAMP
+      , UNIQUE KEY idx_samples (STAGE, SERVER_NAME, TABLE_CATALOG, TABLE_SCHEMA, TABLE_NAME));
\ No newline at end of file
@@ -0,0 +1,124 @@
+-- CREATE DATABASE metadata;
+-- \c metadata
+
+CREATE TABLE IF NOT EXISTS columns (SERVER_NAME VARCHAR(255)
+      , TABLE_CATALOG VARCHAR(255)
+      , TABLE_SCHEMA VARCHAR(255)
+      , TABLE_NAME VARCHAR(255)
+      , COLUMN_NAME VARCHAR(255)
+      , ORDINAL_POSITION INTEGER
+      , DATA_TYPE VARCHAR(255)
+      , IS_NULLABLE SMALLINT
+      , IS_PRIMARY_KEY SMALLINT
+      , IS_UNIQUE SMALLINT
+      , CONSTRAINT idx_columns UNIQUE (SERVER_NAME, TABLE_CATALOG, TABLE_SCHEMA, TABLE_NAME, COLUMN_NAME));
+
+CREATE TABLE IF NOT EXISTS tables (SERVER_NAME VARCHAR(255)
+      , TABLE_CATALOG VARCHAR(255)
+      , TABLE_SCHEMA VARCHAR(255)
+      , TABLE_NAME VARCHAR(255)
+      , N_COLUMNS INTEGER
+      , N_ROWS BIGINT
+      , N_ROWS_ESTIMATED SMALLINT
+      , LAST_MODIFIED VARCHAR(64)
+      , FINGERPRINT VARCHAR(255)
+      , CONSTRAINT idx_tables UNIQUE (SERVER_NAME, TABLE_CATALOG, TABLE_SCHEMA, TABLE_NAME));
+
+CREATE TABLE IF NOT EXISTS uniques (SERVER_NAME VARCHAR(255)
+      , TABLE_CATALOG VARCHAR(255)
+      , TABLE_SCHEMA VARCHAR(255)
+      , TABLE_NAME VARCHAR(255)
+      , COLUMN_NAME VARCHAR(255)
+      , ORDINAL_POSITION INTEGER
+      , DATA_TYPE VARCHAR(255)
+      , DISTINCT_VALUES BIGINT
+      , NULL_VALUES BIGINT
+      , DISTINCT_APPROXIMATE SMALLINT DEFAULT 0
+      , DISTINCT_ERROR DOUBLE PRECISION
+      , CONSTRAINT idx_uniques UNIQUE (SERVER_NAME, TABLE_CATALOG, TABLE_SCHEMA, TABLE_NAME, COLUMN_NAME));
+
+CREATE TABLE IF NOT EXISTS data_values (SERVER_NAME VARCHAR(255)
+      , TABLE_CATALOG VARCHAR(255)
+      , TABLE_SCHEMA VARCHAR(255)
+      , TABLE_NAME VARCHAR(255)
+      , COLUMN_NAME VARCHAR(255)
+      , DATA_VALUE TEXT
+      , FREQUENCY_NUMBER BIGINT
+      , FREQUENCY_PERCENTAGE DOUBLE PRECISION
+      , APPROXIMATE SMALLINT DEFAULT 0
+      , FREQUENCY_ERROR BIGINT);
+
+CREATE TABLE IF NOT EXISTS dates (SERVER_NAME VARCHAR(255)
+      , TABLE_CATALOG VARCHAR(255)
+      , TABLE_SCHEMA VARCHAR(255)
+      , TABLE_NAME VARCHAR(255)
+      , COLUMN_NAME VARCHAR(255)
+      , DATA_VALUE VARCHAR(255)
+      , FREQUENCY_NUMBER BIGINT
+      , FREQUENCY_PERCENTAGE DOUBLE PRECISION);
+
+CREATE TABLE IF NOT EXISTS stats (SERVER_NAME VARCHAR(255)
+      , TABLE_CATALOG VARCHAR(255)
+      , TABLE_SCHEMA VARCHAR(255)
+      , TABLE_NAME VARCHAR(255)
+      , COLUMN_NAME VARCHAR(255)
+      , AVG DOUBLE PRECISION
+      , STDEV DOUBLE PRECISION
+      , VAR DOUBLE PRECISION
+      , SUM DOUBLE PRECISION
+      , MAX DOUBLE PRECISION
+      , MIN DOUBLE PRECISION
+      , RANGE_ DOUBLE PRECISION
+      , P01 DOUBLE PRECISION
+      , P025 DOUBLE PRECISION
+      , P05 DOUBLE PRECISION
+      , P10 DOUBLE PRECISION
+      , Q1 DOUBLE PRECISION
+      , Q2 DOUBLE PRECISION
+      , Q3 DOUBLE PRECISION
+      , P90 DOUBLE PRECISION
+      , P95 DOUBLE PRECISION
+      , P975 DOUBLE PRECISION
+      , P99 DOUBLE PRECISION
+      , IQR DOUBLE PRECISION
+      , QUANTILE_SKETCH TEXT
+      , CONSTRAINT idx_stats UNIQUE (SERVER_NAME, TABLE_CATALOG, TABLE_SCHEMA, TABLE_NAME, COLUMN_NAME));
+
+CREATE TABLE IF NOT EXISTS ledger (STAGE VARCHAR(32)
+      , SERVER_NAME VARCHAR(255)
+      , TABLE_CATALOG VARCHAR(255)
+      , TABLE_SCHEMA VARCHAR(255)
+      , TABLE_NAME VARCHAR(255)
+      , COLUMN_NAME VARCHAR(255)
+      , COMPLETED_AT TIMESTAMP
+      , CONSTRAINT idx_ledger UNIQUE (STAGE, SERVER_NAME, TABLE_CATALOG, TABLE_SCHEMA, TABLE_NAME, COLUMN_NAME));
+
+CREATE TABLE IF NOT EXISTS fingerprints (STAGE VARCHAR(32)
+      , SERVER_NAME VARCHAR(255)
+      , TABLE_CATALOG VARCHAR(255)
+      , TABLE_SCHEMA VARCHAR(255)
+      , TABLE_NAME VARCHAR(255)
+      , FINGERPRINT VARCHAR(255)
+      , CONSTRAINT idx_fingerprints UNIQUE (STAGE, SERVER_NAME, TABLE_CATALOG, TABLE_SCHEMA, TABLE_NAME));
+
+CREATE TABLE IF NOT EXISTS watermarks (STAGE VARCHAR(32)
+      , SERVER_NAME VARCHAR(255)
+      , TABLE_CATALOG VARCHAR(255)
+      , TABLE_SCHEMA VARCHAR(255)
+      , TABLE_NAME VARCHAR(255)
+      , COLUMN_NAME VARCHAR(255)
+      , WATERMARK_COLUMN VARCHAR(255)
+      , WATERMARK_VALUE VARCHAR(64)
+      , CONSTRAINT idx_watermarks UNIQUE (STAGE, SERVER_NAME, TABLE_CATALOG, TABLE_SCHEMA, TABLE_NAME, COLUMN_NAME));
+
+CREATE TABLE IF NOT EXISTS samples (STAGE VARCHAR(32)
+      , SERVER_NAME VARCHAR(255)
+      , TABLE_CATALOG VARCHAR(255)
+      , TABLE_SCHEMA VARCHAR(255)
+      , TABLE_NAME VARCHAR(255)
+      , METHOD VARCHAR(32)
+      , SEED BIGINT
+      , REQUESTED_ROWS BIGINT
+      , SAMPLE_ROWS BIGINT
+      , SAMPLED_AT TIMESTAMP
+      , CONSTRAINT idx_samples UNIQUE (STAGE, SERVER_NAME, TABLE_CATALOG, TABLE_SCHEMA, TABLE_NAME));
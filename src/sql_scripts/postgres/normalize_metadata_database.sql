@@ -0,0 +1,135 @@
+-- Moves an existing metadata database to the normalized layout (setMetadataLayout('normalized')).
+-- The wide tables are kept as the staging tables and their rows are moved by compactMetadata().
+
+ALTER TABLE uniques RENAME TO uniques_staging;
+ALTER TABLE data_values RENAME TO data_values_staging;
+ALTER TABLE dates RENAME TO dates_staging;
+ALTER TABLE stats RENAME TO stats_staging;
+
+CREATE TABLE IF NOT EXISTS norm_tables (TABLE_ID INTEGER GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY
+      , SERVER_NAME VARCHAR(255)
+      , TABLE_CATALOG VARCHAR(255)
+      , TABLE_SCHEMA VARCHAR(255)
+      , TABLE_NAME VARCHAR(255)
+      , CONSTRAINT idx_norm_tables UNIQUE (SERVER_NAME, TABLE_CATALOG, TABLE_SCHEMA, TABLE_NAME));
+
+CREATE TABLE IF NOT EXISTS norm_columns (COLUMN_ID INTEGER GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY
+      , TABLE_ID INTEGER NOT NULL
+      , COLUMN_NAME VARCHAR(255)
+      , CONSTRAINT idx_norm_columns UNIQUE (TABLE_ID, COLUMN_NAME));
+
+CREATE TABLE IF NOT EXISTS norm_values (VALUE_ID BIGINT GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY
+      , DATA_VALUE TEXT NOT NULL
+      , CONSTRAINT idx_norm_values UNIQUE (DATA_VALUE));
+
+CREATE TABLE IF NOT EXISTS norm_uniques (TABLE_ID INTEGER NOT NULL
+      , COLUMN_ID INTEGER NOT NULL
+      , ORDINAL_POSITION INTEGER
+      , DATA_TYPE VARCHAR(255)
+      , DISTINCT_VALUES BIGINT
+      , NULL_VALUES BIGINT
+      , DISTINCT_APPROXIMATE SMALLINT DEFAULT 0
+      , DISTINCT_ERROR DOUBLE PRECISION
+      , PRIMARY KEY (TABLE_ID, COLUMN_ID));
+
+CREATE TABLE IF NOT EXISTS norm_data_values (TABLE_ID INTEGER NOT NULL
+      , COLUMN_ID INTEGER NOT NULL
+      , VALUE_ID BIGINT NOT NULL
+      , FREQUENCY_NUMBER BIGINT
+      , FREQUENCY_PERCENTAGE DOUBLE PRECISION
+      , APPROXIMATE SMALLINT DEFAULT 0
+      , FREQUENCY_ERROR BIGINT
+      , PRIMARY KEY (TABLE_ID, COLUMN_ID, VALUE_ID));
+
+CREATE TABLE IF NOT EXISTS norm_dates (TABLE_ID INTEGER NOT NULL
+      , COLUMN_ID INTEGER NOT NULL
+      , VALUE_ID BIGINT NOT NULL
+      , FREQUENCY_NUMBER BIGINT
+      , FREQUENCY_PERCENTAGE DOUBLE PRECISION
+      , PRIMARY KEY (TABLE_ID, COLUMN_ID, VALUE_ID));
+
+CREATE TABLE IF NOT EXISTS norm_stats (TABLE_ID INTEGER NOT NULL
+      , COLUMN_ID INTEGER NOT NULL
+      , AVG DOUBLE PRECISION
+      , STDEV DOUBLE PRECISION
+      , VAR DOUBLE PRECISION
+      , SUM DOUBLE PRECISION
+      , MAX DOUBLE PRECISION
+      , MIN DOUBLE PRECISION
+      , RANGE_ DOUBLE PRECISION
+      , P01 DOUBLE PRECISION
+      , P025 DOUBLE PRECISION
+      , P05 DOUBLE PRECISION
+      , P10 DOUBLE PRECISION
+      , Q1 DOUBLE PRECISION
+      , Q2 DOUBLE PRECISION
+      , Q3 DOUBLE PRECISION
+      , P90 DOUBLE PRECISION
+      , P95 DOUBLE PRECISION
+      , P975 DOUBLE PRECISION
+      , P99 DOUBLE PRECISION
+      , IQR DOUBLE PRECISION
+      , QUANTILE_SKETCH TEXT
+      , PRIMARY KEY (TABLE_ID, COLUMN_ID));
+
+CREATE VIEW uniques AS
+SELECT T.SERVER_NAME, T.TABLE_CATALOG, T.TABLE_SCHEMA, T.TABLE_NAME, C.COLUMN_NAME, F.ORDINAL_POSITION, F.DATA_TYPE, F.DISTINCT_VALUES, F.NULL_VALUES, F.DISTINCT_APPROXIMATE, F.DISTINCT_ERROR
+FROM norm_uniques AS F
+INNER JOIN norm_tables AS T ON T.TABLE_ID = F.TABLE_ID
+INNER JOIN norm_columns AS C ON C.COLUMN_ID = F.COLUMN_ID
+WHERE NOT EXISTS (SELECT 1 FROM uniques_staging AS S
+                WHERE S.SERVER_NAME = T.SERVER_NAME
+                AND S.TABLE_CATALOG = T.TABLE_CATALOG
+                AND S.TABLE_SCHEMA = T.TABLE_SCHEMA
+                AND S.TABLE_NAME = T.TABLE_NAME
+                AND S.COLUMN_NAME = C.COLUMN_NAME)
+UNION ALL
+SELECT SERVER_NAME, TABLE_CATALOG, TABLE_SCHEMA, TABLE_NAME, COLUMN_NAME, ORDINAL_POSITION, DATA_TYPE, DISTINCT_VALUES, NULL_VALUES, DISTINCT_APPROXIMATE, DISTINCT_ERROR
+FROM uniques_staging;
+
+CREATE VIEW data_values AS
+SELECT T.SERVER_NAME, T.TABLE_CATALOG, T.TABLE_SCHEMA, T.TABLE_NAME, C.COLUMN_NAME, V.DATA_VALUE, F.FREQUENCY_NUMBER, F.FREQUENCY_PERCENTAGE, F.APPROXIMATE, F.FREQUENCY_ERROR
+FROM norm_data_values AS F
+INNER JOIN norm_tables AS T ON T.TABLE_ID = F.TABLE_ID
+INNER JOIN norm_columns AS C ON C.COLUMN_ID = F.COLUMN_ID
+LEFT JOIN norm_values AS V ON V.VALUE_ID = F.VALUE_ID
+WHERE NOT EXISTS (SELECT 1 FROM data_values_staging AS S
+                WHERE S.SERVER_NAME = T.SERVER_NAME
+                AND S.TABLE_CATALOG = T.TABLE_CATALOG
+                AND S.TABLE_SCHEMA = T.TABLE_SCHEMA
+                AND S.TABLE_NAME = T.TABLE_NAME
+                AND S.COLUMN_NAME = C.COLUMN_NAME)
+UNION ALL
+SELECT SERVER_NAME, TABLE_CATALOG, TABLE_SCHEMA, TABLE_NAME, COLUMN_NAME, DATA_VALUE, FREQUENCY_NUMBER, FREQUENCY_PERCENTAGE, APPROXIMATE, FREQUENCY_ERROR
+FROM data_values_staging;
+
+CREATE VIEW dates AS
+SELECT T.SERVER_NAME, T.TABLE_CATALOG, T.TABLE_SCHEMA, T.TABLE_NAME, C.COLUMN_NAME, V.DATA_VALUE, F.FREQUENCY_NUMBER, F.FREQUENCY_PERCENTAGE
+FROM norm_dates AS F
+INNER JOIN norm_tables AS T ON T.TABLE_ID = F.TABLE_ID
+INNER JOIN norm_columns AS C ON C.COLUMN_ID = F.COLUMN_ID
+LEFT JOIN norm_values AS V ON V.VALUE_ID = F.VALUE_ID
+WHERE NOT EXISTS (SELECT 1 FROM dates_staging AS S
+                WHERE S.SERVER_NAME = T.SERVER_NAME
+                AND S.TABLE_CATALOG = T.TABLE_CATALOG
+                AND S.TABLE_SCHEMA = T.TABLE_SCHEMA
+                AND S.TABLE_NAME = T.TABLE_NAME
+                AND S.COLUMN_NAME = C.COLUMN_NAME)
+UNION ALL
+SELECT SERVER_NAME, TABLE_CATALOG, TABLE_SCHEMA, TABLE_NAME, COLUMN_NAME, DATA_VALUE, FREQUENCY_NUMBER, FREQUENCY_PERCENTAGE
+FROM dates_staging;
+
+CREATE VIEW stats AS
+SELECT T.SERVER_NAME, T.TABLE_CATALOG, T.TABLE_SCHEMA, T.TABLE_NAME, C.COLUMN_NAME, F.AVG, F.STDEV, F.VAR, F.SUM, F.MAX, F.MIN, F.RANGE_, F.P01, F.P025, F.P05, F.P10, F.Q1, F.Q2, F.Q3, F.P90, F.P95, F.P975, F.P99, F.IQR, F.QUANTILE_SKETCH
+FROM norm_stats AS F
+INNER JOIN norm_tables AS T ON T.TABLE_ID = F.TABLE_ID
+INNER JOIN norm_columns AS C ON C.COLUMN_ID = F.COLUMN_ID
+WHERE NOT EXISTS (SELECT 1 FROM stats_staging AS S
+                WHERE S.SERVER_NAME = T.SERVER_NAME
+                AND S.TABLE_CATALOG = T.TABLE_CATALOG
+                AND S.TABLE_SCHEMA = T.TABLE_SCHEMA
+                AND S.TABLE_NAME = T.TABLE_NAME
+                AND S.COLUMN_NAME = C.COLUMN_NAME)
+UNION ALL
+SELECT SERVER_NAME, TABLE_CATALOG, TABLE_SCHEMA, TABLE_NAME, COLUMN_NAME, AVG, STDEV, VAR, SUM, MAX, MIN, RANGE_, P01, P025, P05, P10, Q1, Q2, Q3, P90, P95, P975, P99, IQR, QUANTILE_SKETCH
+FROM stats_staging;
@@ -52,7 +52,7 @@ CREATE TABLE IF NOT EXISTS summary_v6 (SERVER_NAME TEXT
       , SUM FLOAT
       , MAX FLOAT
       , MIN FLOAT
-      , RANGE FLOAT
+      , RANGE_ FLOAT
       , P01 FLOAT
       , P025 FLOAT
       , P05 FLOAT
@@ -6,7 +6,10 @@ CREATE TABLE [dbo].[columns](
 	[TABLE_NAME] [varchar](255) NULL,
 	[COLUMN_NAME] [varchar](255) NULL,
 	[ORDINAL_POSITION] [int] NULL,
-	[DATA_TYPE] [varchar](255) NULL
+	[DATA_TYPE] [varchar](255) NULL,
+	[IS_NULLABLE] [bit] NULL,
+	[IS_PRIMARY_KEY] [bit] NULL,
+	[IS_UNIQUE] [bit] NULL
 )
 
 CREATE UNIQUE INDEX idx_columns ON columns ([SERVER_NAME], [TABLE_CATALOG], [TABLE_SCHEMA], [TABLE_NAME], [COLUMN_NAME]);
@@ -17,7 +20,10 @@ CREATE TABLE [dbo].[tables](
 	[TABLE_SCHEMA] [varchar](255) NULL,
 	[TABLE_NAME] [varchar](255) NULL,
 	[N_COLUMNS] [int] NULL,
-	[N_ROWS] [int] NULL
+	[N_ROWS] [bigint] NULL,
+	[N_ROWS_ESTIMATED] [bit] NULL,
+	[LAST_MODIFIED] [varchar](64) NULL,
+	[FINGERPRINT] [varchar](255) NULL
 )
 
 CREATE UNIQUE INDEX idx_tables ON tables ([SERVER_NAME], [TABLE_CATALOG], [TABLE_SCHEMA], [TABLE_NAME]);
@@ -31,7 +37,9 @@ CREATE TABLE [dbo].[uniques](
 	[ORDINAL_POSITION] [int] NULL,
 	[DATA_TYPE] [varchar](255) NULL,
 	[DISTINCT_VALUES] [int] NULL,
-	[NULL_VALUES] [int] NULL
+	[NULL_VALUES] [int] NULL,
+	[DISTINCT_APPROXIMATE] [bit] NULL DEFAULT 0,
+	[DISTINCT_ERROR] [float] NULL
 )
 
 CREATE UNIQUE INDEX idx_uniques ON uniques ([SERVER_NAME], [TABLE_CATALOG], [TABLE_SCHEMA], [TABLE_NAME], [COLUMN_NAME]);
@@ -44,7 +52,9 @@ CREATE TABLE [dbo].[data_values](
 	[COLUMN_NAME] [varchar](255) NULL,
 	[DATA_VALUE] [varchar](255) NULL,
 	[FREQUENCY_NUMBER] [int] NULL,
-	[FREQUENCY_PERCENTAGE] [float] NULL
+	[FREQUENCY_PERCENTAGE] [float] NULL,
+	[APPROXIMATE] [bit] NULL DEFAULT 0,
+	[FREQUENCY_ERROR] [bigint] NULL
 )
 
 CREATE UNIQUE INDEX idx_datavalues ON data_values ([SERVER_NAME], [TABLE_CATALOG], [TABLE_SCHEMA], [TABLE_NAME], [COLUMN_NAME], [DATA_VALUE]);
@@ -88,7 +98,59 @@ CREATE TABLE [dbo].[stats](
 	[P95] [float] NULL,
 	[P975] [float] NULL,
 	[P99] [float] NULL,
-	[IQR] [float] NULL
+	[IQR] [float] NULL,
+	[QUANTILE_SKETCH] [varchar](max) NULL
+)
+
+CREATE UNIQUE INDEX idx_stats ON stats ([SERVER_NAME], [TABLE_CATALOG], [TABLE_SCHEMA], [TABLE_NAME], [COLUMN_NAME]);
+
+CREATE TABLE [dbo].[ledger](
+	[STAGE] [varchar](32) NULL,
+	[SERVER_NAME] [varchar](255) NULL,
+	[TABLE_CATALOG] [varchar](255) NULL,
+	[TABLE_SCHEMA] [varchar](255) NULL,
+	[TABLE_NAME] [varchar](255) NULL,
+	[COLUMN_NAME] [varchar](255) NULL,
+	[COMPLETED_AT] [datetime] NULL
+)
+
+CREATE UNIQUE INDEX idx_ledger ON ledger ([STAGE], [SERVER_NAME], [TABLE_CATALOG], [TABLE_SCHEMA], [TABLE_NAME], [COLUMN_NAME]);
+
+CREATE TABLE [dbo].[fingerprints](
+	[STAGE] [varchar](32) NULL,
+	[SERVER_NAME] [varchar](255) NULL,
+	[TABLE_CATALOG] [varchar](255) NULL,
+	[TABLE_SCHEMA] [varchar](255) NULL,
+	[TABLE_NAME] [varchar](255) NULL,
+	[FINGERPRINT] [varchar](255) NULL
+)
+
+CREATE UNIQUE INDEX idx_fingerprints ON fingerprints ([STAGE], [SERVER_NAME], [TABLE_CATALOG], [TABLE_SCHEMA], [TABLE_NAME]);
+
+CREATE TABLE [dbo].[watermarks](
+	[STAGE] [varchar](32) NULL,
+	[SERVER_NAME] [varchar](255) NULL,
+	[TABLE_CATALOG] [varchar](255) NULL,
+	[TABLE_SCHEMA] [varchar](255) NULL,
+	[TABLE_NAME] [varchar](255) NULL,
+	[COLUMN_NAME] [varchar](255) NULL,
+	[WATERMARK_COLUMN] [varchar](255) NULL,
+	[WATERMARK_VALUE] [varchar](64) NULL
+)
+
+CREATE UNIQUE INDEX idx_watermarks ON watermarks ([STAGE], [SERVER_NAME], [TABLE_CATALOG], [TABLE_SCHEMA], [TABLE_NAME], [COLUMN_NAME]);
+
+CREATE TABLE [dbo].[samples](
+	[STAGE] [varchar](32) NULL,
+	[SERVER_NAME] [varchar](255) NULL,
+	[TABLE_CATALOG] [varchar](255) NULL,
+	[TABLE_SCHEMA] [varchar](255) NULL,
+	[TABLE_NAME] [varchar](255) NULL,
+	[METHOD] [varchar](32) NULL,
+	[SEED] [bigint] NULL,
+	[REQUESTED_ROWS] [bigint] NULL,
+	[SAMPLE_ROWS] [bigint] NULL,
+	[SAMPLED_AT] [datetime] NULL
 )
 
-CREATE UNIQUE INDEX idx_stats ON stats ([SERVER_NAME], [TABLE_CATALOG], [TABLE_SCHEMA], [TABLE_NAME], [COLUMN_NAME]);
\ No newline at end of file
+CREATE UNIQUE INDEX idx_samples ON samples ([STAGE], [SERVER_NAME], [TABLE_CATALOG], [TABLE_SCHEMA], [TABLE_NAME]);
\ No newline at end of file
@@ -0,0 +1,161 @@
+-- Moves an existing metadata database to the normalized layout (setMetadataLayout('normalized')).
+-- The wide tables are kept as the staging tables and their rows are moved by compactMetadata().
+
+EXEC sp_rename 'dbo.uniques', 'uniques_staging';
+EXEC sp_rename 'dbo.data_values', 'data_values_staging';
+EXEC sp_rename 'dbo.dates', 'dates_staging';
+EXEC sp_rename 'dbo.stats', 'stats_staging';
+
+CREATE TABLE [dbo].[norm_tables](
+	[TABLE_ID] [int] IDENTITY(1,1) NOT NULL PRIMARY KEY CLUSTERED,
+	[SERVER_NAME] [varchar](255) NULL,
+	[TABLE_CATALOG] [varchar](255) NULL,
+	[TABLE_SCHEMA] [varchar](255) NULL,
+	[TABLE_NAME] [varchar](255) NULL
+)
+
+CREATE UNIQUE INDEX idx_norm_tables ON norm_tables ([SERVER_NAME], [TABLE_CATALOG], [TABLE_SCHEMA], [TABLE_NAME]);
+
+CREATE TABLE [dbo].[norm_columns](
+	[COLUMN_ID] [int] IDENTITY(1,1) NOT NULL PRIMARY KEY CLUSTERED,
+	[TABLE_ID] [int] NOT NULL,
+	[COLUMN_NAME] [varchar](255) NULL
+)
+
+CREATE UNIQUE INDEX idx_norm_columns ON norm_columns ([TABLE_ID], [COLUMN_NAME]);
+
+CREATE TABLE [dbo].[norm_values](
+	[VALUE_ID] [bigint] IDENTITY(1,1) NOT NULL PRIMARY KEY CLUSTERED,
+	[DATA_VALUE] [varchar](255) NOT NULL
+)
+
+CREATE UNIQUE INDEX idx_norm_values ON norm_values ([DATA_VALUE]);
+
+CREATE TABLE [dbo].[norm_uniques](
+	[TABLE_ID] [int] NOT NULL,
+	[COLUMN_ID] [int] NOT NULL,
+	[ORDINAL_POSITION] [int] NULL,
+	[DATA_TYPE] [varchar](255) NULL,
+	[DISTINCT_VALUES] [int] NULL,
+	[NULL_VALUES] [int] NULL,
+	[DISTINCT_APPROXIMATE] [bit] NULL DEFAULT 0,
+	[DISTINCT_ERROR] [float] NULL,
+	PRIMARY KEY CLUSTERED ([TABLE_ID], [COLUMN_ID])
+)
+
+CREATE TABLE [dbo].[norm_data_values](
+	[TABLE_ID] [int] NOT NULL,
+	[COLUMN_ID] [int] NOT NULL,
+	[VALUE_ID] [bigint] NOT NULL,
+	[FREQUENCY_NUMBER] [int] NULL,
+	[FREQUENCY_PERCENTAGE] [float] NULL,
+	[APPROXIMATE] [bit] NULL DEFAULT 0,
+	[FREQUENCY_ERROR] [bigint] NULL,
+	PRIMARY KEY CLUSTERED ([TABLE_ID], [COLUMN_ID], [VALUE_ID])
+)
+
+CREATE TABLE [dbo].[norm_dates](
+	[TABLE_ID] [int] NOT NULL,
+	[COLUMN_ID] [int] NOT NULL,
+	[VALUE_ID] [bigint] NOT NULL,
+	[FREQUENCY_NUMBER] [int] NULL,
+	[FREQUENCY_PERCENTAGE] [float] NULL,
+	PRIMARY KEY CLUSTERED ([TABLE_ID], [COLUMN_ID], [VALUE_ID])
+)
+
+CREATE TABLE [dbo].[norm_stats](
+	[TABLE_ID] [int] NOT NULL,
+	[COLUMN_ID] [int] NOT NULL,
+	[AVG] [float] NULL,
+	[STDEV] [float] NULL,
+	[VAR] [float] NULL,
+	[SUM] [float] NULL,
+	[MAX] [float] NULL,
+	[MIN] [float] NULL,
+	[RANGE_] [float] NULL,
+	[P01] [float] NULL,
+	[P025] [float] NULL,
+	[P05] [float] NULL,
+	[P10] [float] NULL,
+	[Q1] [float] NULL,
+	[Q2] [float] NULL,
+	[Q3] [float] NULL,
+	[P90] [float] NULL,
+	[P95] [float] NULL,
+	[P975] [float] NULL,
+	[P99] [float] NULL,
+	[IQR] [float] NULL,
+	[QUANTILE_SKETCH] [varchar](max) NULL,
+	PRIMARY KEY CLUSTERED ([TABLE_ID], [COLUMN_ID])
+)
+
+GO
+
+CREATE VIEW uniques AS
+SELECT T.SERVER_NAME, T.TABLE_CATALOG, T.TABLE_SCHEMA, T.TABLE_NAME, C.COLUMN_NAME, F.ORDINAL_POSITION, F.DATA_TYPE, F.DISTINCT_VALUES, F.NULL_VALUES, F.DISTINCT_APPROXIMATE, F.DISTINCT_ERROR
+FROM norm_uniques AS F
+INNER JOIN norm_tables AS T ON T.TABLE_ID = F.TABLE_ID
+INNER JOIN norm_columns AS C ON C.COLUMN_ID = F.COLUMN_ID
+WHERE NOT EXISTS (SELECT 1 FROM uniques_staging AS S
+                WHERE S.SERVER_NAME = T.SERVER_NAME
+                AND S.TABLE_CATALOG = T.TABLE_CATALOG
+                AND S.TABLE_SCHEMA = T.TABLE_SCHEMA
+                AND S.TABLE_NAME = T.TABLE_NAME
+                AND S.COLUMN_NAME = C.COLUMN_NAME)
+UNION ALL
+SELECT SERVER_NAME, TABLE_CATALOG, TABLE_SCHEMA, TABLE_NAME, COLUMN_NAME, ORDINAL_POSITION, DATA_TYPE, DISTINCT_VALUES, NULL_VALUES, DISTINCT_APPROXIMATE, DISTINCT_ERROR
+FROM uniques_staging;
+
+GO
+
+CREATE VIEW data_values AS
+SELECT T.SERVER_NAME, T.TABLE_CATALOG, T.TABLE_SCHEMA, T.TABLE_NAME, C.COLUMN_NAME, V.DATA_VALUE, F.FREQUENCY_NUMBER, F.FREQUENCY_PERCENTAGE, F.APPROXIMATE, F.FREQUENCY_ERROR
+FROM norm_data_values AS F
+INNER JOIN norm_tables AS T ON T.TABLE_ID = F.TABLE_ID
+INNER JOIN norm_columns AS C ON C.COLUMN_ID = F.COLUMN_ID
+LEFT JOIN norm_values AS V ON V.VALUE_ID = F.VALUE_ID
+WHERE NOT EXISTS (SELECT 1 FROM data_values_staging AS S
+                WHERE S.SERVER_NAME = T.SERVER_NAME
+                AND S.TABLE_CATALOG = T.TABLE_CATALOG
+                AND S.TABLE_SCHEMA = T.TABLE_SCHEMA
+                AND S.TABLE_NAME = T.TABLE_NAME
+                AND S.COLUMN_NAME = C.COLUMN_NAME)
+UNION ALL
+SELECT SERVER_NAME, TABLE_CATALOG, TABLE_SCHEMA, TABLE_NAME, COLUMN_NAME, DATA_VALUE, FREQUENCY_NUMBER, FREQUENCY_PERCENTAGE, APPROXIMATE, FREQUENCY_ERROR
+FROM data_values_staging;
+
+GO
+
+CREATE VIEW dates AS
+SELECT T.SERVER_NAME, T.TABLE_CATALOG, T.TABLE_SCHEMA, T.TABLE_NAME, C.COLUMN_NAME, V.DATA_VALUE, F.FREQUENCY_NUMBER, F.FREQUENCY_PERCENTAGE
+FROM norm_dates AS F
+INNER JOIN norm_tables AS T ON T.TABLE_ID = F.TABLE_ID
+INNER JOIN norm_columns AS C ON C.COLUMN_ID = F.COLUMN_ID
+LEFT JOIN norm_values AS V ON V.VALUE_ID = F.VALUE_ID
+WHERE NOT EXISTS (SELECT 1 FROM dates_staging AS S
+                WHERE S.SERVER_NAME = T.SERVER_NAME
+                AND S.TABLE_CATALOG = T.TABLE_CATALOG
+                AND S.TABLE_SCHEMA = T.TABLE_SCHEMA
+                AND S.TABLE_NAME = T.TABLE_NAME
+                AND S.COLUMN_NAME = C.COLUMN_NAME)
+UNION ALL
+SELECT SERVER_NAME, TABLE_CATALOG, TABLE_SCHEMA, TABLE_NAME, COLUMN_NAME, DATA_VALUE, FREQUENCY_NUMBER, FREQUENCY_PERCENTAGE
+FROM dates_staging;
+
+GO
+
+CREATE VIEW stats AS
+SELECT T.SERVER_NAME, T.TABLE_CATALOG, T.TABLE_SCHEMA, T.TABLE_NAME, C.COLUMN_NAME, F.AVG, F.STDEV, F.VAR, F.SUM, F.MAX, F.MIN, F.RANGE_, F.P01, F.P025, F.P05, F.P10, F.Q1, F.Q2, F.Q3, F.P90, F.P95, F.P975, F.P99, F.IQR, F.QUANTILE_SKETCH
+FROM norm_stats AS F
+INNER JOIN norm_tables AS T ON T.TABLE_ID = F.TABLE_ID
+INNER JOIN norm_columns AS C ON C.COLUMN_ID = F.COLUMN_ID
+WHERE NOT EXISTS (SELECT 1 FROM stats_staging AS S
+                WHERE S.SERVER_NAME = T.SERVER_NAME
+                AND S.TABLE_CATALOG = T.TABLE_CATALOG
+                AND S.TABLE_SCHEMA = T.TABLE_SCHEMA
+                AND S.TABLE_NAME = T.TABLE_NAME
+                AND S.COLUMN_NAME = C.COLUMN_NAME)
+UNION ALL
+SELECT SERVER_NAME, TABLE_CATALOG, TABLE_SCHEMA, TABLE_NAME, COLUMN_NAME, AVG, STDEV, VAR, SUM, MAX, MIN, RANGE_, P01, P025, P05, P10, Q1, Q2, Q3, P90, P95, P975, P99, IQR, QUANTILE_SKETCH
+FROM stats_staging;
+GO
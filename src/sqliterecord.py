@@ -0,0 +1,43 @@
+import struct
+
+def decodeSqliteRecord(record):
+    """
+    Values of a record in the SQLite file format, like the samples of sqlite_stat4.
+    """
+    def readVarint(offset):
+        value = 0
+        for i in range(9):
+            byte = record[offset + i]
+            if i == 8:
+                return (value << 8) | byte, offset + 9
+            value = (value << 7) | (byte & 0x7f)
+            if byte < 0x80:
+                return value, offset + i + 1
+
+    record = bytes(record)
+    header_size, offset = readVarint(0)
+    serial_types = []
+    while offset < header_size:
+        serial_type, offset = readVarint(offset)
+        serial_types.append(serial_type)
+    integer_sizes = {1: 1, 2: 2, 3: 3, 4: 4, 5: 6, 6: 8}
+    values = []
+    offset = header_size
+    for serial_type in serial_types:
+        if serial_type == 0:
+            values.append(None)
+        elif serial_type in integer_sizes:
+            size = integer_sizes[serial_type]
+            values.append(int.from_bytes(record[offset:offset + size], 'big', signed = True))
+            offset += size
+        elif serial_type == 7:
+            values.append(struct.unpack('>d', record[offset:offset + 8])[0])
+            offset += 8
+        elif serial_type in (8, 9):
+            values.append(serial_type - 8)
+        else:
+            size = (serial_type - 12) // 2
+            data = record[offset:offset + size]
+            values.append(data if serial_type % 2 == 0 else data.decode('utf-8', 'replace'))
+            offset += size
+    return values
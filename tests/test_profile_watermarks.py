@@ -0,0 +1,43 @@
+import sqlite3
+
+import pytest
+
+# aeda needs the ODBC driver and the string_connections module of the installation
+aeda = pytest.importorskip('aeda', exc_type = ImportError)
+
+def execute(path, sql, rows = ()):
+    conn = sqlite3.connect(path)
+    conn.executemany(sql, rows) if rows else conn.executescript(sql)
+    conn.commit()
+    conn.close()
+
+@pytest.fixture
+def databases(tmp_path):
+    source = str(tmp_path / 'source.db')
+    metadata = str(tmp_path / 'metadata.db')
+    execute(source, """CREATE TABLE t (id INTEGER PRIMARY KEY, a TEXT);""")
+    execute(source, """INSERT INTO t VALUES (?, ?);""", [(i, 'x{}'.format(i % 3)) for i in range(30)])
+    aeda.setSourceConnection('sqlite', source)
+    aeda.setMetadataConnection('sqlite', metadata)
+    yield source, metadata
+    aeda.invalidateMetadata('srv', 'cat', 'main')
+    aeda.close_connection_pools()
+
+def test_profile_forgets_watermarks(databases):
+    source, metadata = databases
+    aeda.fill_columns('srv', 'cat', 'main')
+    aeda.fill_tables('srv', 'cat', 'main')
+    aeda.fill_uniques('srv', 'cat', 'main')
+    aeda.fill_data_values('srv', 'cat', 'main', incremental = True, watermark_columns = {'t': 'id'})
+
+    # The profile counts the new rows, an incremental run after it mustn't count them again
+    execute(source, """INSERT INTO t VALUES (?, ?);""", [(i, 'zed') for i in range(30, 40)])
+    aeda.fill_profiles('srv', 'cat', 'main')
+    conn = sqlite3.connect(metadata)
+    assert conn.execute("""SELECT COUNT(*) FROM watermarks WHERE TABLE_NAME = 't';""").fetchone() == (0,)
+
+    aeda.fill_data_values('srv', 'cat', 'main', incremental = True, watermark_columns = {'t': 'id'})
+    frequency = conn.execute("""SELECT FREQUENCY_NUMBER FROM data_values
+                                WHERE TABLE_NAME = 't' AND COLUMN_NAME = 'a' AND DATA_VALUE = 'zed';""").fetchall()
+    conn.close()
+    assert frequency == [(10,)]
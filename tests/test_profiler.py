@@ -0,0 +1,85 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from profiler import ColumnProfile, TableProfile, PERCENTILES
+
+NUMERIC_TYPES = ('int', 'float')
+DATE_TYPES = ('date',)
+
+ROWS = [(1, 'a', '2020-01-15', 1.5)
+        , (2, 'b', '2020-01-20', None)
+        , (3, 'a', '2020-02-01', 2.5)
+        , (4, None, None, 4.0)
+        , (5, 'a', '2020-03-31', None)
+        , (6, 'b', '2020-02-28', 8.0)]
+
+def profile_rows(rows, chunk_size, threshold = 5000):
+    profile = TableProfile([('id', 'int'), ('category', 'varchar'), ('day', 'date'), ('amount', 'float')]
+                           , NUMERIC_TYPES, DATE_TYPES, threshold = threshold)
+    for i in range(0, len(rows), chunk_size):
+        assert profile.update(rows[i:i + chunk_size]) == len(rows[i:i + chunk_size])
+    return dict((column.column_name, column) for column in profile.columns)
+
+@pytest.mark.parametrize('chunk_size', [1, 4, 6])
+def test_frequencies_count_nulls_as_a_none_value(chunk_size):
+    category = profile_rows(ROWS, chunk_size)['category']
+    assert category.n_rows == 6
+    assert category.n_nulls == 1
+    assert category.distinct_values() == 2
+    assert category.value_frequencies() == [('a', 3), ('b', 2), (None, 1)]
+
+@pytest.mark.parametrize('chunk_size', [1, 2, 6])
+def test_all_distinct_column(chunk_size):
+    identifier = profile_rows(ROWS, chunk_size)['id']
+    assert identifier.distinct_values() == 6
+    assert identifier.n_nulls == 0
+    assert sorted(identifier.value_frequencies()) == [(i, 1) for i in range(1, 7)]
+
+def test_too_many_distinct_values_keeps_only_their_hashes():
+    identifier = profile_rows(ROWS, 2, threshold = 3)['id']
+    assert identifier.value_frequencies() is None
+    assert identifier.frequencies is None
+    assert identifier.distinct_values() == 6
+
+@pytest.mark.parametrize('chunk_size', [1, 3, 4, 6])
+def test_moments_merged_over_chunks_match_numpy(chunk_size):
+    amount = profile_rows(ROWS, chunk_size)['amount']
+    values = np.array([1.5, 2.5, 4.0, 8.0])
+    avg, stdev, var, total, maximum, minimum, value_range = amount.stats()
+    assert avg == pytest.approx(values.mean())
+    assert var == pytest.approx(values.var(ddof = 1))
+    assert stdev == pytest.approx(values.std(ddof = 1))
+    assert total == pytest.approx(values.sum())
+    assert (maximum, minimum, value_range) == (8.0, 1.5, 6.5)
+    assert amount.n_nulls == 2
+
+def test_percentiles_and_sketch():
+    amount = profile_rows(ROWS, 2)['amount']
+    stats = amount.stats(percentiles = True)
+    assert len(stats) == 7 + len(PERCENTILES) + 2
+    percentiles = stats[7:7 + len(PERCENTILES)]
+    assert percentiles[PERCENTILES.index(50)] == pytest.approx(np.percentile([1.5, 2.5, 4.0, 8.0], 50))
+    assert list(percentiles) == sorted(percentiles)
+    assert stats[-2] == pytest.approx(percentiles[PERCENTILES.index(75)] - percentiles[PERCENTILES.index(25)])
+    assert '"count": 4' in stats[-1]
+
+def test_single_value_has_no_sample_variance():
+    column = ColumnProfile('x', numeric = True)
+    column.update(pd.Series([5], dtype = object))
+    assert column.stats() == (5.0, None, None, 5.0, 5.0, 5.0, 0.0)
+
+def test_all_null_column():
+    profile = TableProfile([('amount', 'float')], NUMERIC_TYPES, DATE_TYPES)
+    profile.update([(None,), (None,), (None,)])
+    amount = profile.columns[0]
+    assert amount.n_nulls == 3
+    assert amount.distinct_values() == 0
+    assert amount.value_frequencies() == [(None, 3)]
+    assert amount.stats() == (None,) * 7
+    assert amount.stats(percentiles = True) == (None,) * 20
+
+@pytest.mark.parametrize('chunk_size', [1, 6])
+def test_dates_are_counted_per_month(chunk_size):
+    day = profile_rows(ROWS, chunk_size)['day']
+    assert sorted(day.month_frequencies()) == [('2020-01-01', 2), ('2020-02-01', 2), ('2020-03-01', 1)]
@@ -0,0 +1,161 @@
+import random
+from collections import Counter
+
+import pytest
+
+from sketches import HyperLogLog, TDigest, SpaceSaving, hash64
+
+def test_hash64_is_stable_and_64_bits():
+    assert hash64('abc') == hash64(b'abc')
+    assert hash64(1) == hash64('1')
+    assert 0 <= hash64('abc') < 2 ** 64
+
+@pytest.mark.parametrize('n', [10, 1000, 50000])
+def test_hyperloglog_error_bound(n):
+    sketch = HyperLogLog(precision = 12)
+    sketch.update('value {}'.format(i) for i in range(n))
+    # Duplicates don't change the estimate
+    sketch.update('value {}'.format(i) for i in range(n // 2))
+    assert abs(sketch.count() - n) <= max(1, 4 * sketch.error() * n)
+
+def test_hyperloglog_rejects_invalid_precision():
+    with pytest.raises(ValueError):
+        HyperLogLog(precision = 3)
+    with pytest.raises(ValueError):
+        HyperLogLog(12).merge(HyperLogLog(14))
+
+def test_hyperloglog_merge_is_the_union_and_associative():
+    parts = []
+    for start in (0, 3000, 6000):
+        sketch = HyperLogLog(precision = 10)
+        sketch.update(range(start, start + 5000))
+        parts.append(sketch)
+    union = HyperLogLog(precision = 10)
+    union.update(range(0, 11000))
+
+    left = HyperLogLog(precision = 10)
+    left.merge(parts[0])
+    left.merge(parts[1])
+    left.merge(parts[2])
+    right = HyperLogLog(precision = 10)
+    middle = HyperLogLog(precision = 10)
+    middle.merge(parts[1])
+    middle.merge(parts[2])
+    right.merge(parts[0])
+    right.merge(middle)
+
+    assert left.registers == right.registers == union.registers
+
+def rank_error(values, q, estimate):
+    # Distance in rank between the estimate and the requested quantile
+    below = sum(1 for value in values if value < estimate)
+    equal = sum(1 for value in values if value == estimate)
+    low, high = below / float(len(values)), (below + equal) / float(len(values))
+    if low <= q <= high:
+        return 0.0
+    return min(abs(q - low), abs(q - high))
+
+@pytest.mark.parametrize('distribution', ['uniform', 'normal', 'exponential'])
+def test_tdigest_quantile_accuracy(distribution):
+    generator = random.Random(7)
+    draw = {'uniform': lambda: generator.uniform(0, 100)
+            , 'normal': lambda: generator.gauss(50, 10)
+            , 'exponential': lambda: generator.expovariate(0.1)}[distribution]
+    values = [draw() for _ in range(20000)]
+    digest = TDigest()
+    digest.update(values)
+    for q in (0.01, 0.025, 0.05, 0.25, 0.5, 0.75, 0.95, 0.975, 0.99):
+        # Tighter at the tails, as the k1 scale function promises
+        tolerance = 0.002 if q <= 0.05 or q >= 0.95 else 0.01
+        assert rank_error(values, q, digest.quantile(q)) <= tolerance
+    assert digest.quantile(0) == min(values)
+    assert digest.quantile(1) == max(values)
+    assert len(digest.centroids) <= 2 * digest.compression
+
+def test_tdigest_small_and_empty():
+    assert TDigest().quantile(0.5) is None
+    digest = TDigest()
+    # NaN isn't a value
+    digest.update([1, 2, 3, 4, 0, float('nan')])
+    assert digest.count == 5
+    assert digest.percentiles([0, 50, 100]) == [0.0, 2.0, 4.0]
+
+def test_tdigest_merge_is_associative():
+    generator = random.Random(11)
+    chunks = [[generator.gauss(0, 1) for _ in range(5000)] for _ in range(3)]
+    digests = []
+    for chunk in chunks:
+        digest = TDigest()
+        digest.update(chunk)
+        digests.append(digest)
+    values = sum(chunks, [])
+
+    left = TDigest()
+    left.merge(digests[0])
+    left.merge(digests[1])
+    left.merge(digests[2])
+    middle = TDigest()
+    middle.merge(digests[1])
+    middle.merge(digests[2])
+    right = TDigest()
+    right.merge(digests[0])
+    right.merge(middle)
+
+    assert left.count == right.count == len(values)
+    assert (left.min, left.max) == (right.min, right.max) == (min(values), max(values))
+    for q in (0.01, 0.1, 0.5, 0.9, 0.99):
+        assert rank_error(values, q, left.quantile(q)) <= 0.01
+        assert rank_error(values, q, right.quantile(q)) <= 0.01
+
+def test_tdigest_json_round_trip():
+    digest = TDigest(compression = 100)
+    digest.update(range(1000))
+    copy = TDigest.from_json(digest.to_json())
+    assert (copy.compression, copy.count, copy.min, copy.max) == (100, 1000, 0, 999)
+    assert copy.centroids == digest.centroids
+    assert copy.percentiles([1, 50, 99]) == digest.percentiles([1, 50, 99])
+
+def test_space_saving_is_exact_below_capacity():
+    values = ['a'] * 50 + ['b'] * 30 + ['c'] * 20 + ['d']
+    summary = SpaceSaving(capacity = 10)
+    for i in range(0, len(values), 7):
+        summary.update(values[i:i + 7])
+    assert summary.n == len(values)
+    assert summary.top(3) == [('a', 50, 0), ('b', 30, 0), ('c', 20, 0)]
+
+def test_space_saving_keeps_heavy_hitters_within_error():
+    generator = random.Random(3)
+    values = ['heavy {}'.format(i % 5) for i in range(5000)] + ['rare {}'.format(generator.randint(0, 100000)) for _ in range(5000)]
+    generator.shuffle(values)
+    summary = SpaceSaving(capacity = 50)
+    for i in range(0, len(values), 500):
+        summary.update(values[i:i + 500])
+    counts = Counter(values)
+    top = summary.top(5)
+    assert sorted(value for value, n, error in top) == ['heavy {}'.format(i) for i in range(5)]
+    for value, n, error in top:
+        # Counts are overestimated by at most their error, itself at most N / capacity
+        assert counts[value] <= n <= counts[value] + error
+        assert error <= len(values) / 50.0
+
+def test_space_saving_merge_is_associative_and_exact_below_capacity():
+    chunks = [['a'] * 5 + ['b'] * 3, ['b'] * 4 + ['c'] * 2, ['a', 'c', 'd']]
+    summaries = []
+    for chunk in chunks:
+        summary = SpaceSaving(capacity = 10)
+        summary.update(chunk)
+        summaries.append(summary)
+
+    left = SpaceSaving(capacity = 10)
+    for summary in summaries:
+        left.merge(summary)
+    middle = SpaceSaving(capacity = 10)
+    middle.merge(summaries[1])
+    middle.merge(summaries[2])
+    right = SpaceSaving(capacity = 10)
+    right.merge(summaries[0])
+    right.merge(middle)
+
+    expected = [('b', 7, 0), ('a', 6, 0), ('c', 3, 0), ('d', 1, 0)]
+    assert left.top(4) == right.top(4) == expected
+    assert left.n == right.n == 17
@@ -0,0 +1,58 @@
+import struct
+
+import pytest
+
+from sqliterecord import decodeSqliteRecord
+
+def varint(value):
+    """
+    SQLite varint of a value that fits in 56 bits, enough for headers and serial types.
+    """
+    groups = [value & 0x7f]
+    value >>= 7
+    while value:
+        groups.append(0x80 | (value & 0x7f))
+        value >>= 7
+    return bytes(reversed(groups))
+
+def record(*fields):
+    """
+    Record of (serial type, body) fields, the header size counts itself.
+    """
+    types = b''.join(varint(serial_type) for serial_type, body in fields)
+    header_size = len(types) + 1
+    if header_size > 0x7f:
+        header_size += 1
+    return varint(header_size) + types + b''.join(body for serial_type, body in fields)
+
+def test_null_and_constants():
+    assert decodeSqliteRecord(record((0, b''), (8, b''), (9, b''))) == [None, 0, 1]
+
+@pytest.mark.parametrize('serial_type, size, value', [(1, 1, -5)
+                                                      , (2, 2, 1000)
+                                                      , (3, 3, -70000)
+                                                      , (4, 4, 2 ** 31 - 1)
+                                                      , (5, 6, -2 ** 40)
+                                                      , (6, 8, 2 ** 62)])
+def test_integer_widths(serial_type, size, value):
+    body = value.to_bytes(size, 'big', signed = True)
+    assert decodeSqliteRecord(record((serial_type, body))) == [value]
+
+def test_float():
+    assert decodeSqliteRecord(record((7, struct.pack('>d', -2.5)))) == [-2.5]
+
+def test_text_and_blob():
+    text = 'día'.encode('utf-8')
+    blob = b'\x00\xff\x10'
+    values = decodeSqliteRecord(record((13 + 2 * len(text), text), (12 + 2 * len(blob), blob), (13, b'')))
+    assert values == ['día', blob, '']
+    assert isinstance(values[1], bytes)
+
+def test_long_text_and_mixed_fields():
+    # A serial type of two varint bytes and fields read one after the other
+    text = ('x' * 100).encode('utf-8')
+    fields = [(1, b'\x07'), (13 + 2 * len(text), text), (0, b''), (7, struct.pack('>d', 0.125)), (9, b'')]
+    assert decodeSqliteRecord(record(*fields)) == [7, 'x' * 100, None, 0.125, 1]
+
+def test_accepts_memoryview():
+    assert decodeSqliteRecord(memoryview(record((1, b'\x2a')))) == [42]